@@ -0,0 +1,94 @@
+"""Account balances at a point in time.
+
+Every so often (see the create_balance_checkpoints command) the balance of each
+account at the close of a day is written down as an AccountBalanceCheckpoint.
+A balance as of a later date then only needs the nearest checkpoint and the
+entries since, rather than every entry the account has ever had. Checkpoints
+are dropped when an entry dated before them is added, removed or moved, and
+are simply recreated the next time the command runs.
+
+A date here means the close of that day in the site's time zone.
+"""
+
+import datetime
+
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from bank.models import Account, AccountBalanceCheckpoint
+
+
+def closing_time(date):
+    """the moment date ends, in the current time zone."""
+    return timezone.make_aware(
+        datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time())
+    )
+
+
+def balance_as_of(account, date):
+    """account's balance at the close of date."""
+    checkpoint = account.checkpoints.filter(date__lte=date).order_by("-date").first()
+    entries = account.entries.filter(
+        valid=True, transaction__date__lt=closing_time(date)
+    )
+    if checkpoint is None:
+        opening = 0
+    else:
+        opening = checkpoint.balance
+        entries = entries.filter(transaction__date__gte=checkpoint.closed_at)
+    return opening + entries.aggregate(total=Coalesce(Sum("amount"), 0))["total"]
+
+
+def balances_as_of(currency, date):
+    """the accounts in currency, annotated with their balance at the close of
+    date, in one query."""
+    checkpoints = AccountBalanceCheckpoint.objects.filter(
+        account=OuterRef("pk"), date__lte=date
+    ).order_by("-date")[:1]
+    return (
+        Account.objects.filter(currency=currency)
+        .annotate(
+            checkpoint_closed_at=Subquery(checkpoints.values("closed_at")),
+            checkpoint_balance=Coalesce(Subquery(checkpoints.values("balance")), 0),
+        )
+        .annotate(
+            balance=F("checkpoint_balance")
+            + Coalesce(
+                Sum(
+                    "entries__amount",
+                    filter=Q(
+                        entries__valid=True,
+                        entries__transaction__date__lt=closing_time(date),
+                    )
+                    & (
+                        Q(checkpoint_closed_at__isnull=True)
+                        | Q(entries__transaction__date__gte=F("checkpoint_closed_at"))
+                    ),
+                ),
+                0,
+            )
+        )
+        .order_by("id")
+    )
+
+
+def create_checkpoints(date, currencies):
+    """write down the balance of every account in currencies at the close of
+    date, replacing any checkpoints already there. returns how many were
+    written."""
+    closed_at = closing_time(date)
+    checkpoints = [
+        AccountBalanceCheckpoint(
+            account=account, date=date, closed_at=closed_at, balance=account.balance
+        )
+        for currency in currencies
+        for account in balances_as_of(currency, date)
+    ]
+    AccountBalanceCheckpoint.objects.bulk_create(
+        checkpoints,
+        update_conflicts=True,
+        unique_fields=["account", "date"],
+        update_fields=["closed_at", "balance"],
+    )
+    return len(checkpoints)
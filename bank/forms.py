@@ -40,9 +40,11 @@ class TransactionForm(forms.Form):
 
     def __init__(self, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        accounts = Account.objects.filter(
-            currency=Currency.objects.get(name="DRFT")
-        ).filter(Q(owners=user.pk) | Q(admins=user.pk))
+        accounts = (
+            Account.objects.filter(currency=Currency.objects.get(name="DRFT"))
+            .filter(Q(owners=user.pk) | Q(admins=user.pk))
+            .select_related("currency")
+        )
         self.fields["from_account"].queryset = accounts
         self.fields["to_account"].queryset = accounts
         for field_name, field in self.fields.items():
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bank", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(fields=["account", "valid"], name="entry_account_valid"),
+        ),
+    ]
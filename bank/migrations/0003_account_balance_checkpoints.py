@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bank", "0002_entry_account_valid_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountBalanceCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("closed_at", models.DateTimeField()),
+                ("balance", models.IntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkpoints",
+                        to="bank.account",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("account", "date")},
+            },
+        ),
+    ]
@@ -2,9 +2,9 @@ import logging
 
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Exists, Q, Subquery, Sum
 from django.db.models.functions import Coalesce
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -79,10 +79,20 @@ class Account(models.Model):
         return self.type == Account.DEBIT
 
     def get_balance(self):
-        # sum all valid entries for this account
-        return self.entries.filter(valid=True).aggregate(
-            total_amount=Coalesce(Sum("amount"), 0)
-        )["total_amount"]
+        # sum the valid entries for this account since its latest checkpoint,
+        # or since the first entry if it has none
+        latest = self.checkpoints.order_by("-date")[:1]
+        return (
+            self.entries.filter(valid=True)
+            .filter(
+                ~Exists(latest)
+                | Q(transaction__date__gte=Subquery(latest.values("closed_at")))
+            )
+            .aggregate(
+                total_amount=Coalesce(Sum("amount"), 0)
+                + Coalesce(Subquery(latest.values("balance")), 0)
+            )["total_amount"]
+        )
 
     def balance_at_entry(self, entry):
         # return the balance of the account after the entry was recorded
@@ -96,6 +106,26 @@ class Account(models.Model):
         return [o.first_name for o in self.owners.all()]
 
 
+class AccountBalanceCheckpoint(models.Model):
+    # the balance of an account at the close of a day, so balances can be
+    # worked out from here rather than from the first entry. see
+    # bank.balances.
+    account = models.ForeignKey(
+        Account, related_name="checkpoints", on_delete=models.CASCADE
+    )
+    date = models.DateField()
+    # entries of transactions dated before this are counted in the balance
+    closed_at = models.DateTimeField()
+    balance = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("account", "date")
+
+    def __str__(self):
+        return f"{self.account} on {self.date}: {self.balance}"
+
+
 class SystemAccounts(models.Model):
     # money coming into or out of the system (either due to real transfers or
     # minting) is recorded in these accounts.
@@ -121,8 +151,16 @@ class Transaction(models.Model):
     def __str__(self):
         return f"Transaction {self.pk}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so that moving a transaction can invalidate checkpoints
+        instance._loaded_date = instance.__dict__.get("date")
+        return instance
+
     def save(self, *args, **kwargs):
-        entries = self.entries.all()
+        # an unsaved transaction can't have entries yet
+        entries = self.entries.all() if self.pk else []
         if len(entries) < 2:
             # this is a fresh transaction, or only the first entry
             self.valid = False
@@ -152,8 +190,11 @@ class Transaction(models.Model):
 
             self.valid = True
             # call update instead of save() so we don't end up in an infinite
-            # loop of save()'s calling each other.
-            Entry.objects.filter(transaction=self).update(valid=True)
+            # loop of save()'s calling each other. update() sends no signals,
+            # so the checkpoints the newly valid entries change are dropped
+            # here.
+            if Entry.objects.filter(transaction=self, valid=False).update(valid=True):
+                invalidate_checkpoints([e.account_id for e in entries], self.date)
 
         super().save(*args, **kwargs)
 
@@ -181,6 +222,10 @@ class Entry(models.Model):
     class Meta:
         verbose_name_plural = "Entries"
         ordering = ["-transaction__date"]
+        indexes = [
+            # Account.get_balance() and balance_at_entry()
+            models.Index(fields=["account", "valid"], name="entry_account_valid"),
+        ]
 
     def __str__(self):
         return "Entry: account %s for %d" % (self.account, self.amount)
@@ -192,10 +237,17 @@ class Entry(models.Model):
         # if self.transaction:
         entries = self.transaction.entries.all()
         balance = sum([e.amount for e in entries])
-        if balance == 0:
-            Entry.objects.filter(transaction=self.transaction).update(valid=True)
-        else:
-            Entry.objects.filter(transaction=self.transaction).update(valid=False)
+        valid = balance == 0
+        # update() sends no signals, so when this flips the other entry too
+        # the checkpoints of every account in the transaction are dropped here
+        if (
+            Entry.objects.filter(transaction=self.transaction)
+            .exclude(valid=valid)
+            .update(valid=valid)
+        ):
+            invalidate_checkpoints(
+                [e.account_id for e in entries], self.transaction.date
+            )
         self.transaction.save()
 
     def with_account(self):
@@ -229,6 +281,29 @@ def entry_pre_save(sender, instance, **kwargs):
         )
 
 
+def invalidate_checkpoints(accounts, since):
+    # checkpoints that closed after since may no longer match the entries
+    AccountBalanceCheckpoint.objects.filter(
+        account__in=accounts, closed_at__gt=since
+    ).delete()
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def entry_changed(sender, instance, **kwargs):
+    invalidate_checkpoints([instance.account_id], instance.transaction.date)
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    loaded_date = getattr(instance, "_loaded_date", None)
+    if loaded_date and loaded_date != instance.date:
+        invalidate_checkpoints(
+            instance.entries.values("account"), min(loaded_date, instance.date)
+        )
+        instance._loaded_date = instance.date
+
+
 """ check that transaction entries sum to 0
     that the spending user will have an allowable balance after the transaction is completed.
     that the correct permissions are in place for both accounts
@@ -0,0 +1,112 @@
+"""Account statements.
+
+A statement lists an account's entries newest first, with the account on the
+other side of each transaction and the balance after it, all worked out by the
+database in one query per page: the counterparty is a subquery on the other
+entry of the transaction, and the balance is the opening balance of the page
+less a running SUM() OVER the entries since. Pages are keyed on the last entry
+shown rather than an offset, and the cursor carries the balance to open the
+next page with, so the cost of a page doesn't grow with the account's history.
+
+Cursors are signed, since the balance they carry is shown back to the user.
+"""
+
+import datetime
+
+from django.core import signing
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce
+
+from bank.models import Entry
+
+PAGE_SIZE = 50
+CURSOR_SALT = "bank.statements"
+
+_valid_amount = Case(
+    When(valid=True, then=F("amount")), default=Value(0), output_field=IntegerField()
+)
+
+
+def _with_counterparty(entries):
+    other = Entry.objects.filter(transaction=OuterRef("transaction")).exclude(
+        pk=OuterRef("pk")
+    )
+    return entries.select_related("transaction").annotate(
+        counterparty_id=Subquery(other.values("account_id")[:1]),
+        counterparty_name=Subquery(other.values("account__name")[:1]),
+    )
+
+
+def _dumps_cursor(entry, balance):
+    return signing.dumps(
+        [entry.transaction.date.isoformat(), entry.id, balance], salt=CURSOR_SALT
+    )
+
+
+def _loads_cursor(cursor):
+    try:
+        date, entry_id, balance = signing.loads(cursor, salt=CURSOR_SALT)
+        return datetime.datetime.fromisoformat(date), int(entry_id), int(balance)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValueError("invalid statement cursor") from None
+
+
+def statement_page(account, cursor=None, size=PAGE_SIZE):
+    """one page of account's statement, newest first, and the cursor for the
+    next (older) page, or None on the last page. each entry is annotated with
+    counterparty_id, counterparty_name and balance. raises ValueError for a
+    cursor that wasn't made here."""
+    entries = account.entries.all()
+    if cursor:
+        date, entry_id, opening = _loads_cursor(cursor)
+        entries = entries.filter(
+            Q(transaction__date__lt=date) | Q(transaction__date=date, id__lt=entry_id)
+        )
+    else:
+        opening = account.get_balance()
+
+    newest_first = [F("transaction__date").desc(), F("id").desc()]
+    entries = (
+        _with_counterparty(entries)
+        .annotate(
+            # valid amounts from the top of the page down to this entry
+            since=Window(Sum(_valid_amount), order_by=newest_first),
+            balance=Value(opening) - F("since") + _valid_amount,
+        )
+        .order_by(*newest_first)
+    )
+    page = list(entries[: size + 1])
+    next_cursor = None
+    if len(page) > size:
+        page = page[:size]
+        last = page[-1]
+        # the balance before the last entry on this page
+        next_cursor = _dumps_cursor(last, opening - last.since)
+    return page, next_cursor
+
+
+def statement_rows(account):
+    """every entry of account, oldest first, with counterparty and balance,
+    for exports. reads in chunks so long histories aren't held in memory."""
+    oldest_first = [F("transaction__date").asc(), F("id").asc()]
+    entries = (
+        _with_counterparty(account.entries.all())
+        .annotate(
+            balance=Coalesce(
+                Window(Sum(_valid_amount), order_by=oldest_first), Value(0)
+            )
+        )
+        .order_by(*oldest_first)
+    )
+    return entries.iterator(chunk_size=500)
@@ -1,13 +1,16 @@
+import csv
 import logging
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.utils.decorators import method_decorator
 from django.views.generic import View
 
-from bank import forms, models
+from bank import forms, models, statements
 
 logger = logging.getLogger(__name__)
 
@@ -30,25 +33,80 @@ def create_transaction(reason, amount, from_account, to_account):
         return False
 
 
+def viewable_account(request, account_id):
+    """the account, if request.user owns or administers it."""
+    account = models.Account.objects.select_related("currency").get(id=account_id)
+    assert (
+        account.owners.filter(id=request.user.id).exists()
+        or account.admins.filter(id=request.user.id).exists()
+    )
+    return account
+
+
+class Echo:
+    # a file-like object for csv.writer that hands back each line instead of
+    # buffering it, so a statement can be streamed
+    def write(self, value):
+        return value
+
+
 # Create your views here.
 class AccountDetail(View):
     template_name = "accounts_detail.html"
 
     def get(self, request, account_id):
         try:
-            account = models.Account.objects.get(id=account_id)
-            # ensure user has permissions
-            assert (
-                request.user in account.owners.all()
-                or request.user in account.admins.all()
+            account = viewable_account(request, account_id)
+            entries, next_cursor = statements.statement_page(
+                account, request.GET.get("before")
             )
-            return render(request, self.template_name, {"account": account})
         except Exception:
             messages.info(
                 request,
                 "The account does not exist or you are not authorized.",
             )
             return HttpResponseRedirect("/404")
+        return render(
+            request,
+            self.template_name,
+            {
+                "account": account,
+                "entries": entries,
+                "next_cursor": next_cursor,
+                "first_page": "before" not in request.GET,
+            },
+        )
+
+
+class AccountStatementCSV(View):
+    def get(self, request, account_id):
+        try:
+            account = viewable_account(request, account_id)
+        except Exception:
+            messages.info(
+                request,
+                "The account does not exist or you are not authorized.",
+            )
+            return HttpResponseRedirect("/404")
+
+        def rows():
+            yield ["Date", "Reason", "With account", "Amount", "Balance"]
+            for entry in statements.statement_rows(account):
+                yield [
+                    entry.transaction.date.isoformat(),
+                    entry.transaction.reason,
+                    entry.counterparty_name if entry.valid else "INVALID",
+                    entry.amount,
+                    entry.balance,
+                ]
+
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in rows()), content_type="text/csv"
+        )
+        output_filename = f"{account.name} Statement.csv"
+        response["Content-Disposition"] = f'attachment; filename="{output_filename}"'
+        return response
 
 
 class AccountList(View):
@@ -57,8 +115,16 @@ class AccountList(View):
 
     @method_decorator(login_required)
     def get(self, request):
-        accounts = models.Account.objects.filter(owners=request.user).order_by(
-            "currency"
+        accounts = (
+            models.Account.objects.filter(owners=request.user)
+            .select_related("currency")
+            .prefetch_related("owners", "primary_for")
+            .annotate(
+                balance=Coalesce(
+                    Sum("entries__amount", filter=Q(entries__valid=True)), 0
+                )
+            )
+            .order_by("currency")
         )
         transaction_form = self.form_class(request.user)
         return render(
@@ -2,8 +2,10 @@ from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
 
 from core import models
+from core.billing import regenerate_bills
 from core.emails import messages as email_messages
 from gather import models as gather_models
 
@@ -147,17 +149,20 @@ class BookingAdmin(admin.ModelAdmin):
     def value(self):
         return "$%d" % self.base_value()
 
+    # the bill columns use the totals annotated in get_queryset() rather than
+    # querying each row's bill
+
     def bill(self):
-        return "$%d" % self.bill.amount()
+        return "$%d" % self.bill_amount
 
     def fees(self):
-        return "$%d" % self.bill.non_house_fees()
+        return "$%d" % self.bill_non_house_fees
 
     def to_house(self):
-        return "$%d" % self.to_house()
+        return "$%d" % (self.base_value() - self.bill_house_fees)
 
     def paid(self):
-        return "$%d" % self.bill.total_paid()
+        return "$%d" % self.bill_paid
 
     def user_profile(self):
         return f"""<a href="/people/{self.use.user.username}">{self.use.user.first_name} {self.use.user.last_name}</a> ({self.use.user.username})"""
@@ -206,8 +211,8 @@ class BookingAdmin(admin.ModelAdmin):
         self.message_user(request, msg)
 
     def mark_as_comp(self, request, queryset):
-        for res in queryset:
-            res.comp()
+        queryset.update(rate=0)
+        regenerate_bills(queryset)
         msg = gen_message(queryset, "booking", "bookings", "marked as comp")
         self.message_user(request, msg)
 
@@ -236,18 +241,24 @@ class BookingAdmin(admin.ModelAdmin):
         self.message_user(request, msg)
 
     def reset_rate(self, request, queryset):
-        for res in queryset:
-            res.reset_rate()
+        default_rate = models.Use.objects.filter(pk=OuterRef("use_id")).values(
+            "resource__default_rate"
+        )[:1]
+        queryset.update(rate=Subquery(default_rate))
+        regenerate_bills(queryset)
         msg = gen_message(queryset, "booking", "bookings", "set to default rate")
         self.message_user(request, msg)
 
     def recalculate_bill(self, request, queryset):
-        for res in queryset:
-            res.generate_bill()
+        regenerate_bills(queryset)
         msg = gen_message(queryset, "bill", "bills", "recalculated")
         self.message_user(request, msg)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_bill_totals()
+
     list_filter = ("status_deprecated", "location_deprecated")
+    list_select_related = ("use__user", "use__resource", "resource_deprecated")
     list_display = (
         "id",
         user_profile,
@@ -0,0 +1,53 @@
+"""Running side effects after the response has been sent.
+
+Notifications and other work a request doesn't need to wait for are handed to
+after_commit(), which runs them on a small thread pool once the current
+transaction commits (straight away when there is no transaction), so a booking
+that is rolled back never sends an email and a slow Mailgun doesn't hold up
+the page. Tasks should take ids rather than model instances and load what they
+need, since they run on another thread with their own database connection.
+
+Tasks live in the web process: ones still queued when a worker is restarted
+are lost, so only use this for things that are fine to miss once in a while.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _background_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASK_WORKERS,
+            thread_name_prefix="background-tasks",
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"background task {func.__name__} failed")
+    finally:
+        # connections belong to the thread that opened them
+        connections.close_all()
+
+
+def after_commit(func, *args, **kwargs):
+    """call func(*args, **kwargs) in the background once the current
+    transaction commits, or right away when BACKGROUND_TASKS_ASYNC is off."""
+    if not settings.BACKGROUND_TASKS_ASYNC:
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(
+        lambda: _background_executor().submit(_run, func, args, kwargs)
+    )
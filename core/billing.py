@@ -0,0 +1,95 @@
+"""Regenerating the bills of many bookings at once.
+
+Booking.generate_bill() is fine for a single booking, but re-billing every
+booking at a location (e.g. after a fee percentage changes) that way costs
+several queries per booking. regenerate_bills() loads the location fees,
+suppressed fees and custom line items for a whole batch of bookings up front
+and replaces their line items with one delete and one bulk insert. The
+bookings' outstanding balances are refreshed once per batch.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import (
+    Bill,
+    BillLineItem,
+    Booking,
+    BookingBill,
+    LocationFee,
+    defer_balance_refresh,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def regenerate_bills(bookings, batch_size=BATCH_SIZE):
+    """regenerate the bills of the given bookings (a queryset or any iterable
+    of bookings), with the same result as calling generate_bill() on each.
+    returns the number of bills regenerated."""
+    if hasattr(bookings, "values_list"):
+        booking_ids = list(bookings.values_list("id", flat=True))
+    else:
+        booking_ids = [booking.id for booking in bookings]
+
+    location_fees = {}
+    for batch_ids in _batches(booking_ids, batch_size):
+        with transaction.atomic(), defer_balance_refresh() as changed_bills:
+            changed_bills.update(_regenerate_batch(batch_ids, location_fees))
+    logger.debug(f"regenerated {len(booking_ids)} bills")
+    return len(booking_ids)
+
+
+def _regenerate_batch(booking_ids, location_fees):
+    batch = list(
+        Booking.objects.filter(id__in=booking_ids)
+        .select_related("use__resource", "bill")
+        .prefetch_related("suppressed_fees")
+    )
+
+    missing_bill = [booking for booking in batch if booking.bill is None]
+    for booking in missing_bill:
+        booking.bill = BookingBill.objects.create()
+    if missing_bill:
+        Booking.objects.bulk_update(missing_bill, ["bill"])
+
+    # location fees don't change while re-billing, so they are shared by all
+    # batches
+    new_locations = {booking.use.location_id for booking in batch} - set(location_fees)
+    for location_id in new_locations:
+        location_fees[location_id] = []
+    for location_fee in LocationFee.objects.filter(
+        location_id__in=new_locations
+    ).select_related("fee"):
+        location_fees[location_fee.location_id].append(location_fee)
+
+    bill_ids = [booking.bill_id for booking in batch]
+    custom_items = defaultdict(list)
+    for item in BillLineItem.objects.filter(bill_id__in=bill_ids, custom=True):
+        custom_items[item.bill_id].append(item)
+
+    new_items = []
+    for booking in batch:
+        suppressed_fee_ids = {fee.id for fee in booking.suppressed_fees.all()}
+        line_items = booking.compute_line_items(
+            booking.bill,
+            custom_items[booking.bill_id],
+            location_fees[booking.use.location_id],
+            suppressed_fee_ids,
+        )
+        new_items.extend(item for item in line_items if not item.custom)
+
+    BillLineItem.objects.filter(bill_id__in=bill_ids, custom=False).delete()
+    BillLineItem.objects.bulk_create(new_items)
+    Bill.objects.filter(id__in=bill_ids).update(generated_on=timezone.now())
+    return bill_ids
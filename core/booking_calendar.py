@@ -3,6 +3,8 @@ from datetime import date, timedelta
 
 from django.utils.html import conditional_escape as esc
 
+from core.models import prefetch_availabilities
+
 
 class GuestCalendar(HTMLCalendar):
     def __init__(self, uses, year, month, location):
@@ -11,6 +13,7 @@ class GuestCalendar(HTMLCalendar):
         super().__init__()
         self.uses = self.group_by_day(uses)
         self.location = location
+        self.free_days = self.days_with_capacity()
 
     def formatday(self, day, weekday):
         if day != 0:
@@ -22,8 +25,7 @@ class GuestCalendar(HTMLCalendar):
                 body = ["<ul>"]
                 num_today = len(self.uses[day])
                 this_date = date(self.year, self.month, day)
-                any_capacity = self.location.rooms_free(this_date, tomorrow)
-                if not any_capacity:
+                if this_date not in self.free_days:
                     cssclass += " full-today"
                 for use in self.uses[day]:
                     body.append('<li id="res%d-cal-item">' % use.booking.id)
@@ -51,6 +53,22 @@ class GuestCalendar(HTMLCalendar):
             return self.day_cell(cssclass, day)
         return self.day_cell("noday", "&nbsp;")
 
+    def days_with_capacity(self):
+        """the days of the month on which any room has a free bed, found for
+        the whole month at once."""
+        first = date(self.year, self.month, 1)
+        last = date(self.year + self.month // 12, self.month % 12 + 1, 1) - timedelta(1)
+        rooms = list(self.location.resources.all())
+        prefetch_availabilities(rooms, first, last)
+        return {
+            day
+            for room in rooms
+            for day, quantity in room.daily_availabilities_within(
+                first, last, uses=room.confirmed_uses
+            )
+            if quantity > 0
+        }
+
     def group_by_day(self, uses):
         """create a dictionary of day: items key-value pairs, where items is
         a list of all uses that intersect this day."""
@@ -0,0 +1,116 @@
+"""Per-location caching for public location pages and context processors.
+
+Every key is namespaced by a version number stored in the cache itself, one per
+location plus one for the network as a whole. Invalidating a location is just a
+matter of bumping its version (see the receivers at the bottom of
+core/models.py); stale entries are never read again and age out on their own.
+
+The versions live in the same cache as the entries, so a bump only reaches the
+processes that share that cache. With the default in-memory cache every
+gunicorn worker keeps its own versions, and the others go on serving their
+entries until these time out.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+NETWORK = "network"
+
+
+def _timeout():
+    return getattr(settings, "LOCATION_CACHE_TIMEOUT", 60 * 15)
+
+
+def _version_key(scope):
+    return f"location-cache:version:{scope}"
+
+
+def _new_version():
+    # versions start from the clock, so a version that was evicted, or lost
+    # with a restart, is never handed out again while its entries live on
+    return time.time_ns() // 1000
+
+
+def location_version(scope):
+    """the current version of a location (by id) or of the NETWORK scope."""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            # another process added one first
+            version = cache.get(key, version)
+    return version
+
+
+def location_cache_key(scope, name):
+    return f"location-cache:{scope}:{location_version(scope)}:{name}"
+
+
+def bump_location_version(scope):
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # nothing stored yet (or it was evicted)
+        cache.set(key, _new_version(), None)
+    logger.debug(f"bumped location cache version for {scope}")
+
+
+def cached_for_location(scope, name, compute, timeout=None):
+    """return the cached value of `name` for this scope, calling `compute()`
+    to fill it on a miss."""
+    key = location_cache_key(scope, name)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, _timeout() if timeout is None else timeout)
+    return value
+
+
+def invalidate_location(location_id):
+    if location_id:
+        bump_location_version(location_id)
+
+
+def invalidate_network():
+    bump_location_version(NETWORK)
+
+
+def get_cached_location(location_slug):
+    """look up a location by slug through the cache. returns None if there is
+    no such location."""
+    from core.models import Location
+
+    location_id = cached_for_location(
+        NETWORK,
+        f"slug:{location_slug}",
+        # cache misses as 0 so unknown slugs don't hit the db every time
+        lambda: (
+            Location.objects.filter(slug=location_slug)
+            .values_list("id", flat=True)
+            .first()
+            or 0
+        ),
+    )
+    if not location_id:
+        return None
+    return (
+        cached_for_location(
+            location_id,
+            "location",
+            lambda: Location.objects.filter(pk=location_id).first() or 0,
+        )
+        or None
+    )
+
+
+def get_cached_locations():
+    from core.models import Location
+
+    return cached_for_location(NETWORK, "all", lambda: list(Location.objects.all()))
@@ -1,23 +1,33 @@
-import re
+from django.utils.functional import SimpleLazyObject
 
-from core.models import Location
+from core.cache import get_cached_location, get_cached_locations
 
 
 def network_locations(request):
-    return {"network_locations": Location.objects.all()}
+    # lazy so that pages which never render the list don't touch the cache
+    return {"network_locations": SimpleLazyObject(get_cached_locations)}
+
+
+def _location_slug_from_path(path):
+    # flatpages are served by the fallback middleware without ever resolving
+    # a view, so LocationMiddleware can't see their slug. they all live under
+    # /locations/<slug>/...
+    parts = path.split("/")
+    if len(parts) > 3 and parts[1] == "locations":
+        return parts[2]
+    return None
 
 
 def location_variables(request):
-    match = re.match(r"^/locations/(?P<location_slug>[^/]*)/.*", request.path)
-    if match:
-        location_slug = match.group("location_slug")
-        location = Location.objects.filter(slug=location_slug).first()
-        if location:
-            location_about_path = f"locations/{location_slug}/about/"
-            location_stay_path = f"locations/{location_slug}/stay/"
-            return {
-                "location": location,
-                "location_about_path": location_about_path,
-                "location_stay_path": location_stay_path,
-            }
+    location = getattr(request, "location", None)
+    if location is None:
+        location_slug = _location_slug_from_path(request.path)
+        if location_slug:
+            location = get_cached_location(location_slug)
+    if location:
+        return {
+            "location": location,
+            "location_about_path": f"locations/{location.slug}/about/",
+            "location_stay_path": f"locations/{location.slug}/stay/",
+        }
     return {}
@@ -0,0 +1,144 @@
+"""Sending reads to a read replica.
+
+When a "replica" database is configured (DATABASE_REPLICA_URL), reads made
+inside replica_reads() go to it: views marked with core.decorators.read_replica
+(see ReplicaMiddleware), GraphQL queries, and whatever management commands
+wrap in it. Everything else, and every write, uses the primary.
+
+Reads fall back to the primary while the replica lags more than
+REPLICA_MAX_LAG seconds or can't be reached, once the block has written
+anything, and for a few seconds after a client's request wrote something
+(REPLICA_PIN_SECONDS), so that people see their own changes.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# how often, in seconds, to ask the replica how far behind it is
+LAG_CHECK_INTERVAL = 5
+
+# the cookie that keeps a client on the primary after a write
+PIN_COOKIE = "primary_pin"
+
+_reads = ContextVar("replica_reads", default=False)
+# set by a write inside replica_reads()
+_pinned = ContextVar("replica_pinned", default=False)
+# set by a write inside track_writes()
+_wrote = ContextVar("wrote", default=False)
+
+_health = {"checked": None, "available": False}
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def replica_alias():
+    alias = settings.REPLICA_DATABASE
+    return alias if alias in settings.DATABASES else None
+
+
+def replica_lag(alias):
+    """seconds the replica is behind the primary, or None if unknown."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        # nothing to measure, e.g. two sqlite aliases in development
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return None if lag is None else float(lag)
+
+
+def replica_available():
+    """whether the replica is reachable and close enough to the primary.
+    checked at most every LAG_CHECK_INTERVAL seconds per process."""
+    alias = replica_alias()
+    if alias is None:
+        return False
+    now = time.monotonic()
+    checked = _health["checked"]
+    if checked is None or now - checked >= LAG_CHECK_INTERVAL:
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            logger.warning("read replica unreachable, reading from primary")
+            lag = None
+        available = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        if lag is not None and not available:
+            logger.warning(f"read replica is {lag:.1f}s behind, reading from primary")
+        _health["checked"] = now
+        _health["available"] = available
+    return _health["available"]
+
+
+def replica_allowed(request):
+    """whether there is a replica and the client isn't pinned to the primary
+    by a recent write."""
+    return replica_alias() is not None and PIN_COOKIE not in request.COOKIES
+
+
+@contextmanager
+def replica_reads():
+    """read from the replica inside this block, until something is written."""
+    reads = _reads.set(True)
+    pinned = _pinned.set(False)
+    try:
+        yield
+    finally:
+        _reads.reset(reads)
+        _pinned.reset(pinned)
+
+
+@contextmanager
+def primary_reads():
+    """read from the primary inside this block, even within replica_reads()."""
+    reads = _reads.set(False)
+    try:
+        yield
+    finally:
+        _reads.reset(reads)
+
+
+@contextmanager
+def track_writes():
+    """yields a function that tells whether the block has written to the
+    database."""
+    wrote = _wrote.set(False)
+    try:
+        yield _wrote.get
+    finally:
+        _wrote.reset(wrote)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reads.get() and not _pinned.get() and replica_available():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        # never the replica, even for objects that were read from it
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.REPLICA_DATABASE:
+            return False
+        return None
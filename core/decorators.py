@@ -4,7 +4,43 @@ from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.http import HttpResponseRedirect
 
-from core.models import get_location
+from core.shortcuts import get_request_location
+
+
+def query_budget(max_queries):
+    """Declare the most database queries a view should need per request,
+    including those made by middleware. QueryInstrumentationMiddleware logs a
+    warning when a request goes over, and raises under test."""
+
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+
+    return decorator
+
+
+def read_replica(view_func):
+    """Let ReplicaMiddleware send the view's reads to the read replica. Only
+    for views that don't write and can show data a few seconds old, like
+    reports."""
+    view_func.read_replica = True
+    return view_func
+
+
+def async_login_required(view_func):
+    """login_required for async views, which Django's own decorator only
+    supports from 5.1."""
+
+    @wraps(view_func)
+    async def decorator(request, *args, **kwargs):
+        user = await request.auser()
+        if user.is_authenticated:
+            return await view_func(request, *args, **kwargs)
+        from django.contrib.auth.views import redirect_to_login
+
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    return decorator
 
 
 def group_required(*group_names):
@@ -22,7 +58,7 @@ def group_required(*group_names):
 def house_admin_required(original_func):
     @wraps(original_func)
     def decorator(request, location_slug, *args, **kwargs):
-        location = get_location(location_slug)
+        location = get_request_location(request, location_slug)
         user = request.user
         if user.is_authenticated and location and user in location.house_admins.all():
             return original_func(request, location_slug, *args, **kwargs)
@@ -41,7 +77,7 @@ def house_admin_required(original_func):
 def resident_or_admin_required(original_func):
     @wraps(original_func)
     def decorator(request, location_slug, *args, **kwargs):
-        location = get_location(location_slug)
+        location = get_request_location(request, location_slug)
         user = request.user
         if (
             user.is_authenticated
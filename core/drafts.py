@@ -0,0 +1,112 @@
+"""Booking requests from people who aren't logged in yet.
+
+When someone who isn't logged in submits a booking, the request is kept as a
+signed, compressed token until they have registered or logged in: the
+resource, dates and what they typed, nothing else. The token lives in a cookie
+(in the session only if the guest wrote an essay that won't fit), so the
+public booking form doesn't write to the session table. Nothing is billed
+until the draft is turned into a real booking; the registration page computes
+a preview bill only when it is rendered.
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.core import signing
+
+from core import models
+
+logger = logging.getLogger(__name__)
+
+DRAFT_COOKIE = "booking_draft"
+DRAFT_SALT = "core.drafts"
+# browsers drop cookies over 4kB, name and attributes included
+MAX_COOKIE_TOKEN = 3800
+
+
+def dumps(use, comments):
+    return signing.dumps(
+        {
+            "resource": use.resource_id,
+            "arrive": use.arrive.isoformat(),
+            "depart": use.depart.isoformat(),
+            "purpose": use.purpose,
+            "arrival_time": use.arrival_time,
+            "comments": comments,
+        },
+        salt=DRAFT_SALT,
+        compress=True,
+    )
+
+
+def loads(token):
+    """the draft in token, or None if it has been tampered with or expired."""
+    try:
+        return signing.loads(
+            token, salt=DRAFT_SALT, max_age=settings.BOOKING_DRAFT_MAX_AGE
+        )
+    except signing.BadSignature:
+        logger.info("ignoring an invalid or expired booking draft")
+        return None
+
+
+def save_draft(request, response, use, comments):
+    """remember a booking request until the guest has logged in."""
+    token = dumps(use, comments)
+    if len(token) <= MAX_COOKIE_TOKEN:
+        response.set_cookie(
+            DRAFT_COOKIE,
+            token,
+            max_age=settings.BOOKING_DRAFT_MAX_AGE,
+            secure=request.is_secure(),
+            httponly=True,
+            samesite="Lax",
+        )
+    else:
+        request.session[DRAFT_COOKIE] = token
+    return response
+
+
+def pending_draft(request):
+    token = request.COOKIES.get(DRAFT_COOKIE) or request.session.get(DRAFT_COOKIE)
+    return loads(token) if token else None
+
+
+def clear_draft(request, response):
+    request.session.pop(DRAFT_COOKIE, None)
+    response.delete_cookie(DRAFT_COOKIE, samesite="Lax")
+    return response
+
+
+def _unsaved_booking(draft, user=None):
+    resource = models.Resource.objects.select_related("location").get(
+        id=draft["resource"]
+    )
+    use = models.Use(
+        arrive=datetime.date.fromisoformat(draft["arrive"]),
+        depart=datetime.date.fromisoformat(draft["depart"]),
+        location=resource.location,
+        resource=resource,
+        purpose=draft["purpose"],
+        arrival_time=draft["arrival_time"],
+        user=user,
+    )
+    return models.Booking(
+        use=use, comments=draft["comments"], rate=resource.default_rate
+    )
+
+
+def preview(draft):
+    """the draft in the shape of Booking.serialize(), bill included, for
+    showing the guest what they're about to request."""
+    return _unsaved_booking(draft).serialize()
+
+
+def materialize(draft, user):
+    """create the use and booking a draft describes, billed once."""
+    booking = _unsaved_booking(draft, user)
+    booking.use.save()
+    booking.save()
+    booking.generate_bill()
+    return booking
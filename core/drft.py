@@ -0,0 +1,53 @@
+"""Whether a guest can pay for a stay in DRFT.
+
+Booking pages ask this on every render, so the answers are cheap: whether a
+resource accepts DRFT for a range of nights is a single query over its
+capacity changes (see CapacityChangeManager.drft_between), and a guest's
+spending balance is read from their primary DRFT account without creating one
+when they don't have it. The primary account id is remembered on the user's
+profile for the rest of the request, so asking twice only costs the balance.
+"""
+
+import logging
+
+from bank.models import Account
+
+logger = logging.getLogger(__name__)
+
+DRFT = "DRFT"
+_UNKNOWN = object()
+
+
+def primary_account_id(user):
+    """the id of user's primary DRFT account, or None if they don't have one."""
+    profile = user.profile
+    account_id = getattr(profile, "_primary_drft_account_id", _UNKNOWN)
+    if account_id is _UNKNOWN:
+        account_id = (
+            profile.primary_accounts.filter(currency__name=DRFT)
+            .values_list("id", flat=True)
+            .first()
+        )
+        profile._primary_drft_account_id = account_id
+    return account_id
+
+
+def forget_primary_account(profile):
+    profile.__dict__.pop("_primary_drft_account_id", None)
+
+
+def spending_balance(user):
+    """user's DRFT balance; 0 if they have no primary DRFT account."""
+    account_id = primary_account_id(user)
+    if account_id is None:
+        return 0
+    return Account(id=account_id).get_balance()
+
+
+def eligible(use):
+    """whether use's guest has enough DRFT for it and the resource accepts
+    DRFT on every night of it."""
+    return (
+        use.resource.drftable_between(use.arrive, use.depart)
+        and spending_balance(use.user) >= use.total_nights()
+    )
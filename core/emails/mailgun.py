@@ -1,3 +1,5 @@
+import contextlib
+import json
 import logging
 
 import httpx
@@ -6,14 +8,17 @@ from django.http import HttpResponse
 
 logger = logging.getLogger(__name__)
 
+# the most recipients Mailgun accepts in one batch send
+BATCH_SIZE = 1000
 
-def mailgun_send(mailgun_data, files_dict=None):
+
+def _prepare(mailgun_data, files_dict):
     logger.debug(f"Mailgun send: {mailgun_data}")
     logger.debug(f"Mailgun files: {files_dict}")
 
     if not settings.MAILGUN_API_KEY:
         logger.error("Mailgun API key is not defined.")
-        return HttpResponse(status=500)
+        return False
 
     if not settings.MAILGUN_CAUTION_SEND_REAL_MAIL:
         # We will see this message in the mailgun logs but nothing will
@@ -21,21 +26,83 @@ def mailgun_send(mailgun_data, files_dict=None):
         # overwritten by other functions.
         mailgun_data["o:testmode"] = "yes"
         logger.debug("mailgun_send: o:testmode={}".format(mailgun_data["o:testmode"]))
+    return True
+
+
+def _messages_url():
+    return f"{settings.MAILGUN_API_URL}/{settings.LIST_DOMAIN}/messages"
+
+
+def _response(resp):
+    if resp.status_code != 200:
+        logger.debug("Mailgun POST returned %d" % resp.status_code)
+    return HttpResponse(status=resp.status_code)
+
+
+def _connection_error(mailgun_data):
+    logger.error(
+        'Connection error. Email "{}" aborted.'.format(mailgun_data["subject"])
+    )
+    return HttpResponse(status=500)
+
+
+def mailgun_send(mailgun_data, files_dict=None):
+    if not _prepare(mailgun_data, files_dict):
+        return HttpResponse(status=500)
 
     try:
         resp = httpx.post(
-            f"https://api.mailgun.net/v2/{settings.LIST_DOMAIN}/messages",
+            _messages_url(),
             auth=("api", settings.MAILGUN_API_KEY),
             data=mailgun_data,
             files=files_dict,
         )
+    except httpx.ConnectionError:
+        return _connection_error(mailgun_data)
+    return _response(resp)
 
-        if resp.status_code != 200:
-            logger.debug("Mailgun POST returned %d" % resp.status_code)
-        return HttpResponse(status=resp.status_code)
 
-    except httpx.ConnectionError:
-        logger.error(
-            'Connection error. Email "{}" aborted.'.format(mailgun_data["subject"])
-        )
+async def amailgun_send(mailgun_data, files_dict=None):
+    """mailgun_send() for async views, which under ASGI don't hold a thread
+    while Mailgun answers."""
+    if not _prepare(mailgun_data, files_dict):
         return HttpResponse(status=500)
+
+    try:
+        # a client per message: under WSGI every async view runs in an event
+        # loop of its own, and pooled connections can't outlive their loop
+        async with httpx.AsyncClient() as client:
+            resp = await client.post(
+                _messages_url(),
+                auth=("api", settings.MAILGUN_API_KEY),
+                data=mailgun_data,
+                files=files_dict,
+            )
+    except httpx.ConnectionError:
+        return _connection_error(mailgun_data)
+    return _response(resp)
+
+
+async def amailgun_send_batch(mailgun_data, recipients, attachments=()):
+    """Send one message to every address in recipients, each seeing only
+    their own address, with a request per BATCH_SIZE recipients rather than
+    one per recipient. attachments are (field, path, filename, content_type)
+    tuples for files on disk, which are streamed from disk for each batch.
+    Returns the first failed response, or the last one."""
+    response = HttpResponse(status=200)
+    for start in range(0, len(recipients), BATCH_SIZE):
+        batch = recipients[start : start + BATCH_SIZE]
+        data = dict(mailgun_data, to=batch)
+        # recipient variables make Mailgun address a copy to each recipient
+        data["recipient-variables"] = json.dumps({address: {} for address in batch})
+        with contextlib.ExitStack() as files:
+            response = await amailgun_send(
+                data,
+                [
+                    (field, (filename, files.enter_context(open(path, "rb")), type_))
+                    for field, path, filename, type_ in attachments
+                ],
+            )
+        if response.status_code != 200:
+            break
+    return response
@@ -1,9 +1,12 @@
 import json
 import logging
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db.models import Q
 from django.http import HttpResponse
 from django.template import Context, Template, TemplateDoesNotExist
 from django.template.loader import get_template
@@ -11,13 +14,15 @@ from django.urls import reverse
 from django.utils import timezone, translation
 from django.views.decorators.csrf import csrf_exempt
 
-from core.emails.mailgun import mailgun_send
+from core.emails.mailgun import amailgun_send_batch, mailgun_send
+from core.images import rendition_url
 from core.models import (
+    Backing,
     LocationEmailTemplate,
     Use,
     get_location,
 )
-from gather.models import Event, EventAdminGroup, EventNotifications
+from gather.models import Event, EventAdminGroup
 from gather.tasks import events_pending, published_events_today_local
 
 logger = logging.getLogger(__name__)
@@ -148,7 +153,7 @@ def new_booking_notify(booking):
     c = {
         "location": location.name,
         "status": booking.use.status,
-        "user_image": settings.MEDIA_URL + str(booking.use.user.profile.image_thumb),
+        "user_image": rendition_url(booking.use.user.profile, "image_thumb") or "",
         "first_name": booking.use.user.first_name,
         "last_name": booking.use.user.last_name,
         "room_name": booking.use.resource.name,
@@ -455,15 +460,61 @@ def admin_daily_update(location):
 #              EMAIL ENDPOINTS             #
 ############################################
 
+# The list endpoints are async views: the message is put together with the
+# ORM in a worker thread, then handed to Mailgun without holding a thread
+# while it answers when served over ASGI. The _*_message functions return the arguments for
+# amailgun_send_batch, or the response to give right away.
+#
+# Attachments are written to temporary files as the upload is parsed, and
+# each batch of recipients streams them from there, so a message is uploaded
+# to Mailgun once per BATCH_SIZE recipients and never held in memory.
 
-@csrf_exempt
-def current(request, location_slug):
-    """email all residents, guests and admins who are current or currently at this location."""
+
+async def _forward(build_message, request, location_slug):
+    message = await sync_to_async(build_message)(request, location_slug)
+    if isinstance(message, HttpResponse):
+        return message
+    return await amailgun_send_batch(*message)
+
+
+def _spool_uploads(request):
+    # has to happen before request.POST or request.FILES is first read
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+
+
+def _attachments(request, field="attachment"):
+    return [
+        (field, upload.temporary_file_path(), upload.name, upload.content_type)
+        for upload in request.FILES.values()
+    ]
+
+
+def _resident_ids(location):
+    return Backing.objects.current().filter(resource__location=location).values("users")
+
+
+def _addresses(users, sender):
+    """the distinct email addresses of users other than sender, worked out by
+    the database."""
+    addresses = (
+        users.exclude(email="")
+        .exclude(email=sender)
+        .order_by()
+        .values_list("email", flat=True)
+        .distinct()
+    )
+    addresses = list(addresses)
+    logger.debug(f"recipients: {addresses}")
+    return addresses
+
+
+def _current_message(request, location_slug):
+    _spool_uploads(request)
     from_address = request.POST.get("from")
     if not User.objects.filter(email=from_address).exists():
         # You should only be able to send email if you are an already registered
         # user.
-        return
+        return HttpResponse(status=200)
 
     # fail gracefully if location does not exist
     try:
@@ -493,7 +544,6 @@ def current(request, location_slug):
         logger.info("message appears to be auto-submitted. reject silently")
         return HttpResponse(status=200)
 
-    recipient = request.POST.get("recipient")
     logger.debug(f"from: {from_address}")
     sender = request.POST.get("sender")
     logger.debug(f"sender: {sender}")
@@ -501,39 +551,24 @@ def current(request, location_slug):
     body_plain = request.POST.get("body-plain")
     body_html = request.POST.get("body-html")
 
-    # Add any current bookings
-    current_emails = []
-    for r in Use.objects.confirmed_on_date(today, location):
-        current_emails.append(r.user.email)
-
-    # Add all the residents at this location
-    for r in location.residents():
-        current_emails.append(r.email)
-
-    # Add the house admins
-    for a in location.house_admins.all():
-        current_emails.append(a.email)
-
-    # Now loop through all the emails and build the bcc list we will use.
-    # This makes sure there are no duplicate emails.
-    bcc_list = []
-    for email in current_emails:
-        if email not in bcc_list:
-            bcc_list.append(email)
-    logger.debug(f"bcc list: {bcc_list}")
+    # current guests, the residents and the house admins, less the sender
+    recipients = _addresses(
+        User.objects.filter(
+            Q(id__in=Use.objects.on_date(today, Use.CONFIRMED, location).values("user"))
+            | Q(id__in=_resident_ids(location))
+            | Q(id__in=location.house_admins.values("id"))
+        ),
+        sender,
+    )
 
     # Make sure this person can post to our list
-    # if not sender in bcc_list:
+    # if not sender in recipients:
     #    # TODO - This shoud possibly send a response so they know they were blocked
     #    logger.warn("Sender (%s) not allowed.  Exiting quietly." % sender)
     #    return HttpResponse(status=200)
-    if sender in bcc_list:
-        bcc_list.remove(sender)
 
     # Include attachements
-    attachments = []
-    for attachment in request.FILES.values():
-        attachments.append(("attachment", attachment))
+    attachments = _attachments(request)
 
     # prefix subject, but only if the prefix string isn't already in the
     # subject line (such as a reply)
@@ -555,10 +590,6 @@ def current(request, location_slug):
     list_address = f"current@{location.slug}.{settings.LIST_DOMAIN}"
     mailgun_data = {
         "from": from_address,
-        "to": [
-            recipient,
-        ],
-        "bcc": bcc_list,
         "subject": subject,
         "text": body_plain,
         "html": body_html,
@@ -571,7 +602,13 @@ def current(request, location_slug):
         # to be common these days
         "h:Reply-To": list_address,
     }
-    return mailgun_send(mailgun_data, attachments)
+    return mailgun_data, recipients, attachments
+
+
+@csrf_exempt
+async def current(request, location_slug):
+    """email all residents, guests and admins who are current or currently at this location."""
+    return await _forward(_current_message, request, location_slug)
 
 
 @csrf_exempt
@@ -702,9 +739,8 @@ def test80085(request, location_slug):
     return mailgun_send(mailgun_data, attachments)
 
 
-@csrf_exempt
-def stay(request, location_slug):
-    """email all admins at this location."""
+def _stay_message(request, location_slug):
+    _spool_uploads(request)
     # fail gracefully if location does not exist
     try:
         location = get_location(location_slug)
@@ -742,26 +778,17 @@ def stay(request, location_slug):
     body_plain = request.POST.get("body-plain")
     body_html = request.POST.get("body-html")
 
-    # retrieve the current house admins for this location
-    location_admins = location.house_admins.all()
-    bcc_list = []
-    for person in location_admins:
-        if person.email not in bcc_list:
-            bcc_list.append(person.email)
-    logger.debug(f"bcc list: {bcc_list}")
+    # the current house admins for this location
+    recipients = _addresses(location.house_admins.all(), sender)
 
     # Make sure this person can post to our list
-    # if not sender in bcc_list:
+    # if not sender in recipients:
     #    # TODO - This shoud possibly send a response so they know they were blocked
     #    logger.warn("Sender (%s) not allowed.  Exiting quietly." % sender)
     #    return HttpResponse(status=200)
-    if sender in bcc_list:
-        bcc_list.remove(sender)
 
     # Include attachements
-    attachments = []
-    for attachment in request.FILES.values():
-        attachments.append(("attachment", attachment))
+    attachments = _attachments(request)
 
     # prefix subject, but only if the prefix string isn't already in the
     # subject line (such as a reply)
@@ -781,10 +808,6 @@ def stay(request, location_slug):
     list_address = location.from_email()
     mailgun_data = {
         "from": from_address,
-        "to": [
-            recipient,
-        ],
-        "bcc": bcc_list,
         "subject": subject,
         "text": body_plain,
         "html": body_html,
@@ -797,15 +820,19 @@ def stay(request, location_slug):
         # to be common these days
         "h:Reply-To": from_address,
     }
-    return mailgun_send(mailgun_data, attachments)
+    return mailgun_data, recipients, attachments
 
 
-# XXX TODO there is a lot of duplication in these email endpoints. should be
-# able to pull out this code into some common reuseable functions.
 @csrf_exempt
-def residents(request, location_slug):
-    """email all residents at this location."""
+async def stay(request, location_slug):
+    """email all admins at this location."""
+    return await _forward(_stay_message, request, location_slug)
+
 
+# XXX TODO there is a lot of duplication in these email endpoints. should be
+# able to pull out this code into some common reuseable functions.
+def _residents_message(request, location_slug):
+    _spool_uploads(request)
     # fail gracefully if location does not exist
     try:
         location = get_location(location_slug)
@@ -833,7 +860,6 @@ def residents(request, location_slug):
         logger.info("message appears to be auto-submitted. reject silently")
         return HttpResponse(status=200)
 
-    recipient = request.POST.get("recipient")
     from_address = request.POST.get("from")
     logger.debug(f"from: {from_address}")
     sender = request.POST.get("sender")
@@ -842,31 +868,17 @@ def residents(request, location_slug):
     body_plain = request.POST.get("body-plain")
     body_html = request.POST.get("body-html")
 
-    # Add all the residents at this location
-    resident_emails = []
-    for r in location.residents():
-        resident_emails.append(r.email)
-
-    # Now loop through all the emails and build the bcc list we will use.
-    # This makes sure there are no duplicate emails.
-    bcc_list = []
-    for email in resident_emails:
-        if email not in bcc_list:
-            bcc_list.append(email)
-    logger.debug(f"bcc list: {bcc_list}")
+    # all the residents at this location
+    recipients = _addresses(User.objects.filter(id__in=_resident_ids(location)), sender)
 
     # Make sure this person can post to our list
-    # if not sender in bcc_list:
+    # if not sender in recipients:
     #    # TODO - This shoud possibly send a response so they know they were blocked
     #    logger.warn("Sender (%s) not allowed.  Exiting quietly." % sender)
     #    return HttpResponse(status=200)
-    if sender in bcc_list:
-        bcc_list.remove(sender)
 
     # Include attachements
-    attachments = []
-    for attachment in request.FILES.values():
-        attachments.append(("attachment", attachment))
+    attachments = _attachments(request)
 
     # prefix subject, but only if the prefix string isn't already in the
     # subject line (such as a reply)
@@ -887,10 +899,6 @@ def residents(request, location_slug):
     list_address = f"residents@{location.slug}.{settings.LIST_DOMAIN}"
     mailgun_data = {
         "from": from_address,
-        "to": [
-            recipient,
-        ],
-        "bcc": bcc_list,
         "subject": subject,
         "text": body_plain,
         "html": body_html,
@@ -903,13 +911,17 @@ def residents(request, location_slug):
         # to be common these days
         "h:Reply-To": list_address,
     }
-    return mailgun_send(mailgun_data, attachments)
+    return mailgun_data, recipients, attachments
 
 
 @csrf_exempt
-def announce(request, location_slug):
-    """email all people signed up for event activity notifications at this location."""
+async def residents(request, location_slug):
+    """email all residents at this location."""
+    return await _forward(_residents_message, request, location_slug)
 
+
+def _announce_message(request, location_slug):
+    _spool_uploads(request)
     # fail gracefully if location does not exist
     try:
         location = get_location(location_slug)
@@ -936,32 +948,17 @@ def announce(request, location_slug):
         logger.warn(f"Sender ({sender}) not allowed.  Exiting quietly.")
         return HttpResponse(status=200)
 
-    weekly_notifications_on = EventNotifications.objects.filter(
-        location_weekly=location
-    )
-    [notify.user for notify in weekly_notifications_on]
-
-    # TESTING
-    jessy = User.objects.get(id=1)
-    for user in [
-        jessy,
-    ]:
-        # for user in remindees_for_location:
-        send_announce(request, user, location)
-
-    return HttpResponse(status=200)
-
+    # TESTING: only user 1 for now, rather than everyone signed up for weekly
+    # notifications (EventNotifications with location_weekly=location)
+    recipients = _addresses(User.objects.filter(id=1), sender=None)
 
-def send_announce(request, user, location):
     from_address = location.from_email()
     subject = request.POST.get("subject")
     body_plain = request.POST.get("body-plain")
     body_html = request.POST.get("body-html")
 
     # Include attachements
-    attachments = []
-    for attachment in request.FILES.values():
-        attachments.append(("attachment", attachment))
+    attachments = _attachments(request)
 
     prefix = "[" + location.email_subject_prefix + "] "
     subject = prefix + subject
@@ -978,11 +975,14 @@ def send_announce(request, user, location):
     # send the message
     mailgun_data = {
         "from": from_address,
-        "to": [
-            user.email,
-        ],
         "subject": subject,
         "text": body_plain,
         "html": body_html,
     }
-    return mailgun_send(mailgun_data, attachments)
+    return mailgun_data, recipients, attachments
+
+
+@csrf_exempt
+async def announce(request, location_slug):
+    """email all people signed up for event activity notifications at this location."""
+    return await _forward(_announce_message, request, location_slug)
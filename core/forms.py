@@ -23,6 +23,24 @@ def create_username(first_name, last_name, suffix=""):
     return username
 
 
+def unique_username(first_name, last_name):
+    # the plain username if it's free, otherwise the one with the lowest free
+    # suffix. every username sharing the prefix is fetched in one query, and
+    # usernames differing only in case count as taken.
+    username = create_username(first_name, last_name)
+    taken = {
+        existing.lower()
+        for existing in User.objects.filter(username__istartswith=username).values_list(
+            "username", flat=True
+        )
+    }
+    tries = 1
+    while username in taken:
+        tries = tries + 1
+        username = create_username(first_name, last_name, suffix=tries)
+    return username
+
+
 class UserProfileForm(forms.ModelForm):
     # this is used in the profile edit page.
     """This form manually incorporates the fields corresponding to the base
@@ -180,7 +198,11 @@ class UserProfileForm(forms.ModelForm):
 
     def clean_email(self):
         email = self.cleaned_data["email"]
-        if not self.instance.id and (email and models.User.objects.filter(email=email)):
+        if (
+            not self.instance.id
+            and email
+            and models.User.objects.filter(email__iexact=email.strip()).exists()
+        ):
             raise forms.ValidationError(
                 "There is already a user with this email. If this is your account and you need to recover your password, you can do so from the login page."
             )
@@ -189,18 +211,9 @@ class UserProfileForm(forms.ModelForm):
     def clean(self):
         # Generate a (unique) username, if one is needed (ie, if the user is new)
         if "username" not in self.cleaned_data:
-            tries = 1
-            username = create_username(
+            self.cleaned_data["username"] = unique_username(
                 self.cleaned_data["first_name"], self.cleaned_data["last_name"]
             )
-            while models.User.objects.filter(username=username).count() > 0:
-                tries = tries + 1
-                username = create_username(
-                    self.cleaned_data["first_name"],
-                    self.cleaned_data["last_name"],
-                    suffix=tries,
-                )
-            self.cleaned_data["username"] = username
 
     def clean_links(self):
         # validates and formats the urls, returning a string of comma-separated urls
@@ -236,8 +249,7 @@ class UserProfileForm(forms.ModelForm):
         email = self.cleaned_data["email"].strip().lower()
         if len(email) == 0:
             raise forms.ValidationError("Email Required.")
-        if User.objects.filter(email=email).count() > 0:
-            raise forms.ValidationError(f"Email address '{email}' already in use.")
+        # clean_email has already checked that the address is free
 
         # Username generated in clean method
         username = self.cleaned_data["username"]
@@ -0,0 +1,186 @@
+"""Who stays at a location, for how long, and whether they come back.
+
+Each report covers the confirmed stays arriving at one location in one month
+(start inclusive, end exclusive) and is worked out with aggregate queries, so
+its cost depends on the number of distinct values reported rather than on the
+number of guests. The results are plain dicts ready for JsonResponse.
+monthly_report() caches the reports of months that are over per location and
+month with the location caches in core/cache.py. Saving one of the location's
+uses drops them, in every worker only when the cache is shared between
+workers (see "Caching" in docs/configuration.md); otherwise other workers can
+serve a report up to CACHE_TIMEOUT old.
+"""
+
+import datetime
+import logging
+
+from django.contrib.auth.models import User
+from django.db.models import (
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+)
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from core.cache import cached_for_location
+from core.db import primary_reads
+from core.models import Use
+
+logger = logging.getLogger(__name__)
+
+LEAD_TIME_BUCKETS = (
+    ("0-6", 0, 6),
+    ("7-13", 7, 13),
+    ("14-29", 14, 29),
+    ("30-89", 30, 89),
+    ("90+", 90, None),
+)
+COHORT_MONTHS = 12
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _stays(location):
+    return Use.objects.filter(location=location, status=Use.CONFIRMED).order_by()
+
+
+def _arriving(location, start, end):
+    return _stays(location).filter(arrive__gte=start, arrive__lt=end)
+
+
+def _stay_count(location, before=None):
+    # a guest's confirmed stays at location (arriving before a date, if
+    # given) as a subquery on the user
+    stays = _stays(location).filter(user=OuterRef("pk"))
+    if before:
+        stays = stays.filter(arrive__lt=before)
+    return Subquery(
+        stays.values("user").annotate(count=Count("id")).values("count"),
+        output_field=IntegerField(),
+    )
+
+
+def repeat_stays(location, start, end):
+    """how many stays the guests arriving this month have had here so far."""
+    guests = User.objects.filter(
+        id__in=_arriving(location, start, end).values("user")
+    ).annotate(stays=_stay_count(location, end))
+    distribution = list(
+        guests.values("stays").annotate(guests=Count("id")).order_by("stays")
+    )
+    return {
+        "guests": sum(row["guests"] for row in distribution),
+        "repeat_guests": sum(row["guests"] for row in distribution if row["stays"] > 1),
+        "distribution": distribution,
+    }
+
+
+def stay_lengths(location, start, end):
+    """a histogram of the number of nights of stays arriving this month."""
+    rows = (
+        _arriving(location, start, end)
+        .annotate(
+            length=ExpressionWrapper(
+                F("depart") - F("arrive"), output_field=DurationField()
+            )
+        )
+        .values("length")
+        .annotate(stays=Count("id"))
+        .order_by("length")
+    )
+    histogram = [{"nights": row["length"].days, "stays": row["stays"]} for row in rows]
+    stays = sum(row["stays"] for row in histogram)
+    nights = sum(row["nights"] * row["stays"] for row in histogram)
+    return {
+        "stays": stays,
+        "average_nights": round(nights / stays, 1) if stays else None,
+        "histogram": histogram,
+    }
+
+
+def lead_times(location, start, end):
+    """how far ahead stays arriving this month were requested, in days."""
+    lead = ExpressionWrapper(
+        F("arrive") - TruncDate("created"), output_field=DurationField()
+    )
+    aggregates = {}
+    for i, (_, low, high) in enumerate(LEAD_TIME_BUCKETS):
+        condition = Q(lead__gte=datetime.timedelta(days=low))
+        if high is not None:
+            condition &= Q(lead__lte=datetime.timedelta(days=high))
+        aggregates[f"count_{i}"] = Count("id", filter=condition)
+    totals = _arriving(location, start, end).annotate(lead=lead).aggregate(**aggregates)
+    return {
+        "buckets": [
+            {"days": label, "stays": totals[f"count_{i}"]}
+            for i, (label, _, _) in enumerate(LEAD_TIME_BUCKETS)
+        ]
+    }
+
+
+def cohorts(location, start, end):
+    """guests grouped by the month of their first stay here, for the
+    COHORT_MONTHS months up to this one, and how many of each had come
+    back by the end of this one."""
+    first_month = start
+    for _ in range(COHORT_MONTHS - 1):
+        first_month = (first_month - datetime.timedelta(days=1)).replace(day=1)
+    first_stay = (
+        _stays(location).filter(user=OuterRef("pk")).order_by("arrive").values("arrive")
+    )
+    rows = (
+        User.objects.filter(id__in=_stays(location).values("user"))
+        .annotate(
+            first_stay=Subquery(first_stay[:1]),
+            stays=_stay_count(location, end),
+        )
+        .filter(first_stay__gte=first_month, first_stay__lt=end)
+        .annotate(cohort=TruncMonth("first_stay"))
+        .values("cohort")
+        .annotate(guests=Count("id"), returning=Count("id", filter=Q(stays__gt=1)))
+        .order_by("cohort")
+    )
+    return {
+        "cohorts": [
+            {
+                "month": row["cohort"].strftime("%Y-%m"),
+                "guests": row["guests"],
+                "returning": row["returning"],
+            }
+            for row in rows
+        ]
+    }
+
+
+REPORTS = {
+    "repeat-stays": repeat_stays,
+    "stay-lengths": stay_lengths,
+    "lead-times": lead_times,
+    "cohorts": cohorts,
+}
+
+
+def _primary_report(name, location, start, end):
+    # a lagging replica could otherwise store an old report under the
+    # location's new cache version
+    with primary_reads():
+        return REPORTS[name](location, start, end)
+
+
+def monthly_report(name, location, start, end):
+    """REPORTS[name] for location and the month from start to end. Only
+    months that are over are cached: the current and future months change
+    with every booking."""
+    if end > timezone.localdate():
+        return REPORTS[name](location, start, end)
+    return cached_for_location(
+        location.id,
+        f"guest-analytics:{name}:{start:%Y-%m}",
+        lambda: _primary_report(name, location, start, end),
+        timeout=CACHE_TIMEOUT,
+    )
@@ -0,0 +1,22 @@
+"""Responsive rendition sets for images shown in lists and page headers.
+
+Imported when the core app is ready so that uploads trigger generation; imagekit
+would otherwise only discover this module lazily.
+"""
+
+from django.conf import settings
+
+from core.images import register_responsive_image
+from core.models import Location, UserProfile
+
+# avatars are stored at 300x300 and shown at 150px or less, at up to 2x
+register_responsive_image(UserProfile, "image", (75, 150, 300), crop=True)
+# the house banner at the top of every location page (800x225)
+register_responsive_image(Location, "image", (400, 800))
+# location cards on the front page and location list (336x344)
+register_responsive_image(Location, "profile_image", (168, 336))
+
+if "gather" in settings.INSTALLED_APPS:
+    from gather.models import Event
+
+    register_responsive_image(Event, "image", (300, 600, 1200))
@@ -0,0 +1,229 @@
+"""Image renditions (imagekit spec files) and the manifest of which ones exist.
+
+Renditions are never generated while rendering a page. They are generated when
+the source image is uploaded (off the request path, once the upload has been
+committed) or in bulk by the warm_image_cache management command, and every
+rendition that has been written is recorded in a JSON manifest. Templates ask
+the manifest through the `rendition` filter and fall back to the original
+image when a rendition isn't ready yet.
+
+Besides the imagekit spec fields on the models, some images have a responsive
+rendition set: several widths, each in WebP and JPEG, registered in
+core/imagegenerators.py and rendered as <picture> with srcset by the
+`responsive_image` template tag.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from imagekit import ImageSpec
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.exceptions import MissingSource
+from imagekit.processors import ResizeToFill, ResizeToFit
+from imagekit.registry import cachefile_registry, generator_registry, register
+from imagekit.specs.sourcegroups import ImageFieldSourceGroup
+
+logger = logging.getLogger(__name__)
+
+_manifest = {"mtime": None, "names": frozenset()}
+_executor = None
+
+# (format, mime type, save options), best first. browsers take the first
+# <source> they support, and the JPEGs double as the <img> fallback.
+RESPONSIVE_FORMATS = (
+    ("WEBP", "image/webp", {"quality": 80}),
+    ("JPEG", "image/jpeg", {"quality": 85, "progressive": True}),
+)
+
+# (app_label, model_name, field) -> (widths, crop)
+_responsive_images = {}
+
+
+def _manifest_path():
+    return str(settings.IMAGE_RENDITIONS_MANIFEST)
+
+
+def rendition_manifest():
+    """the set of rendition file names known to exist. re-read only when the
+    manifest file changes."""
+    path = _manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return frozenset()
+    if mtime != _manifest["mtime"]:
+        try:
+            with open(path) as f:
+                names = frozenset(json.load(f))
+        except ValueError:
+            logger.error(f"unreadable image rendition manifest at {path}")
+            names = frozenset()
+        _manifest["mtime"] = mtime
+        _manifest["names"] = names
+    return _manifest["names"]
+
+
+def record_renditions(names, replace=False):
+    """add rendition file names to the manifest (or replace its contents)."""
+    path = _manifest_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        existing = set() if replace else set(rendition_manifest())
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(sorted(existing | set(names)), f)
+        os.replace(tmp_path, path)
+
+
+def generate_rendition(cachefile, force=False):
+    """generate a single rendition, returning its name, or None if the source
+    image is missing."""
+    try:
+        cachefile.generate(force=force)
+    except MissingSource:
+        logger.warning(f"no source image for rendition {cachefile.name}")
+        return None
+    return cachefile.name
+
+
+def generate_renditions(cachefiles, force=False):
+    names = []
+    for cachefile in cachefiles:
+        try:
+            name = generate_rendition(cachefile, force)
+        except Exception:
+            logger.exception(f"could not generate rendition {cachefile.name}")
+            continue
+        if name:
+            names.append(name)
+    if names:
+        record_renditions(names)
+    return names
+
+
+def all_renditions(generator_ids=None):
+    """every rendition imagekit knows about, for every source image."""
+    for generator_id in generator_registry.get_ids():
+        if generator_ids and generator_id not in generator_ids:
+            continue
+        for cachefile in cachefile_registry.get(generator_id):
+            if cachefile.name:
+                yield cachefile
+
+
+def _background_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="image-renditions"
+        )
+    return _executor
+
+
+def schedule_renditions(cachefiles):
+    """generate renditions once the current transaction commits, in the
+    background unless IMAGE_RENDITIONS_ASYNC is off."""
+    cachefiles = list(cachefiles)
+    if not settings.IMAGE_RENDITIONS_ASYNC:
+        generate_renditions(cachefiles)
+        return
+    transaction.on_commit(
+        lambda: _background_executor().submit(generate_renditions, cachefiles)
+    )
+
+
+class RenditionStrategy:
+    """imagekit cache file strategy. renditions are scheduled when the source
+    is saved and never generated on access, so rendering a page can't end up
+    processing images."""
+
+    def on_source_saved(self, file):
+        schedule_renditions([file])
+
+    def should_verify_existence(self, file):
+        return False
+
+
+def rendition_url(instance, spec_name):
+    """url of the named rendition if it has been generated, otherwise the url
+    of the source image it would be made from. None if there is no image."""
+    cachefile = getattr(instance, spec_name)
+    source = cachefile.generator.source
+    if not source:
+        return None
+    if cachefile.name in rendition_manifest():
+        return cachefile.url
+    return source.url
+
+
+class Rendition(ImageSpec):
+    """one width of a responsive image in one format. cropped images are cut
+    to a square, the rest keep their proportions and are never upscaled."""
+
+    def __init__(self, source, width, format, options, crop=False):
+        if crop:
+            self.processors = [ResizeToFill(width, width)]
+        else:
+            self.processors = [ResizeToFit(width=width, upscale=False)]
+        self.format = format
+        self.options = options
+        super().__init__(source=source)
+
+
+def _responsive_id(model_label, field, width, format):
+    return f"{model_label}:{field}:responsive:{width}w:{format.lower()}"
+
+
+def register_responsive_image(model, field, widths, crop=False):
+    """register a WebP and JPEG rendition of model.field at each width.
+    they are generated like every other rendition: after upload, and by
+    warm_image_cache."""
+    model_label = f"{model._meta.app_label}:{model._meta.model_name}"
+    source_group = ImageFieldSourceGroup(model, field)
+    for width in widths:
+        for format, _, options in RESPONSIVE_FORMATS:
+            generator_id = _responsive_id(model_label, field, width, format)
+
+            def generator(source, width=width, format=format, options=options):
+                return Rendition(source, width, format, options, crop=crop)
+
+            register.generator(generator_id, generator)
+            register.source_group(generator_id, source_group)
+    _responsive_images[(model._meta.app_label, model._meta.model_name, field)] = (
+        tuple(widths),
+        crop,
+    )
+
+
+def responsive_srcsets(instance, field):
+    """the srcset for each mime type, listing only renditions that exist.
+    returns {} for images without responsive renditions."""
+    meta = instance._meta
+    widths, _ = _responsive_images.get(
+        (meta.app_label, meta.model_name, field), ((), False)
+    )
+    source = getattr(instance, field)
+    known = rendition_manifest()
+    srcsets = {}
+    for format, mime, _ in RESPONSIVE_FORMATS:
+        candidates = []
+        for width in widths:
+            generator_id = _responsive_id(
+                f"{meta.app_label}:{meta.model_name}", field, width, format
+            )
+            cachefile = ImageCacheFile(
+                generator_registry.get(generator_id, source=source)
+            )
+            if cachefile.name in known:
+                candidates.append(f"{cachefile.url} {width}w")
+        if candidates:
+            srcsets[mime] = ", ".join(candidates)
+    return srcsets
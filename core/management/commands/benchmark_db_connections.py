@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from django.core import signals
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the database overhead of a request: a connection per request "
+        "(CONN_MAX_AGE=0) against the configured connection settings. Each "
+        "simulated request runs a trivial query between the request_started "
+        "and request_finished signals, which is where Django opens and closes "
+        "connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="number of simulated requests per run (default: 200)",
+        )
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="database alias to benchmark (default: default)",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        settings_dict = connection.settings_dict
+        pool = settings_dict.get("OPTIONS", {}).get("pool")
+        if pool:
+            configured = "connection pool"
+        elif settings_dict["CONN_MAX_AGE"]:
+            configured = f"persistent (CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']})"
+        else:
+            configured = None
+
+        options_without_pool = {
+            key: value
+            for key, value in settings_dict.get("OPTIONS", {}).items()
+            if key != "pool"
+        }
+        before = self.run(
+            connection,
+            options["requests"],
+            CONN_MAX_AGE=0,
+            OPTIONS=options_without_pool,
+        )
+        self.report("connection per request", before)
+        if configured is None:
+            self.stdout.write(
+                "connections are not reused; set DATABASE_CONN_MAX_AGE or "
+                "DATABASE_POOL_SIZE to compare"
+            )
+            return
+        after = self.run(connection, options["requests"])
+        self.report(configured, after)
+        saved = statistics.median(before) - statistics.median(after)
+        self.stdout.write(f"saved {saved:.2f}ms per request")
+
+    def run(self, connection, count, **overrides):
+        saved = {key: connection.settings_dict.get(key) for key in overrides}
+        connection.settings_dict.update(overrides)
+        connection.close()
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                signals.request_started.send(sender=self.__class__)
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                signals.request_finished.send(sender=self.__class__)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+        return timings
+
+    def report(self, label, timings):
+        p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f"{label}: median {statistics.median(timings):.3f}ms, "
+            f"p95 {p95:.3f}ms per request"
+        )
@@ -1,45 +1,42 @@
-import logging
-
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 
-logger = logging.getLogger(__name__)
+from core import user_analytics
+from core.db import replica_reads
 
 
 class Command(BaseCommand):
-    # help = "Set all users to given email, password and customer ID"
-    # args = "[email_address] [password] [customer_id]"
-    requires_system_checks = True
+    help = (
+        "Report active users with non-alphanumeric usernames, email addresses "
+        "shared with another user (ignoring case) and emails with capitals."
+    )
 
     def handle(self, *labels, **options):
-        # if not labels or len(labels) < 1: raise CommandError('Args: <email_address> <password> <customer_id>')
-
-        logger.debug("Checking {User.objects.all().count()} users...")
-
-        nonalpha = []
-        dup_emails = []
-        cap_emails = []
-        for u in User.objects.filter(is_active=True):
-            if not u.username.replace("_", "").isalnum():
-                nonalpha.append(u)
-                logger.debug(f"{u.username}: not alphanumeric")
-                logger.debug(f"    UserID: {u.id}")
-                logger.debug(f"    Last Login: {u.last_login}")
-
-            if u.email not in dup_emails:
-                others_with_email = User.objects.filter(email=u.email, is_active=True)
-                if others_with_email.count() > 1:
-                    dup_emails.append(u.email)
-                    logger.debug(f"{u.email}: Duplicate email")
-                    for o in others_with_email:
-                        logger.debug(f"    {o.username}/{o.id}: {o.last_login}")
-
-            if u.email != u.email.lower():
-                cap_emails.append(u)
-                logger.debug(f"{u.username}: capitolized email")
-                logger.debug(f"    UserID: {u.id}")
-                logger.debug(f"    Last Login: {u.last_login}")
-
-        logger.debug(f"{len(nonalpha)} alphanumeric problems")
-        logger.debug(f"{len(dup_emails)} duplicate email problems")
-        logger.debug(f"{len(cap_emails)} capitolized emails")
+        # a read-only report, so it can run against the read replica
+        with replica_reads():
+            self.stdout.write(f"Checking {User.objects.count()} users...")
+
+            nonalpha = list(user_analytics.nonalphanumeric_usernames())
+            for u in nonalpha:
+                self.stdout.write(f"{u.username}: not alphanumeric")
+                self.stdout.write(f"    UserID: {u.id}")
+                self.stdout.write(f"    Last Login: {u.last_login}")
+
+            dup_emails = list(user_analytics.duplicate_emails())
+            sharing = user_analytics.users_with_email(d["address"] for d in dup_emails)
+            address = None
+            for o in sharing:
+                if o.address != address:
+                    address = o.address
+                    self.stdout.write(f"{address}: Duplicate email")
+                self.stdout.write(f"    {o.username}/{o.id}: {o.last_login}")
+
+            cap_emails = list(user_analytics.capitalized_emails())
+            for u in cap_emails:
+                self.stdout.write(f"{u.username}: capitalized email")
+                self.stdout.write(f"    UserID: {u.id}")
+                self.stdout.write(f"    Last Login: {u.last_login}")
+
+            self.stdout.write(f"{len(nonalpha)} alphanumeric problems")
+            self.stdout.write(f"{len(dup_emails)} duplicate email problems")
+            self.stdout.write(f"{len(cap_emails)} capitalized emails")
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bank.balances import create_checkpoints
+from bank.models import Currency
+
+
+class Command(BaseCommand):
+    help = (
+        "Record the balance of every account at the close of a day, so that "
+        "current and historical balances can be worked out from there instead "
+        "of from the first entry. Defaults to yesterday; run it again for the "
+        "same day to replace its checkpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            help="closing date, YYYY-MM-DD (default: yesterday)",
+        )
+        parser.add_argument(
+            "--currency",
+            action="append",
+            help="only accounts in this currency; may be repeated (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        date = options["date"] or today - datetime.timedelta(days=1)
+        if date >= today:
+            raise CommandError(f"{date} hasn't closed yet")
+
+        currencies = Currency.objects.all()
+        if options["currency"]:
+            currencies = currencies.filter(name__in=options["currency"])
+        written = create_checkpoints(date, currencies)
+        self.stdout.write(f"Recorded {written} account balances as of {date}")
@@ -2,6 +2,8 @@ import datetime
 
 from django.core.management.base import BaseCommand
 
+from bank.balances import create_checkpoints
+from bank.models import Currency
 from gather import tasks as gather_tasks
 
 from ... import tasks
@@ -19,3 +21,9 @@ class Command(BaseCommand):
         gather_tasks.events_today_reminder()
         if datetime.date.today().weekday() == 6:  # sunday
             gather_tasks.weekly_upcoming_events()
+        if datetime.date.today().day == 1:
+            # month end balances
+            create_checkpoints(
+                datetime.date.today() - datetime.timedelta(days=1),
+                Currency.objects.all(),
+            )
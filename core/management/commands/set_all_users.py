@@ -1,37 +1,39 @@
-import logging
-
 from django.contrib.auth.models import User
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import BaseCommand
 
-logger = logging.getLogger(__name__)
+from core import user_analytics
 
 
 class Command(BaseCommand):
-    help = "Set all users to given email, password and customer ID"
-    args = "[email_address] [password] [customer_id]"
-    requires_system_checks = True
+    help = (
+        "Set all users to given email, password and customer ID. Meant for "
+        "scrubbing a copy of the production database, never production itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("email_address")
+        parser.add_argument("password", nargs="?")
+        parser.add_argument("customer_id", nargs="?")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=user_analytics.BATCH_SIZE,
+            help=f"users per update (default: {user_analytics.BATCH_SIZE})",
+        )
 
     def handle(self, *labels, **options):
-        if not labels or len(labels) < 1:
-            raise CommandError("Args: <email_address> <password> <customer_id>")
-        new_email_address = labels[0]
-        logger.debug(f"Setting all emails:'{new_email_address}' ")
-        new_password = None
-        if len(labels) >= 2:
-            new_password = labels[1]
-            logger.debug(f"Setting all passwords:'{new_password}' ")
-        new_customer_id = None
-        if len(labels) >= 3:
-            new_customer_id = labels[2]
-            logger.debug(f"Setting all customer ids:'{new_customer_id}' ")
+        total = User.objects.count()
+        self.stdout.write(f"Setting all emails: '{options['email_address']}'")
+        if options["password"]:
+            self.stdout.write("Setting all passwords")
+        if options["customer_id"]:
+            self.stdout.write(f"Setting all customer ids: '{options['customer_id']}'")
 
-        changes = 0
-        for u in User.objects.all():
-            u.email = new_email_address
-            if new_password:
-                u.set_password(new_password)
-            if new_customer_id:
-                u.profile.stripe_customer_id = new_customer_id
-            u.save()
-            changes = changes + 1
-        logger.debug(f"Changed {changes} users.")
+        changes = user_analytics.set_all_users(
+            options["email_address"],
+            password=options["password"],
+            customer_id=options["customer_id"],
+            batch_size=options["batch_size"],
+            progress=lambda done: self.stdout.write(f"  {done}/{total}"),
+        )
+        self.stdout.write(f"Changed {changes} users.")
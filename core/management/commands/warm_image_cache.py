@@ -0,0 +1,86 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.images import (
+    all_renditions,
+    generate_rendition,
+    record_renditions,
+    rendition_manifest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _generate(cachefile, force):
+    try:
+        return generate_rendition(cachefile, force)
+    except Exception as e:
+        logger.error(f"could not generate rendition {cachefile.name}: {e}")
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate every image rendition (profile thumbnails and other imagekit "
+        "specs) that doesn't exist yet, using a pool of worker processes, and "
+        "rebuild the rendition manifest that templates read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "generator_id",
+            nargs="*",
+            help="only warm these imagekit generators, e.g. core:userprofile:image_thumb",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="number of worker processes (default: one per cpu)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="regenerate renditions even if they already exist",
+        )
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        known = rendition_manifest()
+        cachefiles = list(all_renditions(options["generator_id"]))
+        if force:
+            pending = cachefiles
+        else:
+            pending = [c for c in cachefiles if c.name not in known]
+        self.stdout.write(
+            f"{len(cachefiles)} renditions, {len(pending)} to generate "
+            f"with {options['workers']} workers"
+        )
+
+        # the workers are forked from this process. each job carries its
+        # source file with it, so they never touch the inherited database
+        # connections and those stay usable here.
+        generated = []
+        if pending:
+            with ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("fork"),
+            ) as pool:
+                for name in pool.map(
+                    _generate, pending, [force] * len(pending), chunksize=8
+                ):
+                    if name:
+                        generated.append(name)
+
+        # everything already recorded is still there unless we were asked to
+        # redo it; rebuild the manifest from what we know exists now.
+        existing = {c.name for c in cachefiles if c.name in known}
+        record_renditions(
+            existing | set(generated), replace=not options["generator_id"]
+        )
+        failed = len(pending) - len(generated)
+        self.stdout.write(f"generated {len(generated)} renditions, {failed} failed")
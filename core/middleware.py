@@ -0,0 +1,259 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from core.cache import get_cached_location
+from core.db import (
+    PIN_COOKIE,
+    replica_alias,
+    replica_allowed,
+    replica_reads,
+    track_writes,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs natively in both sync and async chains,
+    like Django's MiddlewareMixin, so that under ASGI an async view doesn't
+    hold a thread for the middleware's sake. Subclasses implement __call__
+    for the sync chain and __acall__ for the async one."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class LocationMiddleware(AsyncCapableMiddleware):
+    """Attach the location named in the url to the request as
+    request.location, or None if the view isn't location specific.
+
+    The slug comes from the resolved url kwargs, so there is no need to
+    pattern match the path, and the lookup goes through the location cache so
+    it usually costs no queries at all. Views, decorators and context
+    processors should use request.location instead of fetching it again.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.location = None
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.location = None
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        location_slug = view_kwargs.get("location_slug")
+        if location_slug:
+            request.location = get_cached_location(location_slug)
+        return None
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_fingerprint(sql):
+    """the shape of a query, so that the same query run with different
+    parameters (the tell-tale of an N+1) counts as one."""
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", sql)).strip()
+
+
+class QueryRecorder:
+    """database execute wrapper that counts queries and the time spent in
+    them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[query_fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return [
+            (fingerprint, n)
+            for fingerprint, n in self.fingerprints.most_common(5)
+            if n >= threshold
+        ]
+
+
+def _record_queries(stack, recorder):
+    # execute wrappers belong to the connections of the current thread
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class QueryInstrumentationMiddleware(AsyncCapableMiddleware):
+    """Record the number of queries, database time and total time of every
+    request, and the queries it repeats most often.
+
+    Each request is logged as one line of JSON: at debug level normally, and
+    as a warning when it goes over its view's query budget (see
+    core.decorators.query_budget) or repeats one query QUERY_REPEAT_THRESHOLD
+    times or more. Staff, and everyone when DEBUG is on, also get the timings
+    in a Server-Timing header for the browser's network panel. With
+    QUERY_BUDGETS_STRICT set (as it is under test), exceeding a budget raises
+    QueryBudgetExceeded instead.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        request.query_budget = None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            _record_queries(stack, recorder)
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        user = getattr(request, "user", None)
+        return self.finish(
+            request, response, recorder, total, user is not None and user.is_staff
+        )
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        request.query_budget = None
+        start = time.perf_counter()
+        stack = ExitStack()
+        # async views reach the database through sync_to_async, in the
+        # request's one sync thread, so the wrappers go on its connections
+        await sync_to_async(_record_queries)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        total = time.perf_counter() - start
+        auser = getattr(request, "auser", None)
+        staff = auser is not None and (await auser()).is_staff
+        return self.finish(request, response, recorder, total, staff)
+
+    def finish(self, request, response, recorder, total, staff):
+        budget = request.query_budget
+        over_budget = budget is not None and recorder.count > budget
+        repeated = recorder.repeated(getattr(settings, "QUERY_REPEAT_THRESHOLD", 10))
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "query_budget": budget,
+            "db_ms": round(recorder.duration * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+            "repeated_queries": [
+                {"count": n, "sql": fingerprint[:300]} for fingerprint, n in repeated
+            ],
+        }
+        if over_budget or repeated:
+            logger.warning(json.dumps(record))
+        else:
+            logger.debug(json.dumps(record))
+
+        if settings.DEBUG or staff:
+            response["Server-Timing"] = (
+                f'db;dur={record["db_ms"]};desc="{recorder.count} queries", '
+                f"total;dur={record['total_ms']}"
+            )
+
+        if over_budget and getattr(settings, "QUERY_BUDGETS_STRICT", False):
+            raise QueryBudgetExceeded(
+                f"{request.path} ran {recorder.count} queries, "
+                f"over its budget of {budget}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        request.query_budget = getattr(
+            view_func, "query_budget", getattr(view_class, "query_budget", None)
+        )
+        return None
+
+
+class ReplicaMiddleware(AsyncCapableMiddleware):
+    """Run views marked with core.decorators.read_replica inside
+    core.db.replica_reads(), so their reads can go to the read replica.
+
+    Only GET and HEAD requests are sent there. A request that writes anything
+    sets a short-lived cookie that keeps the client's following requests on
+    the primary for REPLICA_PIN_SECONDS, so that nobody sees a replica that
+    hasn't caught up with their own change yet.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.async_mode:
+            # a sync process_view would run in a thread, on a copy of the
+            # context, and the variables replica_reads() sets there couldn't
+            # be reset here afterwards
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with ExitStack() as stack:
+            request.replica_reads = stack
+            wrote = stack.enter_context(track_writes())
+            response = self.get_response(request)
+            pin = wrote()
+        return self.pin(response, pin)
+
+    async def __acall__(self, request):
+        with ExitStack() as stack:
+            request.replica_reads = stack
+            wrote = stack.enter_context(track_writes())
+            response = await self.get_response(request)
+            pin = wrote()
+        return self.pin(response, pin)
+
+    def pin(self, response, pin):
+        if pin and replica_alias():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        marked = getattr(
+            view_func, "read_replica", getattr(view_class, "read_replica", False)
+        )
+        if marked and request.method in ("GET", "HEAD") and replica_allowed(request):
+            request.replica_reads.enter_context(replica_reads())
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return ReplicaMiddleware.process_view(
+            self, request, view_func, view_args, view_kwargs
+        )
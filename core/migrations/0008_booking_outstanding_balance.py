@@ -0,0 +1,53 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def bill_total(model, amount_field, condition=None):
+    items = model.objects.filter(bill=OuterRef("bill_id"))
+    if condition is not None:
+        items = items.filter(condition)
+    totals = (
+        items.order_by()
+        .values("bill")
+        .annotate(total=Sum(amount_field))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(totals),
+        Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=9, decimal_places=2),
+    )
+
+
+def backfill_outstanding_balance(apps, schema_editor):
+    Booking = apps.get_model("core", "Booking")
+    BillLineItem = apps.get_model("core", "BillLineItem")
+    Payment = apps.get_model("core", "Payment")
+    amount = bill_total(
+        BillLineItem, "amount", Q(fee__isnull=True) | Q(paid_by_house=False)
+    )
+    Booking.objects.update(
+        outstanding_balance=Round(amount - bill_total(Payment, "paid_amount"), 2)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_userprofile_contract_terms_accepted"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="outstanding_balance",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=0, max_digits=9
+            ),
+        ),
+        migrations.RunPython(backfill_outstanding_balance, migrations.RunPython.noop),
+    ]
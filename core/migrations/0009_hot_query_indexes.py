@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_booking_outstanding_balance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="capacitychange",
+            index=models.Index(
+                fields=["resource", "-start_date"], name="capacity_resource_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["bill", "payment_date"], name="payment_bill_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["transaction_id"], name="payment_transaction_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="use",
+            index=models.Index(
+                fields=["location", "status", "arrive", "depart"],
+                name="use_location_status_dates",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="use",
+            index=models.Index(
+                condition=models.Q(("status__in", ["approved", "confirmed"])),
+                fields=["location", "arrive", "depart"],
+                name="use_active_location_dates",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="use",
+            index=models.Index(
+                fields=["resource", "status", "arrive"],
+                name="use_resource_status_arrive",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# a GiST index over the nights of each use, for the && and @> queries in
+# UseManager. btree_gist lets location_id share the index with the range.
+# postgres only; other databases keep using use_location_status_dates.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    "CREATE INDEX IF NOT EXISTS use_stay_gist ON core_use "
+    "USING gist (location_id, daterange(arrive, depart))",
+    "CREATE INDEX IF NOT EXISTS use_resource_stay_gist ON core_use "
+    "USING gist (resource_id, daterange(arrive, depart)) "
+    "WHERE status IN ('approved', 'confirmed')",
+]
+DROP_SQL = [
+    "DROP INDEX IF EXISTS use_resource_stay_gist",
+    "DROP INDEX IF EXISTS use_stay_gist",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0009_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
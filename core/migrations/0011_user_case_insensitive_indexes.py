@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# case-insensitive lookups on auth_user for registration: email__iexact, and
+# username__iexact / username__istartswith when allocating usernames. django
+# compiles those to UPPER(...) = UPPER(%s) and UPPER(...) LIKE UPPER(%s), which
+# the unique indexes on the raw columns can't serve. text_pattern_ops lets the
+# username index answer prefix matches too. postgres only, like 0010.
+CREATE_SQL = [
+    "CREATE INDEX IF NOT EXISTS auth_user_email_upper ON auth_user (UPPER(email))",
+    "CREATE INDEX IF NOT EXISTS auth_user_username_upper ON auth_user "
+    "(UPPER(username) text_pattern_ops)",
+]
+DROP_SQL = [
+    "DROP INDEX IF EXISTS auth_user_username_upper",
+    "DROP INDEX IF EXISTS auth_user_email_upper",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0010_use_stay_gist"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
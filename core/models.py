@@ -1,16 +1,33 @@
 import datetime
 import logging
 import os
+import threading
 import uuid
+from contextlib import contextmanager
 from decimal import Decimal
 
 import django.dispatch
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.flatpages.models import FlatPage
-from django.db import models
-from django.db.models import Q
-from django.db.models.signals import m2m_changed, pre_save
+from django.contrib.postgres.fields import DateRangeField
+from django.db import connections, models
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    Func,
+    Min,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -19,6 +36,13 @@ from imagekit.models import ImageSpecField, ProcessedImageField
 from imagekit.processors import ResizeToFill
 
 from bank.models import Account, Currency, Transaction
+from core import drft
+from core.cache import (
+    cached_for_location,
+    get_cached_location,
+    invalidate_location,
+    invalidate_network,
+)
 from core.libs.dates import count_range_objects_on_day, dates_within
 
 logger = logging.getLogger(__name__)
@@ -209,21 +233,24 @@ class Location(models.Model):
         return available_beds
 
     def rooms_free(self, arrive, depart):
-        available = list(self.resources.all())
-        for room in self.get_rooms():
-            the_day = arrive
-            while the_day < depart:
-                # if there is any day the room isn't available, then the room
-                # isn't free the whole time
-                if not room.available_on(the_day):
-                    available.remove(room)
-                    break
-                the_day = the_day + datetime.timedelta(1)
-        return available
+        # the rooms with a free bed on every night from arrive up to depart.
+        last_night = depart - datetime.timedelta(1)
+        rooms = list(self.resources.all())
+        prefetch_availabilities(rooms, arrive, last_night)
+        return [
+            room
+            for room in rooms
+            if all(
+                quantity > 0
+                for _, quantity in room.daily_availabilities_within(
+                    arrive, last_night, uses=room.confirmed_uses
+                )
+            )
+        ]
 
     def has_capacity(self, arrive=None, depart=None):
         if not arrive:
-            arrive = timezone.localtime(timezone.now())
+            arrive = timezone.localtime(timezone.now()).date()
             depart = arrive + datetime.timedelta(1)
         return bool(self.rooms_free(arrive, depart))
 
@@ -250,7 +277,7 @@ class Location(models.Model):
     def coming_month_uses(self, days=30):
         today = timezone.localtime(timezone.now())
         return (
-            Use.objects.filter(Q(status="confirmed") | Q(status="approved"))
+            Use.objects.filter(status__in=["approved", "confirmed"])
             .filter(location=self)
             .exclude(depart__lt=today)
             .exclude(arrive__gt=today + datetime.timedelta(days=days))
@@ -304,6 +331,23 @@ class Location(models.Model):
     def get_menus(self):
         return LocationMenu.objects.filter(location=self)
 
+    def nav_menus(self):
+        # the house nav is drawn on every location page, so serve it from the
+        # per-location cache with the pages already attached.
+        return cached_for_location(
+            self.pk,
+            "nav_menus",
+            lambda: list(self.get_menus().prefetch_related("pages__flatpage")),
+        )
+
+    def nav_has_rooms(self):
+        today = timezone.localtime(timezone.now()).date().isoformat()
+        return cached_for_location(
+            self.pk,
+            f"nav_has_rooms:{today}",
+            lambda: bool(self.rooms_with_future_capacity()),
+        )
+
     def tz(self):
         if self.timezone:
             return timezone(self.timezone)
@@ -311,11 +355,14 @@ class Location(models.Model):
             return None
 
     def residents(self):
-        all_residents = []
-        for resource in self.resources.all():
-            for resident in resource.backers():
-                all_residents.append(resident)
-        return all_residents
+        # the backers of each resource's current backing, in one query
+        return list(
+            User.objects.filter(
+                backings__in=Backing.objects.current().filter(resource__location=self)
+            )
+            .select_related("profile")
+            .order_by("backings__resource__name", "backings__resource", "username")
+        )
 
 
 class LocationNotUniqueException(Exception):
@@ -329,7 +376,7 @@ class LocationDoesNotExistException(Exception):
 def get_location(location_slug):
     if location_slug:
         try:
-            location = Location.objects.filter(slug=location_slug).first()
+            location = get_cached_location(location_slug)
         except Exception as e:
             raise LocationDoesNotExistException(
                 f"The requested location does not exist: {location_slug}"
@@ -393,12 +440,12 @@ class Resource(models.Model):
         return self.name
 
     def quantity_between(self, start, end):
-        total = 0
-        the_day = start
-        while the_day < end:
-            total += self.capacity_on(the_day)
-            the_day += datetime.timedelta(1)
-        return total
+        # the capacity summed over the nights from start up to (not
+        # including) end
+        last_night = end - datetime.timedelta(1)
+        return sum(
+            quantity for _, quantity in self.daily_capacities_within(start, last_night)
+        )
 
     def confirmed_uses_between(self, start, end):
         return self.use_set.confirmed_between_dates(start, end)
@@ -412,10 +459,10 @@ class Resource(models.Model):
         # non-zero capacities current or future, then this resource has
         # SOME 'future' capacity.
         avails = self.capacity_changes.all()
+        # filter and sort outside the database so prefetch_related works
         if accept_drft:
-            avails = avails.filter(accept_drft=True)
-        # do sort outside database so prefetch_related works
-        avails = sorted(list(avails), key=lambda obj: obj.start_date, reverse=True)
+            avails = [a for a in avails if a.accept_drft]
+        avails = sorted(avails, key=lambda obj: obj.start_date, reverse=True)
         for a in avails:
             if a.start_date >= today and a.quantity > 0:
                 return True
@@ -445,7 +492,7 @@ class Resource(models.Model):
     def drftable_between(self, start, end):
         # note this just checks if the resource has drftable capacity, not
         # whether it has _availability_. (ie, it migt be drftable but booked).
-        return all(self.drftable_on(day) for day in dates_within(start, end))
+        return CapacityChange.objects.drft_between(start, end, self)
 
     def available_between(self, start, end):
         # note this just checks if the resource has drftable capacity, not
@@ -466,8 +513,11 @@ class Resource(models.Model):
             described, in chronological order. This includes the immediately before or on
             the start date, and any others through to and including the end date.
             """
-            capacities = self.capacity_changes.exclude(start_date__gt=end).order_by(
-                "-start_date"
+            # filter and sort outside the database so prefetch_related works
+            capacities = sorted(
+                (c for c in self.capacity_changes.all() if c.start_date <= end),
+                key=lambda obj: obj.start_date,
+                reverse=True,
             )
             capacities_between = []
             for a in capacities:
@@ -492,17 +542,20 @@ class Resource(models.Model):
 
         return result
 
-    def daily_availabilities_within(self, start, end):
+    def daily_availabilities_within(self, start, end, uses=None):
         """
         Param:
             start: datetime
             end: datetime
+            uses: the confirmed uses between start and end, when the caller
+                has already fetched them
 
         Returns a list [(day, quantity), ...]
         Quantity = capacity - confirmed usage
         """
         daily_capacities = self.daily_capacities_within(start, end)
-        uses = self.confirmed_uses_between(start, end)
+        if uses is None:
+            uses = self.confirmed_uses_between(start, end)
 
         result = []
         for daily_capacity in daily_capacities:
@@ -515,8 +568,11 @@ class Resource(models.Model):
 
     def max_daily_capacities_between(self, start, end):
         max_quantity = 0
-        avails = self.capacity_changes.exclude(start_date__gt=end).order_by(
-            "-start_date"
+        # filter and sort outside the database so prefetch_related works
+        avails = sorted(
+            (c for c in self.capacity_changes.all() if c.start_date <= end),
+            key=lambda obj: obj.start_date,
+            reverse=True,
         )
         for a in avails:
             if a.quantity > max_quantity:
@@ -626,6 +682,22 @@ class Resource(models.Model):
         logger.debug("created new backing %d" % new_backing.id)
 
 
+def prefetch_availabilities(resources, start, end):
+    """fetch what Resource.daily_availabilities_within(start, end) needs for
+    all of resources in a constant number of queries, rather than a few per
+    resource. pass each resource's confirmed_uses to it as uses."""
+    prefetch_related_objects(
+        resources,
+        "location",
+        "capacity_changes",
+        Prefetch(
+            "use_set",
+            queryset=Use.objects.confirmed_between_dates(start, end),
+            to_attr="confirmed_uses",
+        ),
+    )
+
+
 class Fee(models.Model):
     description = models.CharField(max_length=100, verbose_name="Fee Name")
     percentage = models.FloatField(default=0, help_text="For example 5.2% = 0.052")
@@ -635,20 +707,57 @@ class Fee(models.Model):
         return self.description
 
 
+class StayRange(Func):
+    """the nights of a use as a postgres daterange, [arrive, depart). written
+    exactly as in the use_stay_gist index so that postgres can use it."""
+
+    function = "daterange"
+
+    def __init__(self):
+        super().__init__(F("arrive"), F("depart"), output_field=DateRangeField())
+
+
 class UseManager(models.Manager):
+    # on postgres, date range lookups use the && and @> range operators, which
+    # the use_stay_gist index answers in one index scan. elsewhere they fall
+    # back to comparing arrive and depart.
+    def _ranges_supported(self):
+        return connections[self.db].vendor == "postgresql"
+
+    def occupying(self, the_day):
+        """uses with a night on the_day."""
+        if self._ranges_supported():
+            return self.alias(stay=StayRange()).filter(stay__contains=the_day)
+        return self.filter(arrive__lte=the_day, depart__gt=the_day)
+
+    def overlapping(self, start, end, inclusive=False):
+        """uses with a night between start and end (exclusive). with
+        inclusive=True, uses that depart on start or arrive on end count too."""
+        if inclusive:
+            start -= datetime.timedelta(days=1)
+            end += datetime.timedelta(days=1)
+        if self._ranges_supported():
+            return self.alias(stay=StayRange()).filter(stay__overlap=(start, end))
+        return self.filter(arrive__lt=end, depart__gt=start)
+
+    def conflicting(self, resource, arrive, depart, exclude=None):
+        """approved and confirmed uses of resource that share a night with
+        arrive-depart: the uses that rule out a booking of a resource with a
+        capacity of one."""
+        conflicts = self.overlapping(arrive, depart).filter(
+            resource=resource, status__in=["approved", "confirmed"]
+        )
+        if exclude is not None:
+            conflicts = conflicts.exclude(pk=exclude.pk)
+        return conflicts
+
     def on_date(self, the_day, status, location):
         # return the bookings that intersect this day, of any status
-        all_on_date = (
-            super()
-            .get_queryset()
-            .filter(location=location)
-            .filter(arrive__lte=the_day)
-            .filter(depart__gt=the_day)
-        )
+        all_on_date = self.occupying(the_day).filter(location=location)
         return all_on_date.filter(status=status)
 
     def confirmed_between_dates(self, start, end):
-        return self.filter(depart__gte=start, arrive__lte=end).filter(
+        return self.overlapping(start, end, inclusive=True).filter(
             status__in=["approved", "confirmed"]
         )
 
@@ -672,29 +781,19 @@ class UseManager(models.Manager):
         return list(confirmed_bookings)
 
     def confirmed_but_unpaid(self, location):
-        confirmed_this_location = (
-            super()
-            .get_queryset()
-            .filter(location=location, status="confirmed")
-            .order_by("-arrive")
-            .select_related("booking", "booking__bill", "resource", "user")
+        return (
+            Booking.objects.filter(
+                use__location=location,
+                use__status="confirmed",
+                outstanding_balance__gt=0,
+            )
+            .order_by("-use__arrive")
+            .select_related("bill", "use__resource", "use__user")
             # this makes is is_paid() efficient
             .prefetch_related(
-                "booking__bill__line_items",
-                "booking__bill__line_items__fee",
-                "booking__bill__payments",
+                "bill__line_items", "bill__line_items__fee", "bill__payments"
             )
         )
-        unpaid_this_location = []
-        for use in confirmed_this_location:
-            try:
-                # use try-except in case the use doesn't have a booking
-                # XXX FIXME. this is a horrible hack.
-                if not use.booking.bill.is_paid():
-                    unpaid_this_location.append(use.booking)
-            except Exception:
-                pass
-        return unpaid_this_location
 
 
 class Bill(models.Model):
@@ -729,7 +828,7 @@ class Bill(models.Model):
         # Bill amount comes from generated bill line items
         amount = 0
         for line_item in self.line_items.all():
-            if not line_item.fee or not line_item.paid_by_house:
+            if not line_item.fee_id or not line_item.paid_by_house:
                 amount = amount + line_item.amount
         return amount
 
@@ -748,24 +847,23 @@ class Bill(models.Model):
         # items that go into the subtotal before calculating taxes and fees.
         # NOTE: will return an *ordered* list with the base resource fee first.
 
+        # filter outside the database so prefetch_related works.
+        line_items = [item for item in self.line_items.all() if not item.fee_id]
         # the base resource fee is not derived from a standing fee, and is not a custom fee
-        base_resource_fee = self.line_items.filter(fee__isnull=True).filter(
-            custom=False
-        )
+        base_resource_fee = [item for item in line_items if not item.custom]
         # all other line items that go into the subtotal are custom fees
-        addl_fees = self.line_items.filter(fee__isnull=True).filter(custom=True)
-        return list(base_resource_fee) + list(addl_fees)
+        addl_fees = [item for item in line_items if item.custom]
+        return base_resource_fee + addl_fees
 
     def fees(self):
         # the taxes and fees on top of subtotal
-        bill_fees = self.line_items.filter(fee__isnull=False)
-        return list(bill_fees)
+        return [item for item in self.line_items.all() if item.fee_id]
 
     def house_fees(self):
         # Pull the house fees from the generated bill line items
         amount = 0
         for line_item in self.line_items.all():
-            if line_item.fee and line_item.paid_by_house:
+            if line_item.fee_id and line_item.paid_by_house:
                 amount = amount + line_item.amount
         return amount
 
@@ -773,7 +871,7 @@ class Bill(models.Model):
         # Sum up the user paid (non-house) fees from the bill line items
         amount = 0
         for line_item in self.line_items.all():
-            if line_item.fee and not line_item.paid_by_house:
+            if line_item.fee_id and not line_item.paid_by_house:
                 amount = amount + line_item.amount
         return amount
 
@@ -797,10 +895,11 @@ class Bill(models.Model):
     def ordered_line_items(self):
         # return bill line items orderer first with the resource item, then the
         # custom items, then the fees
-        resource_item = self.line_items.filter(custom=False).filter(fee=None)
-        custom_items = self.line_items.filter(custom=True)
-        fees = self.line_items.filter(fee__isnull=False)
-        return list(resource_item) + list(custom_items) + list(fees)
+        line_items = self.line_items.all()
+        resource_item = [i for i in line_items if not i.custom and not i.fee_id]
+        custom_items = [i for i in line_items if i.custom]
+        fees = [i for i in line_items if i.fee_id]
+        return resource_item + custom_items + fees
 
     def is_booking_bill(self):
         return hasattr(self, "bookingbill")
@@ -898,6 +997,24 @@ class Use(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            # UseManager.on_date, Location.coming_month_uses and the occupancy
+            # views
+            models.Index(
+                fields=["location", "status", "arrive", "depart"],
+                name="use_location_status_dates",
+            ),
+            # most date range lookups only want approved and confirmed uses
+            models.Index(
+                fields=["location", "arrive", "depart"],
+                condition=Q(status__in=["approved", "confirmed"]),
+                name="use_active_location_dates",
+            ),
+            models.Index(
+                fields=["resource", "status", "arrive"],
+                name="use_resource_status_arrive",
+            ),
+        ]
 
     def __str__(self):
         return "%d" % self.id
@@ -930,14 +1047,93 @@ class Use(models.Model):
         # suggest DRFT if the user has sufficient DRFT balance and the room
         # accept DRFT on these nights.
         try:
-            return (
-                self.resource.drftable_between(self.arrive, self.depart)
-                and self.user.profile.drft_spending_balance() >= self.total_nights()
-            )
+            return drft.eligible(self)
         except Exception:
             return False
 
 
+def _bill_total(related_model, amount_field, condition=None):
+    # sum of a bill's line items or payments as a correlated subquery, so
+    # that annotating bookings with several totals doesn't multiply rows
+    items = related_model.objects.filter(bill=OuterRef("bill_id"))
+    if condition is not None:
+        items = items.filter(condition)
+    totals = (
+        items.order_by()
+        .values("bill")
+        .annotate(total=Sum(amount_field))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(totals),
+        Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=9, decimal_places=2),
+    )
+
+
+class BookingQuerySet(models.QuerySet):
+    def with_bill_totals(self):
+        """annotate each booking with the totals of its bill, matching the
+        Bill methods of the same name: bill_amount, bill_paid,
+        bill_house_fees and bill_non_house_fees."""
+        return self.annotate(
+            bill_amount=_bill_total(
+                BillLineItem, "amount", Q(fee__isnull=True) | Q(paid_by_house=False)
+            ),
+            bill_paid=_bill_total(Payment, "paid_amount"),
+            bill_house_fees=_bill_total(
+                BillLineItem, "amount", Q(fee__isnull=False, paid_by_house=True)
+            ),
+            bill_non_house_fees=_bill_total(
+                BillLineItem, "amount", Q(fee__isnull=False, paid_by_house=False)
+            ),
+        )
+
+    def refresh_outstanding_balances(self):
+        """recompute outstanding_balance (what is still owed on the bill, as
+        in Bill.total_owed()) for every booking in the queryset, in a single
+        UPDATE."""
+        amount = _bill_total(
+            BillLineItem, "amount", Q(fee__isnull=True) | Q(paid_by_house=False)
+        )
+        return self.update(
+            outstanding_balance=Round(amount - _bill_total(Payment, "paid_amount"), 2)
+        )
+
+
+_balance_refresh = threading.local()
+
+
+def refresh_bill_balance(bill_id):
+    if bill_id is None:
+        return
+    deferred = getattr(_balance_refresh, "bill_ids", None)
+    if deferred is not None:
+        deferred.add(bill_id)
+        return
+    Booking.objects.filter(bill_id=bill_id).refresh_outstanding_balances()
+
+
+@contextmanager
+def defer_balance_refresh():
+    """collect the bills whose line items or payments change inside the block
+    and refresh their bookings' balances once, on the way out, instead of
+    after every change. yields the set of bill ids, so that bulk operations,
+    which send no signals, can add the bills they touch."""
+    deferred = getattr(_balance_refresh, "bill_ids", None)
+    if deferred is not None:
+        # nested, the outermost block refreshes
+        yield deferred
+        return
+    _balance_refresh.bill_ids = bill_ids = set()
+    try:
+        yield bill_ids
+    finally:
+        _balance_refresh.bill_ids = None
+    if bill_ids:
+        Booking.objects.filter(bill_id__in=bill_ids).refresh_outstanding_balances()
+
+
 class Booking(models.Model):
     """a model to handle the payment details related to uses"""
 
@@ -1016,6 +1212,13 @@ class Booking(models.Model):
     use = models.OneToOneField(
         Use, null=False, related_name="booking", on_delete=models.CASCADE
     )
+    # what is still owed on the bill. kept up to date as line items and
+    # payments change, so that unpaid bookings can be found with one query.
+    outstanding_balance = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0, db_index=True
+    )
+
+    objects = BookingQuerySet.as_manager()
 
     def get_absolute_url(self):
         return reverse("booking_detail", args=(self.use.location.slug, self.id))
@@ -1033,13 +1236,44 @@ class Booking(models.Model):
 
         # impt! save the custom items first or they'll be blown away when the
         # bill is regenerated.
-        custom_items = []
-        if booking_bill:
-            custom_items = list(booking_bill.line_items.filter(custom=True))
-            if delete_old_items:
-                for item in booking_bill.line_items.all():
-                    item.delete()
+        with defer_balance_refresh() as changed_bills:
+            custom_items = []
+            if booking_bill:
+                custom_items = list(booking_bill.line_items.filter(custom=True))
+                if delete_old_items:
+                    # custom items are kept, so there is nothing to save for them
+                    booking_bill.line_items.filter(custom=False).delete()
+
+            if reset_suppressed:
+                self.suppressed_fees.clear()
+            suppressed_fee_ids = set()
+            if self.pk:
+                suppressed_fee_ids = set(
+                    self.suppressed_fees.values_list("id", flat=True)
+                )
+            location_fees = LocationFee.objects.filter(
+                location=self.use.location
+            ).select_related("fee")
+
+            line_items = self.compute_line_items(
+                booking_bill, custom_items, location_fees, suppressed_fee_ids
+            )
 
+            # Optionally save the line items to the database
+            if save:
+                booking_bill.save()
+                BillLineItem.objects.bulk_create(
+                    [item for item in line_items if not item.custom]
+                )
+                changed_bills.add(booking_bill.id)
+
+        return line_items
+
+    def compute_line_items(
+        self, booking_bill, custom_items, location_fees, suppressed_fee_ids
+    ):
+        """the line items of this booking's bill, built in memory from
+        already loaded custom items, location fees and suppressed fee ids."""
         line_items = []
 
         # The first line item is for the resource charge
@@ -1064,10 +1298,8 @@ class Booking(models.Model):
             effective_resource_charge += item.amount  # may be negative
 
         # A line item for every fee that applies to this location
-        if reset_suppressed:
-            self.suppressed_fees.clear()
-        for location_fee in LocationFee.objects.filter(location=self.use.location):
-            if location_fee.fee not in self.suppressed_fees.all():
+        for location_fee in location_fees:
+            if location_fee.fee_id not in suppressed_fee_ids:
                 desc = "%s (%s%c)" % (
                     location_fee.fee.description,
                     (location_fee.fee.percentage * 100),
@@ -1083,12 +1315,6 @@ class Booking(models.Model):
                 )
                 line_items.append(fee_line_item)
 
-        # Optionally save the line items to the database
-        if save:
-            booking_bill.save()
-            for item in line_items:
-                item.save()
-
         return line_items
 
     def serialize(self, include_bill=True):
@@ -1317,6 +1543,13 @@ class Payment(models.Model):
 
     objects = PaymentManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["bill", "payment_date"], name="payment_bill_date"),
+            # net_paid() and refund_payments()
+            models.Index(fields=["transaction_id"], name="payment_transaction_id"),
+        ]
+
     def __str__(self):
         return f"{str(self.payment_date)[:16]}: {self.user} - ${self.paid_amount}"
 
@@ -1353,9 +1586,11 @@ class Payment(models.Model):
     def non_house_fees(self):
         """returns the absolute amount of the user paid (non-house) fee(s)"""
         # takes the appropriate bill line items and applies them proportionately to the payment.
-        fee_line_items_not_paid_by_house = self.bill.line_items.filter(
-            fee__isnull=False
-        ).filter(paid_by_house=False)
+        fee_line_items_not_paid_by_house = [
+            item
+            for item in self.bill.line_items.all()
+            if item.fee_id and not item.paid_by_house
+        ]
         subtotal = self.bill.subtotal_amount()
         non_house_fee_on_payment = Decimal(0.0)
         # this payment may or may not represent the entire bill amount. we need
@@ -1382,7 +1617,9 @@ class Payment(models.Model):
 
     def house_fees(self):
         # takes the appropriate bill line items and applies them proportionately to the payment.
-        fee_line_items_paid_by_house = self.bill.line_items.filter(paid_by_house=True)
+        fee_line_items_paid_by_house = [
+            item for item in self.bill.line_items.all() if item.paid_by_house
+        ]
         subtotal = self.bill.subtotal_amount()
         house_fee_on_payment = Decimal(0.0)
         # this payment may or may not represent the entire bill amount. we need
@@ -1511,12 +1748,8 @@ class UserProfile(models.Model):
         )
 
     def drft_spending_balance(self):
-        try:
-            drft_currency = Currency.objects.get(name="DRFT")
-            account = self.get_or_create_primary_account(currency=drft_currency)
-            return account.get_balance()
-        except Currency.DoesNotExist:
-            return 0  # Return 0 balance if DRFT currency doesn't exist
+        # 0 if there's no DRFT currency or no primary DRFT account yet
+        return drft.spending_balance(self.user)
 
     def accounts(self):
         return list(self.user.accounts_owned.all()) + list(
@@ -1540,6 +1773,8 @@ User._meta.ordering = ["username"]
 def primary_accounts_changed(sender, action, instance, reverse, pk_set, **kwargs):
     logger.debug("p2p_changed signal")
     logger.debug(action)
+    if action.startswith("post_") and not reverse:
+        drft.forget_primary_account(instance)
     if action == "pre_add":
         logger.debug(instance)  # should be a UserProfile unless reversed
 
@@ -1756,6 +1991,31 @@ class CapacityChangeManager(models.Manager):
     def delete_next_quantity(self, capacity):
         self._next_capacity(capacity).delete()
 
+    def drft_between(self, start, end, resource):
+        # every day from start to end (inclusive) takes its capacity from the
+        # latest change on or before it, so they all accept drft if the
+        # change in force at start and every change after it up to end do.
+        in_force = (
+            self.get_queryset()
+            .filter(resource=resource, start_date__lte=start)
+            .order_by("-start_date")
+            .values("start_date")[:1]
+        )
+        changes = (
+            self.get_queryset()
+            .filter(resource=resource, start_date__lte=end)
+            .filter(start_date__gte=Coalesce(Subquery(in_force), Value(start)))
+            .aggregate(
+                first=Min("start_date"),
+                not_drftable=Count("id", filter=Q(accept_drft=False)),
+            )
+        )
+        return (
+            changes["first"] is not None
+            and changes["first"] <= start
+            and changes["not_drftable"] == 0
+        )
+
     def drft_on(self, date, resource):
         latest_change = self._latest_change(date, resource)
         if latest_change:
@@ -1804,12 +2064,29 @@ class CapacityChange(models.Model):
             "start_date",
             "resource",
         )
+        indexes = [
+            # CapacityChangeManager._latest_change
+            models.Index(
+                fields=["resource", "-start_date"], name="capacity_resource_start"
+            ),
+        ]
 
 
 class BackingManager(models.Manager):
     def by_user(self, user):
         return self.get_queryset().filter(money_account__owners=user)
 
+    def current(self, date=None):
+        """the backing each resource has on date, as Resource.current_backing()
+        finds it: the latest to have started, unless that one has ended."""
+        if not date:
+            date = timezone.localtime(timezone.now()).date()
+        started = self.filter(start__lte=date)
+        later = started.filter(
+            resource=OuterRef("resource"), start__gt=OuterRef("start")
+        )
+        return started.exclude(end__lte=date).exclude(Exists(later))
+
     def setup_new(self, resource, backers, start):
         b = Backing(resource=resource, start=start)
         assert b.comes_after_others()
@@ -1917,3 +2194,137 @@ class UseTransaction(models.Model):
 
     def __str__(self):
         return "Transaction %d <> Use %d" % (self.transaction.id, self.use.id)
+
+
+# keep the per-location caches in core/cache.py honest. each receiver only
+# bumps a version number; the cached values themselves are left to expire.
+@receiver([post_save, post_delete], sender=Location)
+def location_cache_invalidate_location(sender, instance, **kwargs):
+    invalidate_location(instance.pk)
+    invalidate_network()
+
+
+def _invalidate_from_user_side(instance, action, pk_set, location_ids):
+    # an m2m change made from the user's side, e.g. user.house_admin.add().
+    # location_ids(pks) gives the locations of the related objects, or of all
+    # the user's for None: a clear has no pk_set, so they are noted while
+    # still linked.
+    if action in ("post_add", "post_remove"):
+        ids = location_ids(pk_set)
+    elif action == "pre_clear":
+        instance._cleared_location_ids = location_ids(None)
+        return
+    elif action == "post_clear":
+        ids = instance.__dict__.pop("_cleared_location_ids", [])
+    else:
+        return
+    for location_id in set(ids):
+        invalidate_location(location_id)
+
+
+@receiver(m2m_changed, sender=Location.house_admins.through)
+def location_cache_invalidate_house_admins(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action.startswith("post_"):
+            invalidate_location(instance.pk)
+        return
+
+    def location_ids(pks):
+        if pks is None:
+            return list(instance.house_admin.values_list("pk", flat=True))
+        return list(pks)
+
+    _invalidate_from_user_side(instance, action, pk_set, location_ids)
+
+
+@receiver([post_save, post_delete], sender=Resource)
+def location_cache_invalidate_resource(sender, instance, **kwargs):
+    invalidate_location(instance.location_id)
+
+
+@receiver([post_save, post_delete], sender=Backing)
+def location_cache_invalidate_backing(sender, instance, **kwargs):
+    # go through the db rather than instance.resource, which may already be
+    # gone when this is part of a cascading delete
+    invalidate_location(
+        Resource.objects.filter(pk=instance.resource_id)
+        .values_list("location_id", flat=True)
+        .first()
+    )
+
+
+@receiver(m2m_changed, sender=Backing.users.through)
+def location_cache_invalidate_backing_users(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action.startswith("post_"):
+            invalidate_location(
+                Resource.objects.filter(pk=instance.resource_id)
+                .values_list("location_id", flat=True)
+                .first()
+            )
+        return
+
+    def location_ids(pks):
+        backings = (
+            instance.backings.all()
+            if pks is None
+            else Backing.objects.filter(pk__in=pks)
+        )
+        return list(backings.values_list("resource__location_id", flat=True))
+
+    _invalidate_from_user_side(instance, action, pk_set, location_ids)
+
+
+@receiver([post_save, post_delete], sender=CapacityChange)
+def location_cache_invalidate_capacity(sender, instance, **kwargs):
+    # rooms with future capacity and the rooms menu depend on these. like
+    # backings, go through the db in case the resource is being deleted
+    invalidate_location(
+        Resource.objects.filter(pk=instance.resource_id)
+        .values_list("location_id", flat=True)
+        .first()
+    )
+
+
+@receiver([post_save, post_delete], sender=LocationMenu)
+def location_cache_invalidate_menu(sender, instance, **kwargs):
+    invalidate_location(instance.location_id)
+
+
+@receiver([post_save, post_delete], sender=LocationFlatPage)
+def location_cache_invalidate_flatpage(sender, instance, **kwargs):
+    invalidate_location(
+        LocationMenu.objects.filter(pk=instance.menu_id)
+        .values_list("location_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=FlatPage)
+def location_cache_invalidate_flatpage_content(sender, instance, **kwargs):
+    invalidate_location(
+        LocationFlatPage.objects.filter(flatpage=instance)
+        .values_list("menu__location_id", flat=True)
+        .first()
+    )
+
+
+@receiver([post_save, post_delete], sender=Use)
+def location_cache_invalidate_use(sender, instance, **kwargs):
+    invalidate_location(instance.location_id)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=BillLineItem)
+def refresh_balance_on_bill_change(sender, instance, **kwargs):
+    refresh_bill_balance(instance.bill_id)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_balance_on_booking_save(sender, instance, **kwargs):
+    # a save writes back whatever balance the instance was loaded with
+    refresh_bill_balance(instance.bill_id)
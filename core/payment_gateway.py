@@ -1,3 +1,4 @@
+import contextlib
 import logging
 from decimal import Decimal
 
@@ -15,6 +16,23 @@ class PaymentException(Exception):
     pass
 
 
+@contextlib.asynccontextmanager
+async def async_stripe():
+    """A StripeClient for async views, whose *_async calls don't hold a thread
+    while Stripe answers under ASGI. Each gets its own connections, since under WSGI every
+    async view runs in an event loop of its own and pooled connections can't
+    outlive their loop. Requests go to stripe.api_base like the sync calls."""
+    http_client = stripe.HTTPXClient()
+    try:
+        yield stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            base_addresses={"api": stripe.api_base},
+            http_client=http_client,
+        )
+    finally:
+        await http_client.close_async()
+
+
 def _charge_description(booking):
     booking_url = "https://" + Site.objects.get_current().domain
     booking_url += reverse(
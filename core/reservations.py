@@ -0,0 +1,81 @@
+"""Approving and confirming uses without overbooking.
+
+Approved and confirmed uses take up a resource's capacity. Checking
+availability and then saving the new status in two steps lets two requests for
+the last bed both succeed, so reserve() does both while holding a lock on the
+resource row: a second reservation of the same resource waits until the first
+has committed and then sees it when it counts occupancy.
+
+reserve() only needs a use, so views, API commands and GraphQL mutations can
+all call it. reserved() holds the room while the guest is charged for it.
+"""
+
+import contextlib
+import datetime
+import logging
+
+from django.db import transaction
+
+from core.libs.dates import count_range_objects_on_day, dates_within
+from core.models import Resource, Use
+
+logger = logging.getLogger(__name__)
+
+RESERVED_STATUSES = (Use.APPROVED, Use.CONFIRMED)
+
+
+class Unavailable(Exception):
+    def __init__(self, use, nights):
+        self.use = use
+        self.nights = nights
+        dates = ", ".join(night.strftime("%B %d") for night in nights)
+        super().__init__(f"Sorry, {use.resource.name} is fully booked on {dates}.")
+
+
+def full_nights(use):
+    """the nights of use on which its resource has no room left once every
+    other approved or confirmed use is counted."""
+    last_night = use.depart - datetime.timedelta(days=1)
+    capacities = dict(use.resource.daily_capacities_within(use.arrive, last_night))
+    others = list(
+        Use.objects.conflicting(use.resource, use.arrive, use.depart, exclude=use)
+    )
+    return [
+        night
+        for night in dates_within(use.arrive, last_night)
+        if capacities[night] - count_range_objects_on_day(others, night) < 1
+    ]
+
+
+def reserve(use, status=Use.CONFIRMED):
+    """set use's status to approved or confirmed if its resource has room on
+    every night of the stay, or raise Unavailable. use is updated in place."""
+    if status not in RESERVED_STATUSES:
+        raise ValueError(f"{status} doesn't reserve capacity")
+
+    with transaction.atomic():
+        if use.resource_id is not None:
+            # every reservation of this resource queues up here
+            Resource.objects.select_for_update().get(pk=use.resource_id)
+            use.refresh_from_db()
+            nights = full_nights(use)
+            if nights:
+                logger.info(f"use {use.id} not {status}: full on {nights}")
+                raise Unavailable(use, nights)
+        use.status = status
+        use.save()
+    return use
+
+
+@contextlib.contextmanager
+def reserved(use, status=Use.CONFIRMED):
+    """reserve() use for the block, such as charging for the stay, and put
+    its previous status back if the block raises anything."""
+    previous_status = use.status
+    reserve(use, status)
+    try:
+        yield use
+    except BaseException:
+        use.status = previous_status
+        use.save()
+        raise
@@ -4,7 +4,13 @@ from datetime import timedelta
 import dateutil
 from rest_framework import serializers
 
-from core.models import CapacityChange, Fee, Location, Resource
+from core.models import (
+    CapacityChange,
+    Fee,
+    Location,
+    Resource,
+    prefetch_availabilities,
+)
 
 
 class CapacityChangeSerializer(serializers.ModelSerializer):
@@ -25,32 +31,46 @@ class FeeSerializer(serializers.ModelSerializer):
         fields = ("id", "description", "percentage", "paid_by_house")
 
 
+def requested_period(request):
+    try:
+        params = request.query_params.dict()
+    except AttributeError:
+        # this is a django request and not a REST request
+        params = request.GET.dict()
+
+    try:
+        arrive = params.get("arrive", dt.datetime.today())
+        arrive = dateutil.parser(arrive).date
+        depart = params.get("depart", arrive + timedelta(days=13))
+        depart = dateutil.parser(depart).date
+    except Exception:
+        arrive = dt.date.today()
+        depart = arrive + timedelta(days=13)
+    return arrive, depart
+
+
+class ResourceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        resources = list(data.all() if hasattr(data, "all") else data)
+        prefetch_availabilities(resources, *requested_period(self.context["request"]))
+        return super().to_representation(resources)
+
+
 class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resource
         exclude = ["location"]
+        list_serializer_class = ResourceListSerializer
 
     def to_representation(self, obj):
         representation = super().to_representation(obj)
-        request = self.context["request"]
-        try:
-            params = request.query_params.dict()
-        except AttributeError:
-            # this is a django request and not a REST request
-            params = request.GET.dict()
-
-        try:
-            arrive = params.get("arrive", dt.datetime.today())
-            arrive = dateutil.parser(arrive).date
-            depart = params.get("depart", arrive + timedelta(days=13))
-            depart = dateutil.parser(depart).date
-        except Exception:
-            arrive = dt.date.today()
-            depart = arrive + timedelta(days=13)
+        arrive, depart = requested_period(self.context["request"])
 
         availabilities = [
             {"date": date, "quantity": quantity}
-            for (date, quantity) in obj.daily_availabilities_within(arrive, depart)
+            for (date, quantity) in obj.daily_availabilities_within(
+                arrive, depart, uses=getattr(obj, "confirmed_uses", None)
+            )
         ]
         representation["availabilities"] = availabilities
         representation["hasFutureDrftCapacity"] = obj.has_future_drft_capacity()
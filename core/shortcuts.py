@@ -25,3 +25,30 @@ def get_qs_or_404(klass, *args, **kwargs):
     if not qs.exists():
         raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
     return qs
+
+
+def get_request_location(request, location_slug):
+    """
+    Returns the Location for location_slug, or None if there isn't one.
+
+    Reuses request.location when LocationMiddleware has already resolved the
+    same slug for this request, and otherwise goes through the location cache
+    rather than the database.
+    """
+    from core.cache import get_cached_location
+
+    location = getattr(request, "location", None)
+    if location is None or location.slug != location_slug:
+        location = get_cached_location(location_slug)
+    return location
+
+
+def get_location_or_404(location_slug, request=None):
+    """
+    Like get_request_location, but raises Http404 if there is no such
+    location. request is optional for callers that don't have one.
+    """
+    location = get_request_location(request, location_slug)
+    if location is None:
+        raise Http404("No Location matches the given query.")
+    return location
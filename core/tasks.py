@@ -12,8 +12,10 @@ from core.emails.messages import (
     goodbye_email,
     guest_welcome,
     guests_residents_daily_update,
+    new_booking_notify,
 )
-from core.models import Location, Use
+from core.images import rendition_url
+from core.models import Booking, Location, Use
 
 logger = logging.getLogger(__name__)
 
@@ -78,10 +80,17 @@ def send_departure_email():
     return did_send_email
 
 
+def notify_new_booking(booking_id):
+    booking = Booking.objects.select_related(
+        "use__location", "use__resource", "use__user__profile"
+    ).get(id=booking_id)
+    new_booking_notify(booking)
+
+
 def _format_attachment(use, color):
     domain = "https://" + Site.objects.get_current().domain
     if use.user.profile.image:
-        profile_img_url = domain + use.user.profile.image.url
+        profile_img_url = domain + rendition_url(use.user.profile, "image_thumb")
     else:
         profile_img_url = domain + "/static/img/default.jpg"
     booking_url = "<{}{}|{} - {} in {}>\n{}".format(
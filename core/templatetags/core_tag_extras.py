@@ -1,9 +1,14 @@
 import itertools
 
 from django import template
+from django.conf import settings
 from django.contrib.auth.models import Group
+from django.forms.utils import flatatt
 from django.template import NodeList
 from django.template.defaultfilters import stringfilter
+from django.utils.html import format_html, format_html_join
+
+from core.images import rendition_url, responsive_srcsets
 
 register = template.Library()
 
@@ -83,3 +88,49 @@ class GroupCheckNode(template.Node):
         except Group.DoesNotExist:
             return self.nodelist_false.render(context)
         return self.nodelist_false.render(context)
+
+
+@register.filter
+def rendition(instance, spec_name):
+    """url of an image rendition, or of the original image if the rendition
+    hasn't been generated yet. never processes images itself. use like so:
+        <img src="{{ user.profile|rendition:'image_thumb' }}">
+    """
+    if not instance:
+        return ""
+    return rendition_url(instance, spec_name) or ""
+
+
+@register.simple_tag
+def responsive_image(instance, field, sizes="100vw", default=None, **attrs):
+    """<picture> for an image with responsive renditions, listing the WebP and
+    JPEG widths that have been generated. falls back to the original image,
+    or to default (a path under MEDIA_URL) when there is no image at all.
+    any other keyword arguments become attributes of the <img>:
+        {% responsive_image user.profile "image" sizes="150px" class="thumb" %}
+    """
+    image = getattr(instance, field, None) if instance else None
+    if not image:
+        if not default:
+            return ""
+        return format_html(
+            '<img src="{}{}"{}>', settings.MEDIA_URL, default, flatatt(attrs)
+        )
+
+    srcsets = responsive_srcsets(instance, field)
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (mime, srcset, sizes)
+            for mime, srcset in srcsets.items()
+            if mime != "image/jpeg"
+        ),
+    )
+    img_attrs = dict(attrs)
+    if "image/jpeg" in srcsets:
+        img_attrs.update(srcset=srcsets["image/jpeg"], sizes=sizes)
+    img_attrs.setdefault("loading", "lazy")
+    return format_html(
+        '<picture>{}<img src="{}"{}></picture>', sources, image.url, flatatt(img_attrs)
+    )
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.emails.mailgun import amailgun_send
+from core.factory_apps.location import BackingFactory, LocationFactory, ResourceFactory
+from core.factory_apps.payment import UseFactory
+from core.factory_apps.user import UserFactory
+from core.models import Backing, Use
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.respond()
+
+    def do_DELETE(self):
+        self.respond()
+
+    def respond(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append((self.command, self.path, body))
+        time.sleep(self.server.delay)
+        payload = json.dumps(self.server.payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerMixin:
+    """A local HTTP server standing in for Mailgun or Stripe, answering every
+    request with payload after delay seconds."""
+
+    delay = 0
+    payload = {}
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.requests = []
+        self.server.delay = self.delay
+        self.server.payload = self.payload
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.stub_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+
+def form_values(body, name):
+    # the values of a field in a multipart/form-data body
+    return re.findall(rf'name="{name}"\r\n\r\n(.*?)\r\n'.encode(), body)
+
+
+def mailgun_settings(test):
+    def wrapper(self, *args, **kwargs):
+        with override_settings(
+            MAILGUN_API_KEY="key",
+            MAILGUN_CAUTION_SEND_REAL_MAIL=False,
+            MAILGUN_API_URL=self.stub_url,
+            LIST_DOMAIN="lists.example.com",
+        ):
+            return test(self, *args, **kwargs)
+
+    return wrapper
+
+
+class ConcurrentSendTestCase(StubServerMixin, SimpleTestCase):
+    delay = 0.5
+
+    @mailgun_settings
+    def test_sends_wait_together(self):
+        async def send_all():
+            return await asyncio.gather(
+                *[amailgun_send({"subject": f"hi {i}"}) for i in range(5)]
+            )
+
+        started = time.monotonic()
+        responses = asyncio.run(send_all())
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+        self.assertEqual(len(self.server.requests), 5)
+        # one after another would take 2.5s
+        self.assertLess(elapsed, 2)
+
+
+class ListEndpointTestCase(StubServerMixin, TestCase):
+    def post(self, endpoint, location, sender="guest@example.com"):
+        return self.client.post(
+            reverse(endpoint, args=[location.slug]),
+            {
+                "from": sender,
+                "sender": sender,
+                "recipient": f"list@{location.slug}.lists.example.com",
+                "subject": "arriving late",
+                "body-plain": "see you at midnight",
+                "message-headers": "[]",
+                "attachment-1": SimpleUploadedFile("map.txt", b"turn left"),
+            },
+        )
+
+    @mailgun_settings
+    def test_stay_forwards_to_admins(self):
+        location = LocationFactory()
+        admin = UserFactory(username="boss", email="boss@example.com")
+        location.house_admins.set([admin])
+
+        response = self.post("location_email_stay", location)
+
+        self.assertEqual(response.status_code, 200)
+        [(method, path, body)] = self.server.requests
+        self.assertEqual(path, "/lists.example.com/messages")
+        self.assertEqual(form_values(body, "to"), [b"boss@example.com"])
+        self.assertEqual(
+            json.loads(form_values(body, "recipient-variables")[0]),
+            {"boss@example.com": {}},
+        )
+        self.assertIn(b"arriving late", body)
+        self.assertIn(b'filename="map.txt"', body)
+
+    @mailgun_settings
+    @override_settings(DEBUG=True)
+    def test_served_over_asgi(self):
+        location = LocationFactory()
+        location.house_admins.set([UserFactory(username="boss")])
+        data = {
+            "from": "guest@example.com",
+            "recipient": f"stay@{location.slug}.lists.example.com",
+            "subject": "arriving late",
+            "body-plain": "see you at midnight",
+            "message-headers": "[]",
+        }
+
+        # every middleware runs in the async chain, down to the view
+        response = async_to_sync(self.async_client.post)(
+            reverse("location_email_stay", args=[location.slug]), data
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn("queries", response["Server-Timing"])
+
+    @mailgun_settings
+    def test_current_sends_in_batches(self):
+        today = timezone.localtime(timezone.now()).date()
+        resource = ResourceFactory()
+        location = resource.location
+        # drop the stays and backings the factory made up
+        Use.objects.filter(location=location).delete()
+        Backing.objects.filter(resource=resource).delete()
+        guest = UserFactory(username="guest", email="guest@example.com")
+        ada = UserFactory(username="ada", email="ada@example.com")
+        bob = UserFactory(username="bob", email="bob@example.com")
+        cy = UserFactory(username="cy", email="cy@example.com")
+        for user in (guest, ada):
+            UseFactory(
+                user=user,
+                location=location,
+                resource=resource,
+                arrive=today - timedelta(days=1),
+                depart=today + timedelta(days=1),
+                status=Use.CONFIRMED,
+            )
+        # ada is a guest, a resident and an admin, but gets one copy
+        BackingFactory(resource=resource).users.set([ada, bob])
+        location.house_admins.set([ada, cy])
+
+        with mock.patch("core.emails.mailgun.BATCH_SIZE", 2):
+            response = self.post("location_email_current", location)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+        recipients = []
+        for _method, _path, body in self.server.requests:
+            recipients += form_values(body, "to")
+            self.assertEqual(form_values(body, "bcc"), [])
+            self.assertIn(b"turn left", body)
+        self.assertEqual(
+            sorted(recipients),
+            [b"ada@example.com", b"bob@example.com", b"cy@example.com"],
+        )
+
+    def test_current_backings(self):
+        today = timezone.localtime(timezone.now()).date()
+        resource = ResourceFactory()
+        ended = ResourceFactory(location=resource.location)
+        Backing.objects.all().delete()
+        superseded = BackingFactory(resource=resource, start=today - timedelta(days=60))
+        current = BackingFactory(resource=resource, start=today - timedelta(days=30))
+        BackingFactory(resource=resource, start=today + timedelta(days=30))
+        BackingFactory(
+            resource=ended,
+            start=today - timedelta(days=30),
+            end=today,
+        )
+
+        backings = Backing.objects.current().filter(
+            resource__location=resource.location
+        )
+        self.assertEqual(list(backings), [current])
+        self.assertNotIn(superseded, backings)
+        self.assertEqual(resource.current_backing(), current)
+        self.assertIsNone(ended.current_backing())
+
+    @mailgun_settings
+    def test_forwarded_messages_are_dropped(self):
+        location = LocationFactory()
+        response = self.client.post(
+            reverse("location_email_stay", args=[location.slug]),
+            {"message-headers": json.dumps([["List-Id", "stay@example.com"]])},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, [])
+
+
+class CardViewTestCase(StubServerMixin, TestCase):
+    payload = {"id": "cus_1", "object": "customer", "deleted": True}
+
+    def setUp(self):
+        super().setUp()
+        self.user = UserFactory(username="ada")
+        self.user.profile.stripe_customer_id = "cus_1"
+        self.user.profile.save()
+        self.url = reverse("user_delete_card", args=["ada"])
+
+    def test_login_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("next=", response.url)
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_123")
+    def test_delete_card(self):
+        self.client.force_login(self.user)
+        with mock.patch("stripe.api_base", self.stub_url):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            [r[:2] for r in self.server.requests], [("DELETE", "/v1/customers/cus_1")]
+        )
+        self.user.profile.refresh_from_db()
+        self.assertIsNone(self.user.profile.stripe_customer_id)
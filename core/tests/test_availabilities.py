@@ -2,8 +2,8 @@ from datetime import date
 
 from django.test import TestCase
 
-from core.factories import ResourceFactory
-from core.models import CapacityChange
+from core.factories import ResourceFactory, UserFactory
+from core.models import CapacityChange, Use
 
 
 class CapacityQuantityOnTestCase(TestCase):
@@ -60,3 +60,72 @@ class CapacityQuantityOnTestCase(TestCase):
         self.assertEqual(
             CapacityChange.objects.quantity_on(date(4016, 1, 17), self.resource), 1
         )
+
+
+class UseOverlapTestCase(TestCase):
+    def setUp(self):
+        self.resource = ResourceFactory()
+        self.user = UserFactory()
+        # nights of jan 10, 11 and 12
+        self.use = self.create_use(date(4016, 1, 10), date(4016, 1, 13))
+
+    def create_use(self, arrive, depart, status=Use.CONFIRMED):
+        return Use.objects.create(
+            location=self.resource.location,
+            resource=self.resource,
+            user=self.user,
+            arrive=arrive,
+            depart=depart,
+            status=status,
+        )
+
+    def test_occupying(self):
+        self.assertFalse(Use.objects.occupying(date(4016, 1, 9)).exists())
+        self.assertTrue(Use.objects.occupying(date(4016, 1, 10)).exists())
+        self.assertTrue(Use.objects.occupying(date(4016, 1, 12)).exists())
+        # the day of departure isn't a night of the use
+        self.assertFalse(Use.objects.occupying(date(4016, 1, 13)).exists())
+
+    def test_overlapping(self):
+        overlapping = Use.objects.overlapping
+        self.assertTrue(overlapping(date(4016, 1, 12), date(4016, 1, 20)).exists())
+        self.assertFalse(overlapping(date(4016, 1, 13), date(4016, 1, 20)).exists())
+        self.assertFalse(overlapping(date(4016, 1, 1), date(4016, 1, 10)).exists())
+        self.assertTrue(
+            overlapping(date(4016, 1, 13), date(4016, 1, 20), inclusive=True).exists()
+        )
+        self.assertTrue(
+            overlapping(date(4016, 1, 1), date(4016, 1, 10), inclusive=True).exists()
+        )
+
+    def test_confirmed_uses_between(self):
+        self.create_use(date(4016, 1, 11), date(4016, 1, 12), status=Use.PENDING)
+        self.assertEqual(
+            list(
+                self.resource.confirmed_uses_between(
+                    date(4016, 1, 13), date(4016, 1, 14)
+                )
+            ),
+            [self.use],
+        )
+
+    def test_conflicting(self):
+        self.create_use(date(4016, 1, 13), date(4016, 1, 15), status=Use.CANCELED)
+        self.assertEqual(
+            list(
+                Use.objects.conflicting(
+                    self.resource, date(4016, 1, 12), date(4016, 1, 14)
+                )
+            ),
+            [self.use],
+        )
+        self.assertFalse(
+            Use.objects.conflicting(
+                self.resource, date(4016, 1, 13), date(4016, 1, 15)
+            ).exists()
+        )
+        self.assertFalse(
+            Use.objects.conflicting(
+                self.resource, date(4016, 1, 10), date(4016, 1, 13), exclude=self.use
+            ).exists()
+        )
@@ -0,0 +1,106 @@
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from bank.models import Currency
+from bank.views import create_transaction
+from core.background import after_commit
+from core.factory_apps.location import ResourceFactory
+from core.factory_apps.user import UserFactory
+from core.models import Booking, CapacityChange, Use
+
+
+class AfterCommitTestCase(TestCase):
+    @override_settings(BACKGROUND_TASKS_ASYNC=True)
+    def test_runs_in_the_background_after_commit(self):
+        ran = threading.Event()
+        threads = []
+
+        def task(name):
+            threads.append((name, threading.current_thread().name))
+            ran.set()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            after_commit(task, name="notify")
+            self.assertFalse(ran.is_set())
+        self.assertTrue(ran.wait(5))
+        self.assertEqual(threads[0][0], "notify")
+        self.assertTrue(threads[0][1].startswith("background-tasks"))
+
+    @override_settings(BACKGROUND_TASKS_ASYNC=True)
+    def test_not_run_when_rolled_back(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    after_commit(print, "never")
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+
+
+class BookingSubmitTestCase(TestCase):
+    @mock.patch("core.emails.messages.mailgun_send")
+    def test_submit(self, mailgun_send):
+        resource = ResourceFactory(default_rate=Decimal("40.00"))
+        guest = UserFactory(username="submitter")
+        self.client.force_login(User.objects.get(username="submitter"))
+
+        response = self.client.post(
+            reverse("booking_submit", args=[resource.location.slug]),
+            {
+                "resource": resource.id,
+                "arrive": "4016-01-10",
+                "depart": "4016-01-13",
+                "arrival_time": "",
+                "purpose": "visiting",
+                "comments": "",
+            },
+        )
+        booking = Booking.objects.get(use__user=guest)
+        self.assertRedirects(
+            response,
+            reverse("booking_detail", args=[resource.location.slug, booking.id]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(booking.use.arrive, date(4016, 1, 10))
+        self.assertEqual(booking.rate, Decimal("40.00"))
+        self.assertEqual(booking.bill.subtotal_amount(), Decimal("120.00"))
+        mailgun_send.assert_called_once()
+
+    @mock.patch("core.views.booking.after_commit")
+    def test_drft_suggestion_is_applied_before_the_redirect(self, after_commit):
+        # nothing queued for the background has run when booking_detail
+        # shows the booking
+        currency = Currency.objects.create(name="DRFT", symbol="Ɖ")
+        resource = ResourceFactory()
+        CapacityChange.objects.create(
+            resource=resource, start_date=date(4016, 1, 1), quantity=1, accept_drft=True
+        )
+        guest = UserFactory(username="drifter")
+        create_transaction(
+            "gift",
+            3,
+            currency.systemaccounts.debit,
+            guest.profile.primary_drft_account(),
+        )
+        self.client.force_login(User.objects.get(username="drifter"))
+
+        self.client.post(
+            reverse("booking_submit", args=[resource.location.slug]),
+            {
+                "resource": resource.id,
+                "arrive": "4016-01-10",
+                "depart": "4016-01-13",
+                "arrival_time": "",
+                "purpose": "visiting",
+                "comments": "",
+            },
+        )
+        self.assertEqual(Use.objects.get(user=guest).accounted_by, Use.DRFT)
@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from bank.balances import balance_as_of, balances_as_of, create_checkpoints
+from bank.models import Account, AccountBalanceCheckpoint, Currency, Transaction
+from bank.views import create_transaction
+
+
+class BalanceCheckpointTestCase(TestCase):
+    def setUp(self):
+        self.currency = Currency.objects.create(name="DRFT", symbol="Ɖ")
+        self.source = self.currency.systemaccounts.debit
+        self.account = Account.objects.create(currency=self.currency, name="Savings")
+        self.other = Account.objects.create(currency=self.currency, name="Spending")
+        # 10 on jan 5, 20 on jan 20 and 40 on feb 3
+        self.deposit(date(2016, 1, 5), 10)
+        self.deposit(date(2016, 1, 20), 20)
+        self.deposit(date(2016, 2, 3), 40)
+        self.deposit(date(2016, 1, 31), 5, self.other)
+
+    def deposit(self, day, amount, account=None):
+        reason = f"deposit of {amount} on {day}"
+        create_transaction(reason, amount, self.source, account or self.account)
+        transaction = Transaction.objects.get(reason=reason)
+        transaction.date = timezone.make_aware(
+            datetime.combine(day, datetime.min.time())
+        )
+        transaction.save()
+        return transaction
+
+    def test_balance_as_of(self):
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 4)), 0)
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 5)), 10)
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 31)), 30)
+
+        create_checkpoints(date(2016, 1, 10), [self.currency])
+        # only checkpoints carry a balance forward
+        AccountBalanceCheckpoint.objects.filter(account=self.account).update(
+            balance=1000
+        )
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 9)), 10)
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 31)), 1020)
+        self.assertEqual(self.account.get_balance(), 1060)
+
+    def test_balances_as_of(self):
+        create_checkpoints(date(2016, 1, 10), [self.currency])
+        with self.assertNumQueries(1):
+            balances = {
+                a.id: a.balance
+                for a in balances_as_of(self.currency, date(2016, 1, 31))
+            }
+        self.assertEqual(balances[self.account.id], 30)
+        self.assertEqual(balances[self.other.id], 5)
+        self.assertEqual(balances[self.source.id], -35)
+
+    def test_checkpoints_match_the_ledger(self):
+        create_checkpoints(date(2016, 1, 31), [self.currency])
+        for account in Account.objects.all():
+            checkpoint = account.checkpoints.get()
+            checkpoint.delete()
+            self.assertEqual(
+                checkpoint.balance, balance_as_of(account, date(2016, 1, 31))
+            )
+
+    def test_backdated_entries_drop_later_checkpoints(self):
+        create_checkpoints(date(2016, 1, 10), [self.currency])
+        create_checkpoints(date(2016, 1, 31), [self.currency])
+        self.deposit(date(2016, 1, 15), 3)
+        self.assertEqual(
+            list(self.account.checkpoints.values_list("date", flat=True)),
+            [date(2016, 1, 10)],
+        )
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 31)), 33)
+        self.assertEqual(self.account.get_balance(), 73)
+
+    def test_moving_a_transaction_drops_checkpoints(self):
+        create_checkpoints(date(2016, 1, 31), [self.currency])
+        transaction = Transaction.objects.get(reason="deposit of 40 on 2016-02-03")
+        transaction.date = timezone.make_aware(datetime(2016, 1, 25))
+        transaction.save()
+        self.assertFalse(self.account.checkpoints.exists())
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 31)), 70)
+
+    def test_editing_an_entry_drops_the_other_accounts_checkpoints(self):
+        create_checkpoints(date(2016, 1, 31), [self.currency])
+        transaction = Transaction.objects.get(reason="deposit of 20 on 2016-01-20")
+        entry = transaction.entries.get(account=self.account)
+        entry.amount = 25
+        # the transaction no longer balances, so both of its entries stop
+        # counting
+        with self.assertRaisesMessage(Exception, "must balance out"):
+            entry.save()
+        self.assertFalse(self.source.checkpoints.exists())
+        self.assertEqual(balance_as_of(self.source, date(2016, 1, 31)), -15)
+
+        create_checkpoints(date(2016, 1, 31), [self.currency])
+        other_entry = transaction.entries.get(account=self.source)
+        other_entry.amount = -25
+        other_entry.save()
+        self.assertFalse(self.account.checkpoints.exists())
+        self.assertEqual(balance_as_of(self.account, date(2016, 1, 31)), 35)
+        self.assertEqual(balance_as_of(self.source, date(2016, 1, 31)), -40)
+
+    def test_command(self):
+        call_command(
+            "create_balance_checkpoints", "--date", "2016-01-31", stdout=StringIO()
+        )
+        self.assertEqual(
+            AccountBalanceCheckpoint.objects.filter(date=date(2016, 1, 31)).count(),
+            Account.objects.count(),
+        )
+        # running it again replaces them
+        call_command(
+            "create_balance_checkpoints", "--date", "2016-01-31", stdout=StringIO()
+        )
+        self.assertEqual(
+            AccountBalanceCheckpoint.objects.count(), Account.objects.count()
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                "create_balance_checkpoints",
+                "--date",
+                (timezone.localdate() + timedelta(days=1)).isoformat(),
+            )
@@ -0,0 +1,218 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.admin import BookingAdmin
+from core.billing import regenerate_bills
+from core.factory_apps.location import (
+    FeeFactory,
+    LocationFactory,
+    LocationFeeFactory,
+    ResourceFactory,
+)
+from core.factory_apps.payment import (
+    BookingBillFactory,
+    BookingFactory,
+    PaymentFactory,
+    UseFactory,
+)
+from core.factory_apps.user import UserFactory
+from core.models import BillLineItem, Booking, Payment, Use
+
+
+def line_item_summary(bill):
+    return sorted(
+        (item.description, round(item.amount, 2), item.paid_by_house, item.fee_id)
+        for item in bill.line_items.all()
+    )
+
+
+class BillingTestCase(TestCase):
+    def setUp(self):
+        self.locations = [
+            LocationFactory(slug="billing-a"),
+            LocationFactory(slug="billing-b"),
+        ]
+        self.tax = FeeFactory(description="tax", percentage=0.1, paid_by_house=False)
+        self.service = FeeFactory(
+            description="service", percentage=0.05, paid_by_house=True
+        )
+        for location in self.locations:
+            LocationFeeFactory(location=location, fee=self.tax)
+            LocationFeeFactory(location=location, fee=self.service)
+        self.guest = UserFactory(username="billed")
+        self.bookings = []
+
+    def add_bookings(self, count, start=datetime.date(2024, 1, 1)):
+        for i in range(count):
+            location = self.locations[i % 2]
+            room = ResourceFactory(location=location, default_rate=Decimal("50.00"))
+            arrive = start + datetime.timedelta(days=i)
+            use = UseFactory(
+                location=location,
+                resource=room,
+                user=self.guest,
+                status=Use.CONFIRMED,
+                arrive=arrive,
+                depart=arrive + datetime.timedelta(days=3),
+            )
+            booking = BookingFactory(use=use, bill=BookingBillFactory(), rate=None)
+            booking.generate_bill()
+            self.bookings.append(booking)
+        return self.bookings
+
+
+class RegenerateBillsTestCase(BillingTestCase):
+    def test_same_line_items_as_generate_bill(self):
+        bookings = self.add_bookings(4)
+        BillLineItem.objects.create(
+            bill=bookings[0].bill,
+            description="discount",
+            amount=Decimal("-20.00"),
+            paid_by_house=False,
+            custom=True,
+        )
+        bookings[1].suppressed_fees.add(self.tax)
+        # make the current bills stale
+        self.tax.percentage = 0.2
+        self.tax.save()
+
+        expected = {}
+        for booking in bookings:
+            booking.generate_bill()
+            expected[booking.id] = line_item_summary(booking.bill)
+            BillLineItem.objects.filter(bill=booking.bill, custom=False).delete()
+
+        self.assertEqual(regenerate_bills(Booking.objects.filter(id__in=expected)), 4)
+        for booking in bookings:
+            self.assertEqual(line_item_summary(booking.bill), expected[booking.id])
+        # the custom discount is kept, not duplicated
+        self.assertEqual(bookings[0].bill.line_items.filter(custom=True).count(), 1)
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        self.add_bookings(2)
+        with CaptureQueriesContext(connection) as few:
+            regenerate_bills(self.bookings[:2])
+        self.add_bookings(8)
+        with CaptureQueriesContext(connection) as many:
+            regenerate_bills(self.bookings)
+        self.assertEqual(len(few), len(many))
+
+    def test_admin_rate_actions(self):
+        bookings = self.add_bookings(3)
+        admin = BookingAdmin(Booking, AdminSite())
+        request = RequestFactory().post("/admin/core/booking/")
+        admin.message_user = lambda *args, **kwargs: None
+        queryset = Booking.objects.filter(id__in=[b.id for b in bookings])
+
+        admin.mark_as_comp(request, queryset)
+        for booking in queryset:
+            self.assertTrue(booking.is_comped())
+            self.assertEqual(booking.bill.amount(), 0)
+
+        admin.reset_rate(request, queryset)
+        for booking in queryset:
+            self.assertEqual(booking.rate, Decimal("50.00"))
+            self.assertEqual(booking.bill.subtotal_amount(), Decimal("150.00"))
+
+
+class BillTotalsTestCase(BillingTestCase):
+    def test_with_bill_totals_matches_bill_methods(self):
+        bookings = self.add_bookings(3)
+        PaymentFactory(bill=bookings[0].bill, paid_amount=Decimal("40.00"))
+        PaymentFactory(bill=bookings[0].bill, paid_amount=Decimal("-10.00"))
+        for booking in Booking.objects.with_bill_totals().filter(
+            id__in=[b.id for b in bookings]
+        ):
+            self.assertEqual(booking.bill_amount, booking.bill.amount())
+            self.assertEqual(booking.bill_paid, booking.bill.total_paid())
+            self.assertEqual(booking.bill_house_fees, booking.bill.house_fees())
+            self.assertEqual(booking.bill_non_house_fees, booking.bill.non_house_fees())
+
+    def test_admin_changelist_query_count(self):
+        admin = UserFactory(username="root", is_superuser=True, is_staff=True)
+        self.client.force_login(admin)
+        url = reverse("admin:core_booking_changelist")
+
+        self.add_bookings(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_bookings(8)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+
+class OutstandingBalanceTestCase(BillingTestCase):
+    def assertBalanceUpToDate(self, booking):
+        booking.refresh_from_db()
+        self.assertEqual(booking.outstanding_balance, booking.bill.total_owed())
+
+    def test_balance_follows_bill_changes(self):
+        booking = self.add_bookings(1)[0]
+        self.assertGreater(booking.bill.total_owed(), 0)
+        self.assertBalanceUpToDate(booking)
+
+        payment = PaymentFactory(bill=booking.bill, paid_amount=Decimal("60.00"))
+        self.assertBalanceUpToDate(booking)
+
+        BillLineItem.objects.create(
+            bill=booking.bill,
+            description="late checkout",
+            amount=Decimal("15.00"),
+            paid_by_house=False,
+            custom=True,
+        )
+        self.assertBalanceUpToDate(booking)
+
+        payment.delete()
+        self.assertBalanceUpToDate(booking)
+
+        booking.refresh_from_db()
+        booking.comp()
+        self.assertBalanceUpToDate(booking)
+
+    def test_regenerate_bills_refreshes_balances(self):
+        bookings = self.add_bookings(4)
+        Booking.objects.update(outstanding_balance=0)
+        regenerate_bills(bookings)
+        for booking in bookings:
+            self.assertBalanceUpToDate(booking)
+
+    def test_confirmed_but_unpaid(self):
+        paid, unpaid, pending = self.add_bookings(3)
+        Payment.objects.create(bill=paid.bill, paid_amount=paid.bill.amount())
+        pending.pending()
+        owing = Use.objects.confirmed_but_unpaid(location=self.locations[1])
+        self.assertEqual(list(owing), [unpaid])
+        self.assertEqual(list(Use.objects.confirmed_but_unpaid(self.locations[0])), [])
+
+    def test_aging_report(self):
+        today = timezone.localtime(timezone.now()).date()
+        for days_ago in (5, 45, 46, 90):
+            self.add_bookings(1, start=today - datetime.timedelta(days=days_ago))
+        self.add_bookings(1, start=today + datetime.timedelta(days=5))
+        self.client.force_login(User.objects.get(username="admin"))
+        url = reverse("location_aging_report", args=[self.locations[0].slug])
+
+        report = self.client.get(url).json()
+        self.assertEqual(
+            [(bucket["bucket"], bucket["count"]) for bucket in report["buckets"]],
+            [("0-30", 1), ("31-60", 2), ("60+", 1)],
+        )
+        self.assertEqual(
+            [booking["days_overdue"] for booking in report["bookings"]],
+            [90, 46, 45, 5],
+        )
+
+        report = self.client.get(url, {"bucket": "31-60"}).json()
+        self.assertEqual(
+            [booking["days_overdue"] for booking in report["bookings"]], [46, 45]
+        )
@@ -0,0 +1,121 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.cache import (
+    _version_key,
+    bump_location_version,
+    cached_for_location,
+    get_cached_location,
+    get_cached_locations,
+    location_version,
+)
+from core.factories import LocationFactory, ResourceFactory, UserFactory
+from core.models import Backing, CapacityChange, LocationMenu, Use
+
+
+class LocationCacheTestCase(TestCase):
+    def setUp(self):
+        self.location = LocationFactory()
+        self.resource = ResourceFactory(location=self.location)
+
+    def test_location_lookup_is_cached(self):
+        self.assertEqual(get_cached_location(self.location.slug), self.location)
+        self.assertIn(self.location, get_cached_locations())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_location(self.location.slug), self.location)
+            self.assertIn(self.location, get_cached_locations())
+
+    def test_unknown_slug(self):
+        self.assertIsNone(get_cached_location("nowhere"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_cached_location("nowhere"))
+
+    def test_renamed_slug_invalidates(self):
+        old_slug = self.location.slug
+        get_cached_location(old_slug)
+        self.location.slug = "renamed"
+        self.location.save()
+        self.assertIsNone(get_cached_location(old_slug))
+        self.assertEqual(get_cached_location("renamed"), self.location)
+
+    def test_evicted_versions_are_not_reused(self):
+        key = _version_key(self.location.id)
+        # evicted, then looked up afresh
+        cache.delete(key)
+        cached_for_location(self.location.id, "page", lambda: "old")
+        cache.delete(key)
+        self.assertEqual(
+            cached_for_location(self.location.id, "page", lambda: "new"), "new"
+        )
+        # evicted, then bumped
+        cache.delete(key)
+        bump_location_version(self.location.id)
+        cached_for_location(self.location.id, "page", lambda: "old")
+        cache.delete(key)
+        bump_location_version(self.location.id)
+        self.assertEqual(
+            cached_for_location(self.location.id, "page", lambda: "new"), "new"
+        )
+
+    def test_related_saves_bump_version(self):
+        user = UserFactory()
+        version = location_version(self.location.id)
+
+        LocationMenu.objects.create(location=self.location, name="About")
+        self.assertGreater(location_version(self.location.id), version)
+        version = location_version(self.location.id)
+
+        Backing.objects.setup_new(self.resource, [user], date(2016, 1, 1))
+        self.assertGreater(location_version(self.location.id), version)
+        version = location_version(self.location.id)
+
+        Use.objects.create(
+            location=self.location,
+            resource=self.resource,
+            user=user,
+            arrive=date(2016, 1, 10),
+            depart=date(2016, 1, 12),
+        )
+        self.assertGreater(location_version(self.location.id), version)
+
+    def test_capacity_changes_bump_version(self):
+        version = location_version(self.location.id)
+        capacity = CapacityChange.objects.create(
+            resource=self.resource, start_date=date(4016, 1, 1), quantity=0
+        )
+        self.assertGreater(location_version(self.location.id), version)
+        version = location_version(self.location.id)
+        capacity.delete()
+        self.assertGreater(location_version(self.location.id), version)
+
+    def test_changes_from_the_users_side_bump_version(self):
+        user = UserFactory()
+        other = LocationFactory(slug="elsewhere")
+        backing = Backing.objects.setup_new(self.resource, [], date(2016, 1, 1))
+
+        changes = [
+            ("add admin", other, lambda: user.house_admin.add(self.location, other)),
+            ("remove admin", other, lambda: user.house_admin.remove(other)),
+            ("clear admin", self.location, lambda: user.house_admin.clear()),
+            ("add backing", self.location, lambda: user.backings.add(backing)),
+            ("clear backings", self.location, lambda: user.backings.clear()),
+        ]
+        for name, location, change in changes:
+            with self.subTest(name):
+                version = location_version(location.id)
+                change()
+                self.assertGreater(location_version(location.id), version)
+
+    def test_residents_recomputed_after_backing(self):
+        residents = cached_for_location(
+            self.location.id, "residents", self.location.residents
+        )
+        self.assertEqual(residents, [])
+        user = UserFactory()
+        Backing.objects.setup_new(self.resource, [user], date(2016, 1, 1))
+        residents = cached_for_location(
+            self.location.id, "residents", self.location.residents
+        )
+        self.assertEqual(residents, [user])
@@ -0,0 +1,72 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.urls import reverse
+
+from core import drafts
+from core.factory_apps.location import ResourceFactory
+from core.factory_apps.user import UserFactory
+from core.models import Booking, BookingBill
+
+
+@mock.patch("core.emails.messages.mailgun_send")
+class BookingDraftTestCase(TestCase):
+    def setUp(self):
+        self.resource = ResourceFactory(default_rate=Decimal("40.00"))
+        self.guest = UserFactory(username="newcomer")
+        self.bills = BookingBill.objects.count()
+
+    def submit(self, purpose="visiting"):
+        return self.client.post(
+            reverse("booking_submit", args=[self.resource.location.slug]),
+            {
+                "resource": self.resource.id,
+                "arrive": "4016-01-10",
+                "depart": "4016-01-13",
+                "arrival_time": "",
+                "purpose": purpose,
+                "comments": "early riser",
+            },
+        )
+
+    def test_draft_kept_in_a_cookie_until_login(self, mailgun_send):
+        response = self.submit()
+        self.assertRedirects(
+            response, reverse("registration_register"), fetch_redirect_response=False
+        )
+        self.assertIn(drafts.DRAFT_COOKIE, response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(BookingBill.objects.count(), self.bills)
+
+        response = self.client.get(reverse("registration_register"))
+        preview = response.context["booking"]
+        self.assertEqual(preview["resource"]["id"], self.resource.id)
+        self.assertEqual(preview["bill"]["ordered_line_items"][0]["amount"], "120.00")
+
+        response = self.client.post(
+            reverse("user_login"), {"username": "newcomer", "password": "password"}
+        )
+        booking = Booking.objects.get(use__user=self.guest)
+        self.assertRedirects(
+            response,
+            reverse("booking_detail", args=[self.resource.location.slug, booking.id]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(response.cookies[drafts.DRAFT_COOKIE].value, "")
+        self.assertEqual(booking.comments, "early riser")
+        self.assertEqual(booking.bill.subtotal_amount(), Decimal("120.00"))
+        mailgun_send.assert_called_once()
+
+    def test_long_drafts_go_in_the_session(self, mailgun_send):
+        response = self.submit(purpose=" ".join(str(i) for i in range(3000)))
+        self.assertNotIn(drafts.DRAFT_COOKIE, response.cookies)
+        self.assertIsNotNone(drafts.loads(self.client.session[drafts.DRAFT_COOKIE]))
+
+    def test_tampered_draft_is_ignored(self, mailgun_send):
+        self.client.cookies[drafts.DRAFT_COOKIE] = "not-a-draft"
+        self.client.post(
+            reverse("user_login"), {"username": "newcomer", "password": "password"}
+        )
+        self.assertFalse(Booking.objects.filter(use__user=self.guest).exists())
@@ -0,0 +1,90 @@
+from datetime import date
+
+from django.test import TestCase
+
+from bank.models import Account, Currency
+from bank.views import create_transaction
+from core import drft
+from core.factory_apps.location import ResourceFactory
+from core.factory_apps.payment import UseFactory
+from core.factory_apps.user import UserFactory
+from core.libs.dates import dates_within
+from core.models import CapacityChange
+
+
+class DrftableBetweenTestCase(TestCase):
+    def setUp(self):
+        self.resource = ResourceFactory()
+        self.resource.capacity_changes.all().delete()
+        for start_date, accept_drft in [
+            (date(4016, 1, 1), True),
+            (date(4016, 1, 10), False),
+            (date(4016, 1, 15), True),
+        ]:
+            CapacityChange.objects.create(
+                resource=self.resource,
+                start_date=start_date,
+                quantity=2,
+                accept_drft=accept_drft,
+            )
+
+    def test_matches_day_by_day(self):
+        for start, end in [
+            (date(4015, 12, 30), date(4016, 1, 3)),
+            (date(4016, 1, 1), date(4016, 1, 9)),
+            (date(4016, 1, 2), date(4016, 1, 9)),
+            (date(4016, 1, 5), date(4016, 1, 10)),
+            (date(4016, 1, 10), date(4016, 1, 14)),
+            (date(4016, 1, 12), date(4016, 1, 20)),
+            (date(4016, 1, 15), date(4016, 1, 15)),
+            (date(4016, 2, 1), date(4016, 3, 1)),
+        ]:
+            expected = all(
+                self.resource.drftable_on(day) for day in dates_within(start, end)
+            )
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    self.resource.drftable_between(start, end), expected, (start, end)
+                )
+
+
+class SpendingBalanceTestCase(TestCase):
+    def setUp(self):
+        self.currency = Currency.objects.create(name="DRFT", symbol="Ɖ")
+        self.user = UserFactory(username="drifter")
+
+    def test_no_primary_account(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.profile.drft_spending_balance(), 0)
+        self.assertFalse(Account.objects.filter(owners=self.user).exists())
+
+    def test_balance(self):
+        account = self.user.profile.primary_drft_account()
+        create_transaction("gift", 6, self.currency.systemaccounts.debit, account)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.user.profile.drft_spending_balance(), 6)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.profile.drft_spending_balance(), 6)
+
+    def test_new_primary_account_is_noticed(self):
+        self.assertIsNone(drft.primary_account_id(self.user))
+        account = self.user.profile.primary_drft_account()
+        self.assertEqual(drft.primary_account_id(self.user), account.id)
+
+    def test_eligible(self):
+        resource = ResourceFactory()
+        CapacityChange.objects.create(
+            resource=resource, start_date=date(4016, 1, 1), quantity=1, accept_drft=True
+        )
+        use = UseFactory(
+            location=resource.location,
+            resource=resource,
+            user=self.user,
+            arrive=date(4016, 1, 10),
+            depart=date(4016, 1, 13),
+        )
+        account = self.user.profile.primary_drft_account()
+        create_transaction("gift", 2, self.currency.systemaccounts.debit, account)
+        self.assertFalse(use.suggest_drft())
+        create_transaction("gift", 1, self.currency.systemaccounts.debit, account)
+        self.assertTrue(use.suggest_drft())
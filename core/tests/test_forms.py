@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-from core.forms import UserProfileForm, create_username
+from core.forms import UserProfileForm, create_username, unique_username
 
 
 class UserProfileFormTest(TestCase):
@@ -48,3 +49,32 @@ class UserProfileFormTest(TestCase):
         )
         form.is_valid()
         self.assertEqual(form.cleaned_data["username"], "joe-bloggs-2")
+
+    def test_unique_username(self):
+        for username in ["joe-bloggs", "Joe-Bloggs-2", "joe-bloggs-4", "joe-bloggsy"]:
+            User.objects.create(username=username)
+        with self.assertNumQueries(1):
+            self.assertEqual(unique_username("Joe", "Bloggs"), "joe-bloggs-3")
+        User.objects.create(username="joe-bloggs-3")
+        self.assertEqual(unique_username("Joe", "Bloggs"), "joe-bloggs-5")
+        self.assertEqual(unique_username("Joe", "Blogg"), "joe-blogg")
+
+
+class AvailabilityTest(TestCase):
+    def setUp(self):
+        User.objects.create(username="joe-bloggs", email="joe@example.com")
+
+    def check(self, name, **data):
+        return self.client.post(
+            reverse(f"{name}_available"),
+            data,
+            headers={"x-requested-with": "XMLHttpRequest"},
+        ).content
+
+    def test_username_available(self):
+        self.assertEqual(self.check("username", username="Joe-Bloggs"), b"false")
+        self.assertEqual(self.check("username", username="joe-bloggs-2"), b"true")
+
+    def test_email_available(self):
+        self.assertEqual(self.check("email", email="JOE@example.com"), b"false")
+        self.assertEqual(self.check("email", email="jo@example.com"), b"true")
@@ -0,0 +1,162 @@
+from datetime import date, datetime
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import guest_analytics
+from core.factory_apps.location import ResourceFactory
+from core.factory_apps.payment import UseFactory
+from core.factory_apps.user import UserFactory
+from core.models import Use
+
+JANUARY = (date(4016, 1, 1), date(4016, 2, 1))
+
+
+class GuestAnalyticsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.resource = ResourceFactory()
+        self.location = self.resource.location
+        self.ada = UserFactory(username="ada")
+        self.bob = UserFactory(username="bob")
+        self.cy = UserFactory(username="cy")
+        self.stay(
+            self.ada, date(4015, 11, 3), date(4015, 11, 5), requested=date(4015, 11, 1)
+        )
+        self.stay(
+            self.ada, date(4016, 1, 10), date(4016, 1, 13), requested=date(4016, 1, 5)
+        )
+        self.stay(
+            self.bob, date(4016, 1, 20), date(4016, 1, 27), requested=date(4015, 12, 1)
+        )
+        self.stay(
+            self.bob, date(4016, 3, 1), date(4016, 3, 3), requested=date(4016, 1, 1)
+        )
+        self.stay(
+            self.cy, date(4016, 1, 2), date(4016, 1, 5), requested=date(4016, 1, 1)
+        )
+        self.stay(self.cy, date(4016, 1, 25), date(4016, 1, 28), status=Use.CANCELED)
+
+    def stay(self, user, arrive, depart, requested=None, status=Use.CONFIRMED):
+        use = UseFactory(
+            user=user,
+            location=self.location,
+            resource=self.resource,
+            arrive=arrive,
+            depart=depart,
+            status=status,
+        )
+        if requested:
+            Use.objects.filter(pk=use.pk).update(
+                created=timezone.make_aware(datetime(*requested.timetuple()[:3], 12))
+            )
+        return use
+
+    def test_repeat_stays(self):
+        report = guest_analytics.repeat_stays(self.location, *JANUARY)
+        self.assertEqual(report["guests"], 3)
+        self.assertEqual(report["repeat_guests"], 1)
+        self.assertEqual(
+            report["distribution"],
+            [{"stays": 1, "guests": 2}, {"stays": 2, "guests": 1}],
+        )
+
+    def test_stay_lengths(self):
+        report = guest_analytics.stay_lengths(self.location, *JANUARY)
+        self.assertEqual(
+            report["histogram"], [{"nights": 3, "stays": 2}, {"nights": 7, "stays": 1}]
+        )
+        self.assertEqual(report["average_nights"], 4.3)
+
+    def test_lead_times(self):
+        report = guest_analytics.lead_times(self.location, *JANUARY)
+        self.assertEqual(
+            [bucket["stays"] for bucket in report["buckets"]], [2, 0, 0, 1, 0]
+        )
+
+    def test_cohorts(self):
+        with self.assertNumQueries(1):
+            report = guest_analytics.cohorts(self.location, *JANUARY)
+        self.assertEqual(
+            report["cohorts"],
+            [
+                {"month": "4015-11", "guests": 1, "returning": 1},
+                # bob only comes back in march
+                {"month": "4016-01", "guests": 2, "returning": 0},
+            ],
+        )
+
+    def test_cohorts_of_a_past_month_stay_put(self):
+        before = guest_analytics.cohorts(self.location, *JANUARY)
+        self.stay(self.cy, date(4016, 4, 1), date(4016, 4, 3))
+        self.assertEqual(guest_analytics.cohorts(self.location, *JANUARY), before)
+        march = guest_analytics.cohorts(
+            self.location, date(4016, 3, 1), date(4016, 4, 1)
+        )
+        self.assertIn(
+            {"month": "4016-01", "guests": 2, "returning": 1}, march["cohorts"]
+        )
+
+    def test_endpoint(self):
+        admin = UserFactory(username="boss")
+        self.location.house_admins.add(admin)
+        url = reverse(
+            "location_guest_analytics",
+            args=[self.location.slug, "stay-lengths", 4016, 1],
+        )
+
+        self.client.force_login(self.ada)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(admin)
+        report = self.client.get(url).json()
+        self.assertEqual(report["month"], "4016-01")
+        self.assertEqual(report["stays"], 3)
+
+    def test_endpoint_rejects_invalid_months(self):
+        admin = UserFactory(username="boss")
+        self.location.house_admins.add(admin)
+        self.client.force_login(admin)
+        for month in ["0", "13", "99"]:
+            with self.subTest(month=month):
+                url = f"/locations/{self.location.slug}/manage/analytics/cohorts/4016/{month}"
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(REPLICA_DATABASE="default")
+    def test_endpoint_over_asgi(self):
+        admin = UserFactory(username="boss")
+        self.location.house_admins.add(admin)
+        url = reverse(
+            "location_guest_analytics",
+            args=[self.location.slug, "stay-lengths", 4016, 1],
+        )
+        self.async_client.force_login(admin)
+        # the report is a read_replica view, so this reads from the "replica"
+        response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response.json()["stays"], 3)
+
+    def test_past_months_are_cached(self):
+        with mock.patch(
+            "django.utils.timezone.localdate", return_value=date(4016, 3, 1)
+        ):
+            self.assertEqual(self.report(*JANUARY)["stays"], 3)
+            # cached for the month until one of the location's uses is saved
+            Use.objects.filter(location=self.location).update(status=Use.CANCELED)
+            self.assertEqual(self.report(*JANUARY)["stays"], 3)
+            self.stay(self.ada, date(4016, 1, 3), date(4016, 1, 4))
+            self.assertEqual(self.report(*JANUARY)["stays"], 1)
+
+    def test_current_month_is_not_cached(self):
+        with mock.patch(
+            "django.utils.timezone.localdate", return_value=date(4016, 1, 15)
+        ):
+            self.assertEqual(self.report(*JANUARY)["stays"], 3)
+            Use.objects.filter(location=self.location).update(status=Use.CANCELED)
+            self.assertEqual(self.report(*JANUARY)["stays"], 0)
+
+    def report(self, start, end):
+        return guest_analytics.monthly_report("stay-lengths", self.location, start, end)
@@ -0,0 +1,62 @@
+import importlib
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from modernomad import gunicorn_conf
+
+
+class GunicornConfTestCase(SimpleTestCase):
+    def load(self, **env):
+        with mock.patch.dict("os.environ", env, clear=True):
+            return importlib.reload(gunicorn_conf)
+
+    def tearDown(self):
+        self.load()
+
+    def test_threaded_by_default(self):
+        conf = self.load(WEB_CONCURRENCY="3", PORT="5000")
+        self.assertEqual(conf.worker_class, "gthread")
+        self.assertEqual((conf.workers, conf.threads), (3, 4))
+        self.assertEqual(conf.bind, "0.0.0.0:5000")
+        self.assertTrue(conf.preload_app)
+        self.assertEqual((conf.max_requests, conf.max_requests_jitter), (1000, 100))
+
+    def test_sync(self):
+        conf = self.load(GUNICORN_WORKER_MODE="sync", GUNICORN_PRELOAD="0")
+        self.assertEqual(conf.worker_class, "sync")
+        self.assertEqual(conf.threads, 1)
+        self.assertFalse(conf.preload_app)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(RuntimeError):
+            self.load(GUNICORN_WORKER_MODE="gevent")
+
+    def cpus(self, **files):
+        # point the cgroup paths at temporary files with the given contents
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {}
+            for name, content in files.items():
+                paths[name] = os.path.join(tmp, name)
+                with open(paths[name], "w") as f:
+                    f.write(content)
+            with (
+                mock.patch.multiple(
+                    gunicorn_conf,
+                    CPU_MAX=paths.get("CPU_MAX", os.path.join(tmp, "none")),
+                    CFS_QUOTA=paths.get("CFS_QUOTA", os.path.join(tmp, "none")),
+                    CFS_PERIOD=paths.get("CFS_PERIOD", os.path.join(tmp, "none")),
+                ),
+                mock.patch("os.sched_getaffinity", return_value=set(range(16))),
+            ):
+                return gunicorn_conf.available_cpus()
+
+    def test_cpus_follow_the_container_quota(self):
+        self.assertEqual(self.cpus(), 16)
+        self.assertEqual(self.cpus(CPU_MAX="max 100000\n"), 16)
+        self.assertEqual(self.cpus(CPU_MAX="150000 100000\n"), 2)
+        self.assertEqual(self.cpus(CPU_MAX="50000 100000\n"), 1)
+        self.assertEqual(self.cpus(CFS_QUOTA="200000\n", CFS_PERIOD="100000\n"), 2)
+        self.assertEqual(self.cpus(CFS_QUOTA="-1\n", CFS_PERIOD="100000\n"), 16)
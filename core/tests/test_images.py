@@ -0,0 +1,92 @@
+import io
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core.factory_apps.user import UserFactory
+from core.images import (
+    record_renditions,
+    rendition_manifest,
+    rendition_url,
+    responsive_srcsets,
+)
+
+MEDIA_ROOT = Path(tempfile.mkdtemp())
+
+
+def _upload(name="avatar.png"):
+    buf = io.BytesIO()
+    Image.new("RGB", (400, 400), "red").save(buf, "PNG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/png")
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    IMAGE_RENDITIONS_MANIFEST=MEDIA_ROOT / "CACHE" / "renditions.json",
+)
+class ImageRenditionsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.profile = UserFactory().profile
+        self.profile.image = _upload()
+        self.profile.save()
+
+    def test_upload_generates_and_records_thumbnail(self):
+        thumb = self.profile.image_thumb
+        self.assertIn(thumb.name, rendition_manifest())
+        self.assertTrue((MEDIA_ROOT / thumb.name).exists())
+        self.assertEqual(rendition_url(self.profile, "image_thumb"), thumb.url)
+
+    def test_falls_back_to_source_until_generated(self):
+        record_renditions([], replace=True)
+        self.assertEqual(
+            rendition_url(self.profile, "image_thumb"), self.profile.image.url
+        )
+
+    def test_no_image(self):
+        profile = UserFactory().profile
+        self.assertIsNone(rendition_url(profile, "image_thumb"))
+
+    def test_warm_image_cache_rebuilds_manifest(self):
+        record_renditions([], replace=True)
+        call_command("warm_image_cache", "--workers", "1", stdout=io.StringIO())
+        self.assertIn(self.profile.image_thumb.name, rendition_manifest())
+
+    def test_responsive_renditions(self):
+        srcsets = responsive_srcsets(self.profile, "image")
+        self.assertEqual(set(srcsets), {"image/webp", "image/jpeg"})
+        self.assertIn(" 150w", srcsets["image/webp"])
+        self.assertTrue(srcsets["image/webp"].split(" ")[0].endswith(".webp"))
+
+        html = Template(
+            '{% load core_tag_extras %}{% responsive_image profile "image" sizes="150px" class="avatar" %}'
+        ).render(Context({"profile": self.profile}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('sizes="150px"', html)
+        self.assertIn('class="avatar"', html)
+        self.assertIn(f'src="{self.profile.image.url}"', html)
+
+    def test_responsive_image_default(self):
+        profile = UserFactory().profile
+        html = Template(
+            '{% load core_tag_extras %}{% responsive_image profile "image" default="avatars/x.jpg" %}'
+        ).render(Context({"profile": profile}))
+        self.assertEqual(html, '<img src="/media/avatars/x.jpg">')
+
+    def test_renditions_are_served_with_long_cache_lifetime(self):
+        thumb = self.profile.image_thumb
+        resp = self.client.get(thumb.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("immutable", resp["Cache-Control"])
+        resp = self.client.get(self.profile.image.url)
+        self.assertNotIn("Cache-Control", resp)
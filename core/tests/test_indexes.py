@@ -0,0 +1,137 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.factory_apps.accounts import USDAccountFactory
+from core.factory_apps.events import EventFactory
+from core.factory_apps.location import (
+    CapacityChangeFactory,
+    LocationFactory,
+    ResourceFactory,
+)
+from core.factory_apps.payment import BillFactory, PaymentFactory, UseFactory
+from core.factory_apps.user import UserFactory
+from core.models import CapacityChange, Payment, Use
+from gather.models import Event
+
+
+def explain(sql):
+    """the query plan of a captured query, as text."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # the test tables are tiny, so postgres would rather scan them
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                cursor.execute("EXPLAIN " + sql)
+            finally:
+                cursor.execute("RESET enable_seqscan")
+        else:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+class IndexUsageTestCase(TestCase):
+    def assertUsesIndex(self, index_names, func, *args, **kwargs):
+        """call func and assert that at least one of the queries it runs is
+        planned with the given index, or one of a tuple of indexes (which one
+        wins is up to the database's planner)."""
+        if isinstance(index_names, str):
+            index_names = (index_names,)
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args, **kwargs)
+            if hasattr(result, "query"):
+                list(result)
+        plans = [
+            explain(query["sql"])
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        if not any(name in plan for name in index_names for plan in plans):
+            self.fail(
+                f"{', '.join(index_names)} not used by any of:\n\n" + "\n\n".join(plans)
+            )
+
+
+class HotQueryIndexTestCase(IndexUsageTestCase):
+    def setUp(self):
+        self.location = LocationFactory()
+        self.resource = ResourceFactory(location=self.location)
+        self.today = datetime.date(2024, 6, 1)
+        for status in (Use.CONFIRMED, Use.PENDING):
+            UseFactory(
+                location=self.location,
+                resource=self.resource,
+                user=UserFactory(),
+                status=status,
+                arrive=self.today,
+                depart=self.today + datetime.timedelta(days=2),
+            )
+
+    def test_use_on_date(self):
+        self.assertUsesIndex(
+            "use_location_status_dates",
+            Use.objects.on_date,
+            self.today,
+            Use.CONFIRMED,
+            self.location,
+        )
+
+    def test_confirmed_approved_for_resource(self):
+        self.assertUsesIndex(
+            "use_resource_status_arrive",
+            Use.objects.confirmed_approved_on_date,
+            self.today,
+            self.location,
+            resource=self.resource,
+        )
+
+    def test_coming_month_uses(self):
+        self.assertUsesIndex(
+            ("use_active_location_dates", "use_location_status_dates"),
+            self.location.coming_month_uses,
+        )
+
+    def test_latest_capacity_change(self):
+        CapacityChangeFactory(resource=self.resource, start_date=self.today)
+        self.assertUsesIndex(
+            "capacity_resource_start",
+            CapacityChange.objects.quantity_on,
+            self.today,
+            self.resource,
+        )
+
+    def test_payments(self):
+        bill = BillFactory()
+        payment = PaymentFactory(bill=bill, transaction_id="ch_1")
+        self.assertUsesIndex("payment_transaction_id", payment.net_paid)
+        self.assertUsesIndex("payment_transaction_id", payment.refund_payments)
+        self.assertUsesIndex(
+            "payment_bill_date",
+            Payment.objects.filter(bill=bill).order_by("payment_date").all,
+        )
+
+    def test_public_events(self):
+        EventFactory(location=self.location, admin=self.location.event_admin_group)
+        now = timezone.now()
+        self.assertUsesIndex(
+            ("event_public_location_start", "event_location_status_start"),
+            Event.objects.filter(
+                location=self.location,
+                status=Event.LIVE,
+                visibility=Event.PUBLIC,
+                start__gte=now,
+            ).all,
+        )
+        self.assertUsesIndex(
+            "event_location_status_start",
+            Event.objects.filter(
+                location=self.location, status=Event.PENDING, start__gte=now
+            ).all,
+        )
+
+    def test_account_balance(self):
+        account = USDAccountFactory()
+        self.assertUsesIndex("entry_account_valid", account.get_balance)
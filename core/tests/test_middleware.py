@@ -0,0 +1,139 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.decorators import query_budget
+from core.factories import LocationFactory
+from core.middleware import (
+    LocationMiddleware,
+    QueryBudgetExceeded,
+    QueryInstrumentationMiddleware,
+    query_fingerprint,
+)
+from core.models import Location
+from core.shortcuts import get_request_location
+
+
+class LocationMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.location = LocationFactory()
+        self.middleware = LocationMiddleware(lambda request: None)
+        self.request = RequestFactory().get(f"/locations/{self.location.slug}/")
+        self.middleware(self.request)
+
+    def test_resolves_location_from_url_kwargs(self):
+        self.middleware.process_view(
+            self.request, None, (), {"location_slug": self.location.slug}
+        )
+        self.assertEqual(self.request.location, self.location)
+        with self.assertNumQueries(0):
+            location = get_request_location(self.request, self.location.slug)
+        self.assertIs(location, self.request.location)
+
+    def test_views_without_location(self):
+        self.middleware.process_view(self.request, None, (), {})
+        self.assertIsNone(self.request.location)
+
+    def test_unknown_location(self):
+        self.middleware.process_view(
+            self.request, None, (), {"location_slug": "nowhere"}
+        )
+        self.assertIsNone(self.request.location)
+
+    def test_community_page(self):
+        resp = self.client.get(f"/locations/{self.location.slug}/community/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["location"], self.location)
+        self.assertEqual(resp.wsgi_request.location, self.location)
+
+    def test_edits_save_a_fresh_location(self):
+        admin = User.objects.create_user("boss")
+        self.location.house_admins.set([admin])
+        get_request_location(None, self.location.slug)
+        # another worker renames the location without clearing this cache
+        Location.objects.filter(pk=self.location.pk).update(name="Renamed")
+        User.objects.create_user("ada")
+
+        self.client.force_login(admin)
+        resp = self.client.post(
+            reverse("location_edit_users", args=[self.location.slug]),
+            {"admin_username": "ada", "action": "Add"},
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.name, "Renamed")
+        self.assertIn(
+            "ada", self.location.house_admins.values_list("username", flat=True)
+        )
+
+
+class QueryInstrumentationMiddlewareTestCase(TestCase):
+    def request(self, view, queries):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request, queries)
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        request = RequestFactory().get("/somewhere/")
+        request.user = AnonymousUser()
+        return middleware(request)
+
+    @staticmethod
+    def view(request, queries):
+        for i in range(queries):
+            User.objects.filter(pk=i).exists()
+        return HttpResponse()
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            query_fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s,\n %s)"),
+            "SELECT 1 FROM t WHERE id IN (...)",
+        )
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_header(self):
+        response = self.request(self.view, 3)
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+
+    def test_no_server_timing_for_anonymous_users(self):
+        response = self.request(self.view, 3)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_repeated_queries_are_logged(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            self.request(self.view, 12)
+        self.assertIn('"count": 12', logs.output[0])
+
+    def test_query_budget(self):
+        @query_budget(5)
+        def budgeted(request, queries):
+            return self.view(request, queries)
+
+        self.request(budgeted, 5)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.request(budgeted, 6)
+
+    @override_settings(DEBUG=True)
+    def test_async_requests(self):
+        @query_budget(5)
+        async def budgeted(request, queries):
+            # the ORM runs in the request's sync thread, as in an async view
+            return await sync_to_async(self.view)(request, queries)
+
+        async def get_response(request):
+            middleware.process_view(request, budgeted, (), {})
+            return await budgeted(request, request.queries)
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        request = RequestFactory().get("/somewhere/")
+        request.queries = 3
+        response = async_to_sync(middleware)(request)
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        request.queries = 6
+        with self.assertRaises(QueryBudgetExceeded):
+            async_to_sync(middleware)(request)
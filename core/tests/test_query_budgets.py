@@ -0,0 +1,319 @@
+"""Query budgets for the busiest pages and API endpoints.
+
+The data set is seeded with the factories in core/factory_apps: two locations,
+the second with twice as many rooms, stays and events as the first, and both
+growing with QUERY_BUDGET_SCALE (default 1, which keeps the normal test run
+quick). Every endpoint is requested QUERY_BUDGET_ROUNDS times per location:
+the first request starts from an empty cache, the others are warm. The warm
+requests must stay within the view's core.decorators.query_budget, which
+QueryInstrumentationMiddleware enforces under test, and must make as many
+queries for the bigger location as for the smaller one, so that a query per
+row fails here rather than in production. To run only this suite against a
+bigger data set and keep the numbers, e.g. to compare two branches:
+
+    QUERY_BUDGET_SCALE=10 QUERY_BUDGET_REPORT=budgets.json \\
+        ./manage.py test --tag query_budget
+
+Latency depends on the machine and the load on it, so it is only checked at
+the default scale with QUERY_BUDGET_TIMINGS=1, against the warm requests, and
+the time budgets can be scaled with QUERY_BUDGET_TIME_FACTOR.
+"""
+
+import datetime
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.factory_apps import factory
+from core.factory_apps.events import EventFactory, EventSeriesFactory
+from core.factory_apps.location import LocationFactory, ResourceFactory
+from core.factory_apps.payment import (
+    BookingBillFactory,
+    BookingFactory,
+    PaymentFactory,
+    UseFactory,
+)
+from core.factory_apps.user import SuperUserFactory, UserFactory
+from core.models import Use
+from gather.models import Event
+
+SCALE = int(os.environ.get("QUERY_BUDGET_SCALE", "1"))
+ROUNDS = int(os.environ.get("QUERY_BUDGET_ROUNDS", "3"))
+TIMINGS = os.environ.get("QUERY_BUDGET_TIMINGS") == "1"
+TIME_FACTOR = float(os.environ.get("QUERY_BUDGET_TIME_FACTOR", "1"))
+REPORT = os.environ.get("QUERY_BUDGET_REPORT")
+
+# the size of each location's data, in units of rooms, stays and events
+LOCATION_SIZES = (SCALE, 2 * SCALE)
+ROOMS_PER_UNIT = 2
+USES_PER_ROOM = 6
+EVENTS_PER_UNIT = 6
+GUESTS = 10 * SCALE
+
+GRAPHQL_QUERIES = {
+    "graphql_locations": """
+        { allLocations { edges { node { name slug
+            fees { description }
+            resources(hasFutureCapacity: true) { rid name }
+        } } } }
+    """,
+    "graphql_resources": """
+        { allResources { edges { node { rid name
+            hasFutureDrftCapacity
+            backing { id }
+        } } } }
+    """,
+    "graphql_my_occupancies": """
+        { myOccupancies { edges { node { arrive depart type
+            upcomingEventsDuring { title url }
+        } } } }
+    """,
+}
+
+# max p95 milliseconds per endpoint at the default scale, for warm requests,
+# checked with QUERY_BUDGET_TIMINGS=1. the query budgets live on the views.
+TIME_BUDGETS_MS = {
+    "calendar": 1500,
+    "occupancy": 1500,
+    "payments": 4000,
+    "stay": 250,
+    "room_api_list": 250,
+    "booking_manage_list": 500,
+    "upcoming_events": 1500,
+    "graphql_locations": 250,
+    "graphql_resources": 250,
+    "graphql_my_occupancies": 250,
+}
+
+
+def percentile(samples, pct):
+    """nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+@tag("query_budget")
+class QueryBudgetTestCase(TestCase):
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        # the same data on every run, so that reports can be compared
+        factory.random.reseed_random(0)
+        # the admin of every location also books rooms, for myOccupancies
+        guests = [SuperUserFactory()] + [UserFactory() for _ in range(GUESTS)]
+
+        today = timezone.localdate()
+        cls.month_start = today.replace(day=1)
+        cls.locations = []
+        for i, size in enumerate(LOCATION_SIZES):
+            location = LocationFactory(slug=f"budget-{i}", name=f"Budget House {i}")
+            cls.locations.append(location)
+            for r in range(1 + ROOMS_PER_UNIT * size):
+                room = ResourceFactory(location=location)
+                for u in range(USES_PER_ROOM):
+                    guest = guests[(i + r + u) % len(guests)]
+                    arrive = cls.month_start + datetime.timedelta(
+                        days=(r * 5 + u * 3) % 28
+                    )
+                    use = UseFactory(
+                        location=location,
+                        resource=room,
+                        user=guest,
+                        status=(Use.CONFIRMED, Use.APPROVED, Use.PENDING)[u % 3],
+                        arrive=arrive,
+                        depart=arrive + datetime.timedelta(days=1 + u % 5),
+                    )
+                    booking = BookingFactory(use=use, bill=BookingBillFactory())
+                    booking.generate_bill()
+                    if u % 2 == 0:
+                        PaymentFactory(
+                            bill=booking.bill,
+                            user=guest,
+                            payment_date=timezone.now(),
+                        )
+
+            # LocationFactory has already created the admin group
+            admin_group = location.event_admin_group
+            series = EventSeriesFactory()
+            for e in range(EVENTS_PER_UNIT * size):
+                start = timezone.now() + datetime.timedelta(days=1 + e)
+                event = EventFactory(
+                    location=location,
+                    admin=admin_group,
+                    series=series,
+                    slug=f"budget-{i}-{e}",
+                    creator=guests[e % len(guests)],
+                    start=start,
+                    end=start + datetime.timedelta(hours=2),
+                )
+                # the post_save signal resets the status of new events
+                Event.objects.filter(pk=event.pk).update(
+                    status=Event.LIVE, visibility=Event.PUBLIC
+                )
+
+        # every factory call resets the admin's password, which would log out
+        # a session made from an older copy
+        cls.admin = User.objects.get(username="admin")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if REPORT:
+            report = {
+                "scale": SCALE,
+                "rounds": ROUNDS,
+                "data": [
+                    {
+                        "rooms": 1 + ROOMS_PER_UNIT * size,
+                        "uses": (1 + ROOMS_PER_UNIT * size) * USES_PER_ROOM,
+                        "events": EVENTS_PER_UNIT * size,
+                    }
+                    for size in LOCATION_SIZES
+                ],
+                "endpoints": cls.results,
+            }
+            with open(REPORT, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def rounds(self, name, request):
+        """make the request ROUNDS times, the first with an empty cache, and
+        return the query counts, the timings of the warm requests and the
+        view's query budget. over budget, a warm request raises
+        QueryBudgetExceeded from the middleware."""
+        cache.clear()
+        queries = []
+        timings = []
+        for round_ in range(ROUNDS):
+            with (
+                override_settings(QUERY_BUDGETS_STRICT=round_ > 0),
+                CaptureQueriesContext(connection) as captured,
+            ):
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, 200, name)
+            queries.append(len(captured))
+        view = response.resolver_match.func
+        budget = getattr(
+            view,
+            "query_budget",
+            getattr(getattr(view, "view_class", None), "query_budget", None),
+        )
+        self.assertIsNotNone(budget, f"{name} has no query budget")
+        return queries, timings[1:] or timings, budget
+
+    def measure(self, name, request, per_location=True):
+        """request(location) for each location, or request(None) once, and
+        check the query counts and, if asked for, the timings."""
+        warm = []
+        for location in self.locations if per_location else [None]:
+            queries, timings, budget = self.rounds(
+                name, lambda location=location: request(location)
+            )
+            warm.append(queries[-1])
+
+        max_p95_ms = TIME_BUDGETS_MS[name] * TIME_FACTOR
+        self.results[name] = {
+            "queries_cold": queries[0],
+            "queries_warm": warm,
+            "p50_ms": round(percentile(timings, 50), 1),
+            "p95_ms": round(percentile(timings, 95), 1),
+            "max_queries": budget,
+            "max_p95_ms": max_p95_ms,
+        }
+        self.assertEqual(
+            len(set(warm)), 1, f"{name} makes more queries for more data: {warm}"
+        )
+        if SCALE == 1 and TIMINGS:
+            self.assertLessEqual(
+                percentile(timings, 95), max_p95_ms, f"{name} took {timings} ms"
+            )
+
+    def month_params(self):
+        return {"month": self.month_start.month, "year": self.month_start.year}
+
+    def test_calendar(self):
+        self.measure(
+            "calendar",
+            lambda location: self.client.get(
+                reverse("location_calendar", args=[location.slug]),
+                self.month_params(),
+            ),
+        )
+
+    def test_occupancy(self):
+        self.measure(
+            "occupancy",
+            lambda location: self.client.get(
+                reverse("location_occupancy", args=[location.slug]),
+                self.month_params(),
+            ),
+        )
+
+    def test_payments(self):
+        self.measure(
+            "payments",
+            lambda location: self.client.get(
+                reverse(
+                    "location_payments",
+                    args=[location.slug, self.month_start.year, self.month_start.month],
+                )
+            ),
+        )
+
+    def test_stay(self):
+        self.measure(
+            "stay",
+            lambda location: self.client.get(
+                reverse("location_stay", args=[location.slug])
+            ),
+        )
+
+    def test_room_api_list(self):
+        self.measure(
+            "room_api_list",
+            lambda location: self.client.get(
+                reverse("json_room_list", args=[location.slug])
+            ),
+        )
+
+    def test_booking_manage_list(self):
+        self.measure(
+            "booking_manage_list",
+            lambda location: self.client.get(
+                reverse("booking_manage_list", args=[location.slug])
+            ),
+        )
+
+    def test_upcoming_events(self):
+        self.measure(
+            "upcoming_events",
+            lambda location: self.client.get(
+                reverse("gather_upcoming_events", args=[location.slug])
+            ),
+        )
+
+    def test_graphql(self):
+        # these cover every location at once
+        for name, query in GRAPHQL_QUERIES.items():
+            with self.subTest(name):
+                self.measure(
+                    name,
+                    lambda location, query=query: self.client.post(
+                        "/graphql", {"query": query}, content_type="application/json"
+                    ),
+                    per_location=False,
+                )
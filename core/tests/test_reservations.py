@@ -0,0 +1,140 @@
+from datetime import date
+from unittest import mock
+
+import stripe
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from core.factory_apps.location import ResourceFactory
+from core.factory_apps.payment import BookingBillFactory, BookingFactory, UseFactory
+from core.factory_apps.user import SuperUserFactory
+from core.models import CapacityChange, Use
+from core.reservations import Unavailable, reserve
+
+
+class ReserveTestCase(TestCase):
+    def setUp(self):
+        self.resource = ResourceFactory()
+        CapacityChange.objects.create(
+            resource=self.resource, start_date=date(4016, 1, 1), quantity=1
+        )
+
+    def create_use(self, arrive, depart, status=Use.PENDING):
+        return UseFactory(
+            location=self.resource.location,
+            resource=self.resource,
+            arrive=arrive,
+            depart=depart,
+            status=status,
+        )
+
+    def test_last_bed(self):
+        first = self.create_use(date(4016, 1, 10), date(4016, 1, 13))
+        second = self.create_use(date(4016, 1, 12), date(4016, 1, 14))
+        reserve(first)
+        with self.assertRaises(Unavailable) as raised:
+            reserve(second, Use.APPROVED)
+        self.assertEqual(raised.exception.nights, [date(4016, 1, 12)])
+        second.refresh_from_db()
+        self.assertEqual(second.status, Use.PENDING)
+
+    def test_back_to_back_stays(self):
+        reserve(self.create_use(date(4016, 1, 10), date(4016, 1, 13)))
+        following = self.create_use(date(4016, 1, 13), date(4016, 1, 15))
+        reserve(following)
+        self.assertEqual(following.status, Use.CONFIRMED)
+
+    def test_confirming_an_approved_use(self):
+        use = self.create_use(date(4016, 1, 10), date(4016, 1, 13))
+        reserve(use, Use.APPROVED)
+        reserve(use)
+        self.assertEqual(Use.objects.get(pk=use.pk).status, Use.CONFIRMED)
+
+    def test_no_capacity(self):
+        CapacityChange.objects.create(
+            resource=self.resource, start_date=date(4015, 12, 1), quantity=0
+        )
+        use = self.create_use(date(4015, 12, 30), date(4016, 1, 2))
+        with self.assertRaises(Unavailable) as raised:
+            reserve(use)
+        self.assertEqual(
+            raised.exception.nights, [date(4015, 12, 30), date(4015, 12, 31)]
+        )
+
+    def test_manage_action(self):
+        SuperUserFactory()
+        location = self.resource.location
+        location.house_admins.add(User.objects.get(username="admin"))
+        self.client.force_login(User.objects.get(username="admin"))
+        self.create_use(date(4016, 1, 10), date(4016, 1, 13), status=Use.CONFIRMED)
+        booking = BookingFactory(
+            use=self.create_use(date(4016, 1, 11), date(4016, 1, 12)),
+            bill=BookingBillFactory(),
+        )
+
+        response = self.client.post(
+            reverse("booking_manage_action", args=[location.slug, booking.id]),
+            {"booking-action": "set-confirm"},
+        )
+        self.assertEqual(response.status_code, 200)
+        booking.use.refresh_from_db()
+        self.assertEqual(booking.use.status, Use.PENDING)
+
+    def approved_booking(self):
+        booking = BookingFactory(
+            use=self.create_use(date(4016, 1, 11), date(4016, 1, 12)),
+            bill=BookingBillFactory(),
+        )
+        reserve(booking.use, Use.APPROVED)
+        return booking
+
+    @mock.patch(
+        "core.payment_gateway.charge_booking",
+        side_effect=stripe.APIConnectionError("stripe is down"),
+    )
+    def test_failed_charge_releases_the_room(self, charge_booking):
+        booking = self.approved_booking()
+        guest = booking.use.user
+        guest.profile.stripe_customer_id = "cus_1"
+        guest.profile.save()
+        self.client.force_login(guest)
+
+        with self.assertRaises(stripe.APIConnectionError):
+            self.client.post(
+                reverse("booking_confirm", args=[booking.use.location.slug, booking.id])
+            )
+        booking.use.refresh_from_db()
+        self.assertEqual(booking.use.status, Use.APPROVED)
+
+        admin = SuperUserFactory()
+        booking.use.location.house_admins.add(admin)
+        self.client.force_login(admin)
+        with self.assertRaises(stripe.APIConnectionError):
+            self.client.post(
+                reverse(
+                    "booking_manage_action",
+                    args=[booking.use.location.slug, booking.id],
+                ),
+                {"booking-action": "res-charge-card"},
+            )
+        booking.use.refresh_from_db()
+        self.assertEqual(booking.use.status, Use.APPROVED)
+
+    @mock.patch(
+        "core.payment_gateway.charge_booking",
+        side_effect=stripe.CardError("declined", None, "card_declined"),
+    )
+    def test_declined_card_keeps_previous_status(self, charge_booking):
+        booking = self.approved_booking()
+        guest = booking.use.user
+        guest.profile.stripe_customer_id = "cus_1"
+        guest.profile.save()
+        self.client.force_login(guest)
+
+        response = self.client.post(
+            reverse("booking_confirm", args=[booking.use.location.slug, booking.id])
+        )
+        self.assertEqual(response.status_code, 302)
+        booking.use.refresh_from_db()
+        self.assertEqual(booking.use.status, Use.APPROVED)
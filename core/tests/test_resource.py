@@ -3,7 +3,7 @@ from datetime import date
 from django.test import TestCase
 
 from core.factories import ResourceFactory, UserFactory
-from core.models import CapacityChange, Use
+from core.models import CapacityChange, Resource, Use, prefetch_availabilities
 
 
 class ResourceDailyAvailabilitiesBetweenTestCase(TestCase):
@@ -150,3 +150,75 @@ class ResourceDailyAvailabilitiesBetweenTestCase(TestCase):
                 (date(2016, 1, 14), 10),
             ],
         )
+
+
+class ResourceBulkAvailabilityTestCase(TestCase):
+    """the prefetched, whole-period lookups agree with the day by day ones."""
+
+    def setUp(self):
+        self.resource = ResourceFactory()
+        self.location = self.resource.location
+        self.start = date(2016, 1, 10)
+        self.end = date(2016, 1, 20)
+        booker = UserFactory()
+        for start_date, quantity in [
+            (date(2016, 1, 1), 2),
+            (date(2016, 1, 13), 0),
+            (date(2016, 1, 15), 1),
+        ]:
+            CapacityChange.objects.create(
+                resource=self.resource, start_date=start_date, quantity=quantity
+            )
+        for arrive, depart in [
+            (date(2016, 1, 9), date(2016, 1, 12)),
+            (date(2016, 1, 11), date(2016, 1, 12)),
+            (date(2016, 1, 16), date(2016, 1, 17)),
+        ]:
+            Use.objects.create(
+                resource=self.resource,
+                location=self.location,
+                arrive=arrive,
+                depart=depart,
+                status="confirmed",
+                user=booker,
+            )
+
+    def nights(self, arrive, depart):
+        return [date(2016, 1, day) for day in range(arrive.day, depart.day)]
+
+    def test_quantity_between(self):
+        self.assertEqual(
+            self.resource.quantity_between(self.start, self.end),
+            sum(
+                self.resource.capacity_on(day)
+                for day in self.nights(self.start, self.end)
+            ),
+        )
+
+    def test_rooms_free(self):
+        for arrive, depart in [
+            (date(2016, 1, 10), date(2016, 1, 11)),
+            (date(2016, 1, 11), date(2016, 1, 12)),
+            (date(2016, 1, 12), date(2016, 1, 13)),
+            (date(2016, 1, 12), date(2016, 1, 14)),
+            (date(2016, 1, 15), date(2016, 1, 16)),
+            (date(2016, 1, 16), date(2016, 1, 17)),
+        ]:
+            with self.subTest(arrive=arrive, depart=depart):
+                free = all(
+                    self.resource.available_on(day)
+                    for day in self.nights(arrive, depart)
+                )
+                self.assertEqual(
+                    self.resource in self.location.rooms_free(arrive, depart), free
+                )
+
+    def test_prefetched_availabilities(self):
+        expected = self.resource.daily_availabilities_within(self.start, self.end)
+        resource = Resource.objects.get(pk=self.resource.pk)
+        prefetch_availabilities([resource], self.start, self.end)
+        with self.assertNumQueries(0):
+            result = resource.daily_availabilities_within(
+                self.start, self.end, uses=resource.confirmed_uses
+            )
+        self.assertEqual(result, expected)
@@ -0,0 +1,96 @@
+import csv
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from bank.models import Account, Currency, Entry, Transaction
+from bank.statements import statement_page
+from bank.views import create_transaction
+from core.factory_apps.user import UserFactory
+
+
+class StatementTestCase(TestCase):
+    def setUp(self):
+        self.owner = UserFactory(username="saver")
+        self.currency = Currency.objects.create(name="DRFT", symbol="Ɖ")
+        self.source = self.currency.systemaccounts.debit
+        self.account = Account.objects.create(
+            currency=self.currency, name="Savings", type=Account.CREDIT
+        )
+        self.account.owners.add(self.owner)
+        # deposits of 1..7 on consecutive days
+        start = timezone.now() - timedelta(days=10)
+        for amount in range(1, 8):
+            create_transaction(f"deposit {amount}", amount, self.source, self.account)
+            Transaction.objects.filter(reason=f"deposit {amount}").update(
+                date=start + timedelta(days=amount)
+            )
+
+    def test_running_balances_across_pages(self):
+        with self.assertNumQueries(2):
+            entries, cursor = statement_page(self.account, size=3)
+        self.assertEqual([e.amount for e in entries], [7, 6, 5])
+        self.assertEqual([e.balance for e in entries], [28, 21, 15])
+        self.assertEqual(entries[0].counterparty_id, self.source.id)
+
+        with self.assertNumQueries(1):
+            entries, cursor = statement_page(self.account, cursor, size=3)
+        self.assertEqual([e.balance for e in entries], [10, 6, 3])
+
+        entries, cursor = statement_page(self.account, cursor, size=3)
+        self.assertEqual([e.balance for e in entries], [1])
+        self.assertIsNone(cursor)
+
+    def test_invalid_entries_leave_the_balance_alone(self):
+        transaction = Transaction.objects.create(reason="half done")
+        Entry.objects.create(account=self.account, amount=100, transaction=transaction)
+        entries, cursor = statement_page(self.account)
+        self.assertFalse(entries[0].valid)
+        self.assertEqual(entries[0].balance, 28)
+        self.assertEqual(entries[1].balance, 28)
+
+    def test_forged_cursor(self):
+        with self.assertRaises(ValueError):
+            statement_page(self.account, "2016-01-01,1,1000000")
+
+    def test_detail_page(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("account_detail", args=[self.account.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["entries"]), 7)
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_detail_page_needs_an_owner(self):
+        self.client.force_login(UserFactory(username="stranger"))
+        response = self.client.get(reverse("account_detail", args=[self.account.id]))
+        self.assertRedirects(response, "/404", fetch_redirect_response=False)
+
+    def test_csv_export(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            reverse("account_statement_csv", args=[self.account.id])
+        )
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(rows[0][0], "Date")
+        self.assertEqual(
+            [row[4] for row in rows[1:]], ["1", "3", "6", "10", "15", "21", "28"]
+        )
+        self.assertEqual(rows[1][2], self.source.name)
+
+    def test_account_list_balances(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as one_account:
+            self.client.get(reverse("account_list"))
+        for name in ["Spending", "Travel"]:
+            account = Account.objects.create(currency=self.currency, name=name)
+            account.owners.add(self.owner)
+        with self.assertNumQueries(len(one_account)):
+            response = self.client.get(reverse("account_list"))
+        balances = {a.name: a.balance for a in response.context["accounts"]}
+        self.assertEqual(balances, {"Savings": 28, "Spending": 0, "Travel": 0})
@@ -0,0 +1,80 @@
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import user_analytics
+from core.factory_apps.location import LocationFactory
+from core.factory_apps.payment import UseFactory
+from core.factory_apps.user import UserFactory
+from core.models import Use, UserProfile
+
+
+class UserAnalyticsTestCase(TestCase):
+    def setUp(self):
+        self.ada = UserFactory(username="ada", email="ada@example.com")
+        self.ada2 = UserFactory(username="ada-2", email="Ada@Example.com")
+        self.bob = UserFactory(username="bob", email="bob@example.com")
+
+    def test_duplicate_emails(self):
+        UserFactory(username="old", email="bob@example.com", is_active=False)
+        with self.assertNumQueries(1):
+            duplicates = list(user_analytics.duplicate_emails())
+        self.assertEqual(duplicates, [{"address": "ada@example.com", "count": 2}])
+
+    def test_username_and_email_problems(self):
+        self.assertEqual(list(user_analytics.nonalphanumeric_usernames()), [self.ada2])
+        self.assertEqual(list(user_analytics.capitalized_emails()), [self.ada2])
+
+    def test_stays(self):
+        location = LocationFactory()
+        for user, arrive, depart, status in [
+            (self.ada, date(4016, 1, 1), date(4016, 1, 3), Use.CONFIRMED),
+            (self.ada, date(4016, 2, 1), date(4016, 2, 3), Use.CONFIRMED),
+            (self.bob, date(4016, 1, 1), date(4016, 1, 15), Use.CANCELED),
+            (self.bob, date(4016, 2, 1), date(4016, 2, 3), Use.CONFIRMED),
+        ]:
+            UseFactory(
+                user=user,
+                location=location,
+                arrive=arrive,
+                depart=depart,
+                status=status,
+            )
+        ours = [self.ada.id, self.bob.id]
+        self.assertEqual(
+            list(user_analytics.people_with_stays_longer_than(14).filter(id__in=ours)),
+            [self.bob],
+        )
+        self.assertEqual(list(user_analytics.repeat_guests(2, location)), [self.ada])
+        self.assertEqual(list(user_analytics.repeat_guests(2, LocationFactory())), [])
+
+    def test_set_all_users(self):
+        out = StringIO()
+        with self.assertNumQueries(8):
+            call_command(
+                "set_all_users",
+                "dev@example.com",
+                "secret",
+                "cus_123",
+                "--batch-size",
+                "2",
+                stdout=out,
+            )
+        users = User.objects.count()
+        self.assertIn(f"Changed {users} users.", out.getvalue())
+        self.assertEqual(User.objects.exclude(email="dev@example.com").count(), 0)
+        self.assertTrue(User.objects.get(username="bob").check_password("secret"))
+        self.assertEqual(
+            UserProfile.objects.exclude(stripe_customer_id="cus_123").count(), 0
+        )
+
+    def test_check_users(self):
+        out = StringIO()
+        call_command("check_users", stdout=out)
+        report = out.getvalue()
+        self.assertIn("ada@example.com: Duplicate email", report)
+        self.assertIn("ada-2: capitalized email", report)
+        self.assertIn("1 duplicate email problems", report)
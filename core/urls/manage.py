@@ -10,7 +10,14 @@ urlpatterns = [
         billing.payments,
         name="location_payments",
     ),
+    re_path(r"^aging/$", billing.aging_report, name="location_aging_report"),
     re_path(r"^today/$", occupancy.manage_today, name="manage_today"),
+    re_path(
+        r"^analytics/(?P<report>repeat-stays|stay-lengths|lead-times|cohorts)/"
+        r"(?P<year>\d{4})/(?P<month>0?[1-9]|1[0-2])$",
+        occupancy.guest_analytics_report,
+        name="location_guest_analytics",
+    ),
     re_path(
         r"bookings/$", booking_management.BookingManageList, name="booking_manage_list"
     ),
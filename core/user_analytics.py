@@ -0,0 +1,121 @@
+"""Questions about the whole user table, answered in SQL.
+
+These back the check_users and set_all_users commands and the helpers in
+core/util.py. Each one is a single GROUP BY/HAVING or filtered query rather
+than a query per user, so they take the same handful of queries for a
+hundred users as for a few hundred thousand. Bulk changes go through
+in_batches() so that no single UPDATE holds locks on the whole table.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import Lower
+
+from core.models import Use, UserProfile
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def in_batches(queryset, batch_size=BATCH_SIZE):
+    """the primary keys of queryset in lists of at most batch_size, walking
+    the primary key index rather than using offsets."""
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def duplicate_emails(users=None):
+    """email addresses (lowercased) shared by more than one of users, with
+    how many share each, most shared first."""
+    users = User.objects.filter(is_active=True) if users is None else users
+    return (
+        users.exclude(email="")
+        .annotate(address=Lower("email"))
+        .values("address")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .order_by("-count", "address")
+    )
+
+
+def users_with_email(addresses, users=None):
+    """users whose email is one of addresses, ignoring case."""
+    users = User.objects.filter(is_active=True) if users is None else users
+    return (
+        users.annotate(address=Lower("email"))
+        .filter(address__in=list(addresses))
+        .order_by("address", "id")
+    )
+
+
+def nonalphanumeric_usernames(users=None):
+    users = User.objects.filter(is_active=True) if users is None else users
+    return users.exclude(username__regex=r"^\w+$").order_by("id")
+
+
+def capitalized_emails(users=None):
+    users = User.objects.filter(is_active=True) if users is None else users
+    return users.exclude(email=Lower("email")).order_by("id")
+
+
+def people_with_stays_longer_than(min_nights):
+    """users with at least one stay of min_nights or more."""
+    long_stays = (
+        Use.objects.annotate(
+            length=ExpressionWrapper(
+                F("depart") - F("arrive"), output_field=DurationField()
+            )
+        )
+        .filter(length__gte=timedelta(days=min_nights))
+        .values("user")
+    )
+    return User.objects.filter(id__in=long_stays).order_by("id")
+
+
+def repeat_guests(num_stays, location=None):
+    """users with at least num_stays confirmed stays, at location if given."""
+    confirmed = Q(uses__status=Use.CONFIRMED)
+    if location:
+        confirmed &= Q(uses__location=location)
+    return (
+        User.objects.annotate(stays=Count("uses", filter=confirmed))
+        .filter(stays__gte=num_stays)
+        .order_by("id")
+    )
+
+
+def set_all_users(
+    email, password=None, customer_id=None, batch_size=BATCH_SIZE, progress=None
+):
+    """give every user the same email, and optionally password and stripe
+    customer id, batch_size users per UPDATE. progress, if given, is called
+    with the number of users done so far after each batch. returns how many
+    users were changed."""
+    changes = {"email": email}
+    if password:
+        # one hash for everybody; hashing per user is what made this slow
+        changes["password"] = make_password(password)
+    done = 0
+    for pks in in_batches(User.objects.all(), batch_size):
+        User.objects.filter(pk__in=pks).update(**changes)
+        if customer_id:
+            UserProfile.objects.filter(user__in=pks).update(
+                stripe_customer_id=customer_id
+            )
+        done += len(pks)
+        if progress:
+            progress(done)
+    return done
@@ -1,8 +1,6 @@
 import logging
 
-from django.contrib.auth.models import User
-
-from core.models import Booking
+from core import user_analytics
 from core.views.occupancy import monthly_occupant_report
 
 logger = logging.getLogger(__name__)
@@ -37,26 +35,8 @@ def monthly_occupant_report_console(location_slug, year, month):
 
 
 def people_with_bookings_longer_than(min_length):
-    # JKS this should probably be a manager method Booking.objects.length(...)
-    users = []
-    bookings = Booking.objects.all()
-    for r in bookings:
-        length = r.nights_between(r.arrive, r.depart)
-        if length >= min_length:
-            users.append(r.user)
-    # make sure the returned list has only unique users
-    return list(set(users))
+    return list(user_analytics.people_with_stays_longer_than(min_length))
 
 
 def repeat_guests(num_stays, location=None):
-    users = []
-    all_users = User.objects.all()
-    for u in all_users:
-        if location:
-            at_loc = u.bookings.filter(location=location).filter(status="confirmed")
-            if len(at_loc) >= num_stays:
-                users.append(u)
-        else:
-            if u.bookings.filter(status="confirmed").count() >= num_stays:
-                users.append(u)
-    return users
+    return list(user_analytics.repeat_guests(num_stays, location))
@@ -1,7 +1,6 @@
 import contextlib
 import datetime
 import logging
-import time
 from decimal import Decimal
 
 import stripe
@@ -9,16 +8,23 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.paginator import Paginator
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from stripe.error import CardError
 
 from core import payment_gateway
-from core.decorators import house_admin_required, resident_or_admin_required
+from core.decorators import (
+    async_login_required,
+    house_admin_required,
+    query_budget,
+    read_replica,
+    resident_or_admin_required,
+)
 from core.emails.messages import (
     send_booking_receipt,
     send_from_location_address,
@@ -28,10 +34,10 @@ from core.models import (
     Bill,
     BillLineItem,
     Booking,
-    Location,
     LocationFee,
     Payment,
 )
+from core.shortcuts import get_location_or_404
 from core.tasks import guest_welcome
 from core.views import occupancy
 
@@ -39,11 +45,13 @@ logger = logging.getLogger(__name__)
 
 
 @require_POST
-@login_required
-def create_checkout_session(request, username):
+@async_login_required
+async def create_checkout_session(request, username):
     # check permissions
-    user = get_object_or_404(User, username=username)
-    if request.user != user:
+    user = await aget_object_or_404(
+        User.objects.select_related("profile"), username=username
+    )
+    if await request.auser() != user:
         messages.info(
             request,
             (
@@ -54,29 +62,35 @@ def create_checkout_session(request, username):
         return HttpResponseRedirect("/404")
 
     try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        async with payment_gateway.async_stripe() as client:
+            # check if user exists on stripe
+            if user.profile.stripe_customer_id:
+                customer = await client.customers.retrieve_async(
+                    user.profile.stripe_customer_id
+                )
+            else:
+                customer = await client.customers.create_async(
+                    params={
+                        "email": user.email,
+                        "name": f"{user.first_name} {user.last_name}",
+                    }
+                )
+                user.profile.stripe_customer_id = customer.id
+                await user.profile.asave()
 
-        # check if user exists on stripe
-        if user.profile.stripe_customer_id:
-            customer = stripe.Customer.retrieve(user.profile.stripe_customer_id)
-        else:
-            customer = stripe.Customer.create(
-                email=user.email, name=f"{user.first_name} {user.last_name}"
+            success_url = (
+                f"{settings.CANONICAL_URL}/people/{user.username}/checkout-success/"
+                "?session_id={CHECKOUT_SESSION_ID}"  # this {CHECKOUT_SESSION_ID} is for stripe
+            )
+            checkout_session = await client.checkout.sessions.create_async(
+                params={
+                    "mode": "setup",
+                    "currency": "usd",
+                    "customer": customer.id,
+                    "success_url": success_url,
+                    "cancel_url": f"{settings.CANONICAL_URL}/people/{user.username}/",
+                }
             )
-            user.profile.stripe_customer_id = customer.id
-            user.profile.save()
-
-        success_url = (
-            f"{settings.CANONICAL_URL}/people/{user.username}/checkout-success/"
-            "?session_id={CHECKOUT_SESSION_ID}"  # this {CHECKOUT_SESSION_ID} is for stripe
-        )
-        checkout_session = stripe.checkout.Session.create(
-            mode="setup",
-            currency="usd",
-            customer=customer.id,
-            success_url=success_url,
-            cancel_url=f"{settings.CANONICAL_URL}/people/{user.username}/",
-        )
     except Exception as e:
         messages.info(
             request,
@@ -93,11 +107,13 @@ def create_checkout_session(request, username):
     return response
 
 
-@login_required
-def checkout_success(request, username):
+@async_login_required
+async def checkout_success(request, username):
     # check permissions
-    user = get_object_or_404(User, username=username)
-    if request.user != user:
+    user = await aget_object_or_404(
+        User.objects.select_related("profile"), username=username
+    )
+    if await request.auser() != user:
         messages.info(
             request,
             (
@@ -113,31 +129,35 @@ def checkout_success(request, username):
         messages.error(request, message)
         raise Exception(message)
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    stripe_session = stripe.checkout.Session.retrieve(
-        stripe_session_id, expand=["setup_intent"]
-    )
+    async with payment_gateway.async_stripe() as client:
+        stripe_session = await client.checkout.sessions.retrieve_async(
+            stripe_session_id, params={"expand": ["setup_intent"]}
+        )
 
-    # save payment method on user
-    stripe_payment_method_id = stripe_session.setup_intent.payment_method
-    user.profile.stripe_payment_method_id = stripe_payment_method_id
-    user.profile.save()
+        # save payment method on user
+        stripe_payment_method_id = stripe_session.setup_intent.payment_method
+        user.profile.stripe_payment_method_id = stripe_payment_method_id
+        await user.profile.asave()
 
-    # set default payment source to customer in stripe
-    stripe.Customer.modify(
-        user.profile.stripe_customer_id,
-        invoice_settings={"default_payment_method": stripe_payment_method_id},
-    )
+        # set default payment source to customer in stripe
+        await client.customers.update_async(
+            user.profile.stripe_customer_id,
+            params={
+                "invoice_settings": {"default_payment_method": stripe_payment_method_id}
+            },
+        )
 
     messages.info(request, "Thanks! Your card has been saved.")
     return HttpResponseRedirect(f"/people/{user.username}")
 
 
-@login_required
-def user_delete_card(request, username):
+@async_login_required
+async def user_delete_card(request, username):
     # check permissions
-    user = get_object_or_404(User, username=username)
-    if request.user != user:
+    user = await aget_object_or_404(
+        User.objects.select_related("profile"), username=username
+    )
+    if await request.auser() != user:
         messages.info(
             request,
             "You are not authorized to change this. Please log in or use the 3rd party.",
@@ -145,8 +165,8 @@ def user_delete_card(request, username):
         return HttpResponseRedirect("/404")
 
     try:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-        stripe.Customer.delete(user.profile.stripe_customer_id)
+        async with payment_gateway.async_stripe() as client:
+            await client.customers.delete_async(user.profile.stripe_customer_id)
     except Exception as e:
         messages.info(
             request,
@@ -158,7 +178,7 @@ def user_delete_card(request, username):
         return redirect("user_detail", user.username)
 
     user.profile.stripe_customer_id = None
-    user.profile.save()
+    await user.profile.asave()
 
     messages.info(request, "Card deleted.")
     return HttpResponseRedirect(f"/people/{user.username}")
@@ -168,7 +188,7 @@ def user_delete_card(request, username):
 def ManagePayment(request, location_slug, bill_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    get_object_or_404(Location, slug=location_slug)
+    get_location_or_404(location_slug, request)
     bill = get_object_or_404(Bill, id=bill_id)
 
     logger.debug(request.POST)
@@ -229,7 +249,7 @@ def ManagePayment(request, location_slug, bill_id):
 def RecalculateBill(request, location_slug, bill_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     bill = get_object_or_404(Bill, id=bill_id)
 
     # what kind of bill is this?
@@ -252,7 +272,7 @@ def RecalculateBill(request, location_slug, bill_id):
 def DeleteBillLineItem(request, location_slug, bill_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     bill = get_object_or_404(Bill, pk=bill_id)
 
     if bill.is_booking_bill():
@@ -277,7 +297,7 @@ def DeleteBillLineItem(request, location_slug, bill_id):
 def BillCharge(request, location_slug, bill_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     bill = get_object_or_404(Bill, pk=bill_id)
 
     logger.debug(request.POST)
@@ -331,7 +351,7 @@ def AddBillLineItem(request, location_slug, bill_id):
     # cleaning fee.
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     bill = get_object_or_404(Bill, pk=bill_id)
 
     reason = request.POST.get("reason")
@@ -410,7 +430,7 @@ def AddBillLineItem(request, location_slug, bill_id):
 
 def _assemble_and_send_email(location_slug, post):
     # This is the code path for sending an email from the admin booking page
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug)
     subject = post.get("subject")
     recipient = post.get("recipient")
     body = post.get("body") + "\n\n" + post.get("footer")
@@ -418,6 +438,7 @@ def _assemble_and_send_email(location_slug, post):
     send_from_location_address(subject, body, None, recipient, location)
 
 
+@read_replica
 @resident_or_admin_required
 def payments_today(request, location_slug):
     today = timezone.localtime(timezone.now())
@@ -436,7 +457,7 @@ def payments_today(request, location_slug):
 
 @login_required
 def PeopleDaterangeQuery(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     start_str = request.POST.get("start_date")
     end_str = request.POST.get("end_date")
     s_month, s_day, s_year = start_str.split("/")
@@ -471,7 +492,7 @@ def PeopleDaterangeQuery(request, location_slug):
 
 def submit_payment(request, booking_uuid, location_slug):
     booking = Booking.objects.get(uuid=booking_uuid)
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     if request.method == "POST":
         form = PaymentForm(request.POST, default_amount=None)
         if form.is_valid():
@@ -564,11 +585,11 @@ def submit_payment(request, booking_uuid, location_slug):
     )
 
 
+@query_budget(25)
+@read_replica
 @resident_or_admin_required
 def payments(request, location_slug, year, month):
-    t0 = time.time()
-    logger.debug("payments: timing begun:")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     start, end, next_month, prev_month, month, year = occupancy.get_calendar_dates(
         month, year
     )
@@ -607,6 +628,8 @@ def payments(request, location_slug, year, month):
         .filter(payment_date__gte=start, payment_date__lte=end)
         .order_by("payment_date")
         .reverse()
+        .select_related("user", "bill__bookingbill__booking__use__location")
+        .prefetch_related("bill__line_items__fee")
     )
     for p in booking_payments_this_month:
         # pull out the values we call multiple times to make this faster
@@ -636,8 +659,10 @@ def payments(request, location_slug, year, month):
             summary_totals["res_external_txs_paid"] += p_paid_amount
             summary_totals["res_external_txs_fees"] += p_house_fees
 
-    not_paid_by_house = LocationFee.objects.filter(location=location).filter(
-        fee__paid_by_house=False
+    not_paid_by_house = (
+        LocationFee.objects.filter(location=location)
+        .filter(fee__paid_by_house=False)
+        .select_related("fee")
     )
     for loc_fee in not_paid_by_house:
         summary_totals["hotel_tax_percent"] += loc_fee.fee.percentage * 100
@@ -656,10 +681,6 @@ def payments(request, location_slug, year, month):
         summary_totals["gross_rent_transient"] + summary_totals["net_rent_resident"]
     )
 
-    t1 = time.time()
-    dt = t1 - t0
-    logger.debug("payments: timing ended. time taken:")
-    logger.debug(dt)
     return render(
         request,
         "payments.html",
@@ -673,3 +694,82 @@ def payments(request, location_slug, year, month):
             "next_date": next_month,
         },
     )
+
+
+# (label, fewest days overdue, most days overdue). a booking is due on its
+# arrival date.
+AGING_BUCKETS = (
+    ("0-30", 0, 30),
+    ("31-60", 31, 60),
+    ("60+", 61, None),
+)
+AGING_PAGE_SIZE = 50
+
+
+def _aging_filter(today, low, high):
+    condition = Q(use__arrive__lte=today - datetime.timedelta(days=low))
+    if high is not None:
+        condition &= Q(use__arrive__gte=today - datetime.timedelta(days=high))
+    return condition
+
+
+@read_replica
+@house_admin_required
+def aging_report(request, location_slug):
+    """confirmed bookings with an outstanding balance, grouped by how many
+    days past their arrival date they are. the totals per bucket come with
+    one page of bookings, optionally limited to one bucket (?bucket=31-60)."""
+    location = get_location_or_404(location_slug, request)
+    today = timezone.localtime(timezone.now()).date()
+    overdue = Booking.objects.filter(
+        use__location=location,
+        use__status=Booking.CONFIRMED,
+        outstanding_balance__gt=0,
+        use__arrive__lte=today,
+    )
+
+    aggregates = {}
+    for i, (_, low, high) in enumerate(AGING_BUCKETS):
+        condition = _aging_filter(today, low, high)
+        aggregates[f"count_{i}"] = Count("id", filter=condition)
+        aggregates[f"total_{i}"] = Sum("outstanding_balance", filter=condition)
+    totals = overdue.aggregate(**aggregates)
+    buckets = [
+        {
+            "bucket": label,
+            "count": totals[f"count_{i}"],
+            "total": totals[f"total_{i}"] or Decimal(0),
+        }
+        for i, (label, _, _) in enumerate(AGING_BUCKETS)
+    ]
+
+    bucket = request.GET.get("bucket")
+    limits = {label: (low, high) for label, low, high in AGING_BUCKETS}
+    if bucket in limits:
+        overdue = overdue.filter(_aging_filter(today, *limits[bucket]))
+    overdue = overdue.select_related("use__user", "use__resource").order_by(
+        "use__arrive", "id"
+    )
+    page = Paginator(overdue, AGING_PAGE_SIZE).get_page(request.GET.get("page"))
+
+    return JsonResponse(
+        {
+            "as_of": today,
+            "buckets": buckets,
+            "page": page.number,
+            "num_pages": page.paginator.num_pages,
+            "bookings": [
+                {
+                    "id": booking.id,
+                    "url": reverse("booking_manage", args=(location.slug, booking.id)),
+                    "guest": booking.use.user.get_full_name(),
+                    "resource": booking.use.resource.name,
+                    "arrive": booking.use.arrive,
+                    "depart": booking.use.depart,
+                    "days_overdue": (today - booking.use.arrive).days,
+                    "outstanding_balance": booking.outstanding_balance,
+                }
+                for booking in page
+            ],
+        }
+    )
@@ -20,14 +20,16 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import TemplateView
 from rest_framework import generics, mixins
 
-from core import models, payment_gateway
+from core import drafts, models, payment_gateway, tasks
+from core.background import after_commit
+from core.decorators import query_budget
 from core.emails.messages import (
     guest_welcome,
-    new_booking_notify,
     send_booking_receipt,
     updated_booking_notify,
 )
 from core.forms import BookingUseForm
+from core.reservations import Unavailable, reserved
 from core.serializers import FeeSerializer, ResourceSerializer
 from core.shortcuts import get_qs_or_404
 from core.views import view_helpers
@@ -44,17 +46,17 @@ class DateEncoder(JSONEncoder):
             return super().default(o)
 
 
+@query_budget(10)
 class RoomApiList(mixins.ListModelMixin, generics.GenericAPIView):
     queryset = models.Resource.objects.all()
     serializer_class = ResourceSerializer
     lookup_field = "location_slug"
 
     def filter_queryset(self, queryset):
-        # TODO make sure that capacity_change and uses are prefetched somehow
-        # ideally a method on Resource manager
-
         def room_available_during_period(room, arrive, depart):
-            availabilities = room.daily_availabilities_within(arrive, depart)
+            availabilities = room.daily_availabilities_within(
+                arrive, depart, uses=room.confirmed_uses
+            )
             zero_quantity_dates = [avail for avail in availabilities if avail[1] == 0]
             return not zero_quantity_dates
 
@@ -64,9 +66,11 @@ class RoomApiList(mixins.ListModelMixin, generics.GenericAPIView):
             arrive = dateutil.parser(params["arrive"]).date
             depart = dateutil.parser(params["depart"]).date
 
+            rooms = list(qs)
+            models.prefetch_availabilities(rooms, arrive, depart)
             room_ids = [
                 room.pk
-                for room in qs
+                for room in rooms
                 if room_available_during_period(room, arrive, depart)
             ]
             qs = qs.filter(id__in=room_ids)
@@ -88,6 +92,7 @@ class RoomApiDetail(mixins.RetrieveModelMixin, generics.GenericAPIView):
         return self.retrieve(request, *args, **kwargs)
 
 
+@query_budget(30)
 class StayView(TemplateView):
     # This view should be moved to views/location.py which is up for a PR.
     template_name = "booking/booking.html"
@@ -108,7 +113,8 @@ class StayView(TemplateView):
                 models.Location, slug=kwargs.get("location_slug")
             )
 
-        if not self.location.rooms_with_future_capacity():
+        self.rooms = self.location.rooms_with_future_capacity()
+        if not self.rooms:
             msg = "Sorry! This location does not currently have any listings."
             messages.add_message(self.request, messages.INFO, msg)
             return HttpResponseRedirect(
@@ -148,9 +154,7 @@ class StayView(TemplateView):
             "fees": FeeSerializer(fees, many=True).data,
         }
 
-        resource_data = (
-            self.room if self.room else self.location.rooms_with_future_capacity()
-        )
+        resource_data = self.room if self.room else self.rooms
         use_many = not self.room
         react_data = self.populate_room(react_data, resource_data, use_many)
 
@@ -170,9 +174,10 @@ def BookingSubmit(request, location_slug):
         use = form.save(commit=False)
         use.location = location
         booking = models.Booking(use=use, comments=comments)
-        # reset_rate also generates the bill.
         if request.user.is_authenticated:
             use.user = request.user
+            # booking_detail shows DRFT bookings differently, so this can't
+            # wait for the background
             if use.suggest_drft():
                 use.accounted_by = models.Use.DRFT
             use.save()
@@ -180,9 +185,13 @@ def BookingSubmit(request, location_slug):
             # but it wasn't saved at that point, and Django complains about
             # a missing primary key here otherwise, so re-setting.
             booking.use = use
+            # set the rate before the first save so the bill is only
+            # generated once
+            booking.rate = use.resource.default_rate
             booking.save()
-            booking.reset_rate()
-            new_booking_notify(booking)
+            booking.generate_bill()
+            # the email doesn't have to go out before the guest sees the booking
+            after_commit(tasks.notify_new_booking, booking.id)
             messages.add_message(
                 request,
                 messages.INFO,
@@ -195,14 +204,13 @@ def BookingSubmit(request, location_slug):
                 reverse("booking_detail", args=(location_slug, booking.id))
             )
         else:
-            booking_data = booking.serialize()
-            request.session["booking"] = booking_data
             messages.add_message(
                 request,
                 messages.INFO,
                 "Thank you! Please make a profile to complete your booking request.",
             )
-            return HttpResponseRedirect(reverse("registration_register"))
+            response = HttpResponseRedirect(reverse("registration_register"))
+            return drafts.save_draft(request, response, use, comments)
     else:
         logger.debug("form was not valid")
         logger.debug(request.POST)
@@ -289,10 +297,9 @@ def BookingDetail(request, booking_id, location_slug):
         # users that intersect this stay
         users_during_stay = []
         uses = (
-            models.Use.objects.filter(status="confirmed")
+            models.Use.objects.overlapping(use.arrive, use.depart, inclusive=True)
+            .filter(status="confirmed")
             .filter(location=location)
-            .exclude(depart__lt=use.arrive)
-            .exclude(arrive__gt=use.depart)
         )
         for use in uses:
             if use.user not in users_during_stay:
@@ -452,8 +459,9 @@ def BookingConfirm(request, booking_id, location_slug):
         )
     else:
         try:
-            payment_gateway.charge_booking(booking)
-            booking.confirm()
+            # hold the room before charging for it
+            with reserved(booking.use):
+                payment_gateway.charge_booking(booking)
             send_booking_receipt(booking)
             # if booking start date is sooner than WELCOME_EMAIL_DAYS_AHEAD,
             # need to send them house info manually.
@@ -467,6 +475,8 @@ def BookingConfirm(request, booking_id, location_slug):
                 f"Thank you! Your payment has been received and a receipt emailed to "
                 f"you at {booking.use.user.email}",
             )
+        except Unavailable as e:
+            messages.add_message(request, messages.WARNING, str(e))
         except stripe.CardError:
             messages.add_message(
                 request,
@@ -13,12 +13,10 @@ from django.utils import timezone
 from stripe.error import CardError
 
 from bank.models import Entry, Transaction
-from core import payment_gateway
-from core.decorators import house_admin_required
-from core.emails.messages import (
-    new_booking_notify,
-    send_booking_receipt,
-)
+from core import payment_gateway, tasks
+from core.background import after_commit
+from core.decorators import house_admin_required, query_budget
+from core.emails.messages import send_booking_receipt
 from core.forms import (
     AdminBookingForm,
     BookingEmailTemplateForm,
@@ -26,13 +24,14 @@ from core.forms import (
 from core.models import (
     Booking,
     EmailTemplate,
-    Location,
     Resource,
     Use,
     UseNote,
     UserNote,
     UseTransaction,
 )
+from core.reservations import Unavailable, reserve, reserved
+from core.shortcuts import get_location_or_404
 from core.tasks import guest_welcome
 from core.views import occupancy
 from core.views.billing import _assemble_and_send_email
@@ -43,6 +42,7 @@ logger = logging.getLogger(__name__)
 # ******************************************************
 #           booking management views
 # ******************************************************
+@query_budget(36)
 @house_admin_required
 def BookingManageList(request, location_slug):
     if request.method == "POST":
@@ -52,7 +52,7 @@ def BookingManageList(request, location_slug):
             reverse("booking_manage", args=(booking.use.location.slug, booking.id))
         )
 
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
 
     show_all = False
     if "show_all" in request.GET and request.GET.get("show_all") == "True":
@@ -99,7 +99,7 @@ def BookingManageList(request, location_slug):
 def BookingToggleComp(request, location_slug, booking_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = Booking.objects.get(pk=booking_id)
     if not booking.is_comped():
         # Let these nice people stay here for free
@@ -119,7 +119,7 @@ def BookingToggleComp(request, location_slug, booking_id):
 def BookingManageCreate(request, location_slug):
     username = ""
     if request.method == "POST":
-        location = get_object_or_404(Location, slug=location_slug)
+        location = get_location_or_404(location_slug, request)
 
         notify = request.POST.get("email_announce")
         logger.debug("notify was set to:")
@@ -151,7 +151,7 @@ def BookingManageCreate(request, location_slug):
             booking = Booking(use=use)
             booking.reset_rate()
             if notify:
-                new_booking_notify(booking)
+                after_commit(tasks.notify_new_booking, booking.id)
 
             messages.info(
                 request,
@@ -180,7 +180,7 @@ def BookingManageCreate(request, location_slug):
 
 @house_admin_required
 def BookingManage(request, location_slug, booking_id):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = get_object_or_404(Booking, id=booking_id)
     user = User.objects.get(username=booking.use.user.username)
     other_bookings = (
@@ -263,7 +263,7 @@ def BookingManage(request, location_slug, booking_id):
 @house_admin_required
 def BookingManagePayWithDrft(request, location_slug, booking_id):
     # check that request.user is an admin at the house in question
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = Booking.objects.get(id=booking_id)
     use = booking.use
     requested_nights = use.total_nights()
@@ -333,36 +333,45 @@ def BookingManageAction(request, location_slug, booking_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = Booking.objects.get(id=booking_id)
     booking_action = request.POST.get("booking-action")
     logger.debug("booking action")
     logger.debug(booking_action)
 
-    if booking_action == "set-tentative":
-        booking.approve()
-    elif booking_action == "set-confirm":
-        booking.confirm()
-        days_until_arrival = (booking.use.arrive - datetime.date.today()).days
-        if days_until_arrival <= location.welcome_email_days_ahead:
-            guest_welcome(booking.use)
-    elif booking_action == "set-comp":
-        booking.comp()
-    elif booking_action == "res-charge-card":
-        try:
-            payment_gateway.charge_booking(booking)
-            booking.confirm()
+    try:
+        if booking_action == "set-tentative":
+            reserve(booking.use, Use.APPROVED)
+        elif booking_action == "set-confirm":
+            reserve(booking.use)
+            days_until_arrival = (booking.use.arrive - datetime.date.today()).days
+            if days_until_arrival <= location.welcome_email_days_ahead:
+                guest_welcome(booking.use)
+        elif booking_action == "set-comp":
+            booking.comp()
+        elif booking_action == "res-charge-card":
+            try:
+                # hold the room before charging for it
+                with reserved(booking.use):
+                    payment_gateway.charge_booking(booking)
+            except CardError:
+                # raise Booking.ResActionError(e)
+                # messages.add_message(request, messages.INFO, "There was an error: %s" % e)
+                # status_area_html = render(request, "snippets/res_status_area.html", {"r": booking, 'location': location, 'error': True})
+                return HttpResponse(status=500)
             send_booking_receipt(booking)
             days_until_arrival = (booking.use.arrive - datetime.date.today()).days
             if days_until_arrival <= location.welcome_email_days_ahead:
                 guest_welcome(booking.use)
-        except CardError:
-            # raise Booking.ResActionError(e)
-            # messages.add_message(request, messages.INFO, "There was an error: %s" % e)
-            # status_area_html = render(request, "snippets/res_status_area.html", {"r": booking, 'location': location, 'error': True})
-            return HttpResponse(status=500)
-    else:
-        raise Booking.ResActionError("Unrecognized action.")
+        else:
+            raise Booking.ResActionError("Unrecognized action.")
+    except Unavailable as e:
+        messages.add_message(request, messages.INFO, str(e))
+        return render(
+            request,
+            "snippets/res_status_area.html",
+            {"r": booking, "location": location, "error": True},
+        )
 
     messages.add_message(request, messages.INFO, "Your action has been registered!")
     status_area_html = render(
@@ -448,7 +457,7 @@ def BookingManageEdit(request, location_slug, booking_id):
 def BookingSendReceipt(request, location_slug, booking_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = Booking.objects.get(id=booking_id)
     if booking.is_paid():
         status = send_booking_receipt(booking)
@@ -480,7 +489,7 @@ def BookingSendReceipt(request, location_slug, booking_id):
 def BookingSendWelcomeEmail(request, location_slug, booking_id):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     booking = Booking.objects.get(id=booking_id)
     if booking.is_confirmed():
         guest_welcome(booking.use)
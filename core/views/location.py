@@ -12,6 +12,7 @@ from django.views.generic import DetailView
 from rules.contrib.views import PermissionRequiredMixin
 from django.conf import settings
 
+from core.cache import cached_for_location
 from core.data_fetchers import (
     SerializedNullResourceCapacity,
     SerializedResourceCapacity,
@@ -30,14 +31,24 @@ from core.models import (
     LocationMenu,
     Resource,
 )
+from core.shortcuts import get_location_or_404
 from core.views import view_helpers
 
 logger = logging.getLogger(__name__)
 
 
+def _with_profiles(users):
+    # load profiles up front so the cached users render without extra queries
+    ids = [u.pk for u in users]
+    by_id = User.objects.select_related("profile").in_bulk(ids)
+    return [by_id[i] for i in ids if i in by_id]
+
+
 def community(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
-    residents = location.residents()
+    location = get_location_or_404(location_slug, request)
+    residents = cached_for_location(
+        location.id, "residents", lambda: _with_profiles(location.residents())
+    )
     return render(
         request,
         "location_community.html",
@@ -46,14 +57,23 @@ def community(request, location_slug):
 
 
 def team(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
-    team = location.house_admins.all()
+    location = get_location_or_404(location_slug, request)
+    team = cached_for_location(
+        location.id,
+        "team",
+        lambda: list(location.house_admins.all().select_related("profile")),
+    )
     return render(request, "location_team.html", {"team": team, "location": location})
 
 
 def guests(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
-    guests_today = location.guests_today()
+    location = get_location_or_404(location_slug, request)
+    today = timezone.localtime(timezone.now()).date()
+    guests_today = cached_for_location(
+        location.id,
+        f"guests:{today.isoformat()}",
+        lambda: _with_profiles(location.guests_today()),
+    )
     return render(
         request, "location_guests.html", {"guests": guests_today, "location": location}
     )
@@ -66,10 +86,24 @@ class LocationDetail(PermissionRequiredMixin, DetailView):
     permission_required = "location.can_view"
     slug_url_kwarg = "location_slug"
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        qs = qs.prefetch_related("house_admins", "resources")
-        return qs
+    def get_object(self, queryset=None):
+        return get_location_or_404(self.kwargs[self.slug_url_kwarg], self.request)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        location = self.object
+        today = timezone.localtime(timezone.now()).date().isoformat()
+        context["rooms_with_future_capacity"] = cached_for_location(
+            location.id,
+            f"rooms_with_future_capacity:{today}",
+            location.rooms_with_future_capacity,
+        )
+        context["people_in_coming_month"] = cached_for_location(
+            location.id,
+            f"people_in_coming_month:{today}",
+            lambda: _with_profiles(location.people_in_coming_month()),
+        )
+        return context
 
     def handle_no_permission(self):
         raise Http404(
@@ -87,6 +121,7 @@ class LocationDetail(PermissionRequiredMixin, DetailView):
 
 @house_admin_required
 def LocationEditSettings(request, location_slug):
+    # the cached location can be stale, and saving it would undo newer edits
     location = get_object_or_404(Location, slug=location_slug)
     if request.method == "POST":
         form = LocationSettingsForm(request.POST, instance=location)
@@ -285,7 +320,7 @@ def LocationEditPages(request, location_slug):
 
 @house_admin_required
 def LocationManageRooms(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     resources = location.resources.all().order_by("name")
     return render(
         request, "location_manage_rooms.html", {"rooms": resources, "page": "rooms"}
@@ -413,7 +448,7 @@ def LocationEditContent(request, location_slug):
 
 @house_admin_required
 def LocationEditEmails(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     form = LocationSettingsForm(instance=location)
     return render(
         request,
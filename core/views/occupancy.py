@@ -12,15 +12,21 @@ from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.views.decorators.csrf import csrf_exempt
 
+from core import guest_analytics
 from core.booking_calendar import GuestCalendar
-from core.decorators import resident_or_admin_required
+from core.decorators import (
+    house_admin_required,
+    query_budget,
+    read_replica,
+    resident_or_admin_required,
+)
 from core.models import (
     Booking,
-    Location,
     Payment,
     Resource,
     Use,
 )
+from core.shortcuts import get_location_or_404
 from gather.tasks import published_events_today_local
 
 logger = logging.getLogger(__name__)
@@ -55,7 +61,7 @@ def get_calendar_dates(month, year):
 
 
 def today(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     # get all the bookings that intersect today (including those departing
     # and arriving today)
     today = timezone.now()
@@ -84,10 +90,9 @@ def room_occupancy_month(room, month, year):
 
     # note the day parameter is meaningless
     uses = (
-        Use.objects.filter(resource=room)
+        Use.objects.overlapping(start, end, inclusive=True)
+        .filter(resource=room)
         .filter(status="confirmed")
-        .exclude(depart__lt=start)
-        .exclude(arrive__gt=end)
     )
 
     # payments *received* this month for this room
@@ -180,6 +185,7 @@ def room_occupancy_month(room, month, year):
     return params
 
 
+@read_replica
 @resident_or_admin_required
 def room_occupancy(request, location_slug, room_id, year):
     room = get_object_or_404(Resource, id=room_id)
@@ -223,7 +229,7 @@ def room_occupancy(request, location_slug, room_id, year):
 
 
 def monthly_occupant_report(location_slug, year, month):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug)
     start, end, next_month, prev_month, month, year = get_calendar_dates(month, year)
 
     occupants = {}
@@ -246,10 +252,9 @@ def monthly_occupant_report(location_slug, year, month):
             }
 
     uses = (
-        Use.objects.filter(location=location)
+        Use.objects.overlapping(start, end, inclusive=True)
+        .filter(location=location)
         .filter(status="confirmed")
-        .exclude(depart__lt=start)
-        .exclude(arrive__gt=end)
     )
     for use in uses:
         nights_this_month = use.nights_between(start, end)
@@ -285,9 +290,28 @@ def monthly_occupant_report(location_slug, year, month):
     return occupants, messages
 
 
+@read_replica
+@house_admin_required
+def guest_analytics_report(request, location_slug, report, year, month):
+    """one of guest_analytics.REPORTS for the stays arriving in a month, as
+    JSON."""
+    location = get_location_or_404(location_slug, request)
+    start, end, _, _, month, year = get_calendar_dates(month, year)
+    return JsonResponse(
+        {
+            "location": location.slug,
+            "month": f"{year}-{month:02d}",
+            "report": report,
+            **guest_analytics.monthly_report(report, location, start, end),
+        }
+    )
+
+
+@query_budget(30)
+@read_replica
 @resident_or_admin_required
 def occupancy(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     month = request.GET.get("month")
     year = request.GET.get("year")
 
@@ -296,10 +320,14 @@ def occupancy(request, location_slug):
     # note the day parameter is meaningless
     report_date = datetime.date(year, month, 1)
     uses = (
-        Use.objects.filter(location=location)
+        Use.objects.overlapping(start, end, inclusive=True)
+        .filter(location=location)
         .filter(status="confirmed")
-        .exclude(depart__lt=start)
-        .exclude(arrive__gt=end)
+        .select_related("location", "resource", "user", "booking__bill")
+        .prefetch_related(
+            "booking__bill__line_items__fee",
+            "booking__bill__payments__bill__line_items__fee",
+        )
     )
 
     person_nights_data = []
@@ -333,6 +361,8 @@ def occupancy(request, location_slug):
         Payment.objects.booking_payments_by_location(location)
         .filter(payment_date__gte=start)
         .filter(payment_date__lte=end)
+        .select_related("bill__bookingbill__booking__use")
+        .prefetch_related("bill__line_items__fee")
     )
     for p in payments_this_month:
         u = p.bill.bookingbill.booking.use
@@ -458,7 +488,7 @@ def occupancy(request, location_slug):
         )
         total_occupied_person_nights += nights_this_month
 
-    location_rooms = location.resources.all()
+    location_rooms = location.resources.prefetch_related("capacity_changes")
     total_reservable_days = 0
     reservable_days_per_room = {}
     for room in location_rooms:
@@ -533,7 +563,7 @@ def occupancy(request, location_slug):
 
 @login_required
 def manage_today(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     today = timezone.localtime(timezone.now())
 
     departing_today = (
@@ -562,9 +592,10 @@ def manage_today(request, location_slug):
     )
 
 
+@query_budget(25)
 @login_required
 def calendar(request, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     month = request.GET.get("month")
     year = request.GET.get("year")
 
@@ -572,14 +603,16 @@ def calendar(request, location_slug):
     report_date = datetime.date(year, month, 1)
 
     uses = (
-        Use.objects.filter(Q(status="confirmed") | Q(status="approved"))
+        Use.objects.overlapping(start, end, inclusive=True)
+        .filter(status__in=["approved", "confirmed"])
         .filter(location=location)
-        .exclude(depart__lt=start)
-        .exclude(arrive__gt=end)
         .order_by("arrive")
+        .select_related("booking", "location", "resource", "user__profile")
     )
 
-    rooms = Resource.objects.filter(location=location)
+    rooms = Resource.objects.filter(location=location).prefetch_related(
+        "capacity_changes"
+    )
     uses_by_room = []
     empty_rooms = 0
 
@@ -594,7 +627,7 @@ def calendar(request, location_slug):
     for room in rooms:
         uses_this_room = []
 
-        uses_list_this_room = list(uses.filter(resource=room))
+        uses_list_this_room = [u for u in uses if u.resource_id == room.id]
 
         if len(uses_list_this_room) == 0:
             empty_rooms += 1
@@ -666,7 +699,7 @@ def RoomsAvailableOnDates(request, location_slug):
 
     """
     # Check the room on the admin booking page to see if its available
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     # Check if the room is available for all dates in the booking
     arrive = dateutil.parser(request.POST["arrive"]).date
     depart = dateutil.parser(request.POST["depart"]).date
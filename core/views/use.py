@@ -5,14 +5,15 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.models import Site
 from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import render
 
-from core.models import Account, Currency, Location, Use
+from core.models import Account, Currency, Use
+from core.shortcuts import get_location_or_404
 
 
 @login_required
 def UseDetail(request, use_id, location_slug):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     try:
         use = Use.objects.get(id=use_id)
         if not use:
@@ -36,10 +37,9 @@ def UseDetail(request, use_id, location_slug):
         # users that intersect this stay
         users_during_stay = []
         uses = (
-            Use.objects.filter(status="confirmed")
+            Use.objects.overlapping(use.arrive, use.depart, inclusive=True)
+            .filter(status="confirmed")
             .filter(location=location)
-            .exclude(depart__lt=use.arrive)
-            .exclude(arrive__gt=use.depart)
         )
         for use in uses:
             if use.user not in users_during_stay:
@@ -54,8 +54,9 @@ def UseDetail(request, use_id, location_slug):
             drft = Currency.objects.get(name="DRFT")
             accounts = Account.objects.filter(owners=use.user).filter(currency=drft)
             for a in accounts:
-                if a.get_balance() > 0:
-                    drft_balance += a.get_balance()
+                balance = a.get_balance()
+                if balance > 0:
+                    drft_balance += balance
 
             if use.resource.drftable_between(use.arrive, use.depart):
                 has_future_drft_capacity = True
@@ -1,4 +1,3 @@
-import datetime
 import json
 import logging
 
@@ -13,8 +12,8 @@ from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
-from core import data_fetchers, forms, models
-from core.emails import messages as email_messages
+from core import data_fetchers, drafts, forms, models, tasks
+from core.background import after_commit
 from core.views.view_helpers import get_user_and_perms
 
 logger = logging.getLogger(__name__)
@@ -118,36 +117,13 @@ def UserDetail(request, username):
 
 def process_unsaved_booking(request):
     logger.debug("in process_unsaved_booking")
-    if request.session.get("booking"):
-        logger.debug("found booking")
-        logger.debug(request.session["booking"])
-        details = request.session.pop("booking")
-        use = models.Use(
-            arrive=datetime.date(
-                details["arrive"]["year"],
-                details["arrive"]["month"],
-                details["arrive"]["day"],
-            ),
-            depart=datetime.date(
-                details["depart"]["year"],
-                details["depart"]["month"],
-                details["depart"]["day"],
-            ),
-            location=models.Location.objects.get(id=details["location"]["id"]),
-            resource=models.Resource.objects.get(id=details["resource"]["id"]),
-            purpose=details["purpose"],
-            arrival_time=details["arrival_time"],
-            user=request.user,
-        )
-        use.save()
-        comment = details["comments"]
-        booking = models.Booking(use=use, comments=comment)
-        # reset rate calls set_rate which calls generate_bill
-        booking.reset_rate()
-        booking.save()
+    draft = drafts.pending_draft(request)
+    if draft:
+        logger.debug(f"found booking draft {draft}")
+        booking = drafts.materialize(draft, request.user)
 
         logger.debug("new booking %d saved." % booking.id)
-        email_messages.new_booking_notify(booking)
+        after_commit(tasks.notify_new_booking, booking.id)
         # we can't just redirect here because the user doesn't get logged
         # in. so save the reservaton ID and redirect below.
         request.session["new_booking_redirect"] = {
@@ -196,9 +172,10 @@ def user_login(request, username=None):
                     messages.INFO,
                     "Thank you! Your booking has been submitted. Please allow us up to 24 hours to respond.",
                 )
-                return HttpResponseRedirect(
+                response = HttpResponseRedirect(
                     reverse("booking_detail", args=(location_slug, booking_id))
                 )
+                return drafts.clear_draft(request, response)
 
             # this is where they go on successful login if there is not pending booking
             if not next_page or len(next_page) == 0 or "logout" in next_page:
@@ -210,7 +187,9 @@ def user_login(request, username=None):
 
 
 def register(request):
-    booking = request.session.get("booking")
+    draft = drafts.pending_draft(request)
+    # the bill is only worked out here, for the summary next to the form
+    booking = drafts.preview(draft) if draft else None
     if request.method == "POST":
         profile_form = forms.UserProfileForm(request.POST, request.FILES)
         if profile_form.is_valid():
@@ -273,8 +252,7 @@ def username_available(request):
     if request.headers.get("x-requested-with") != "XMLHttpRequest":
         return HttpResponseRedirect("/404")
     username = request.POST.get("username")
-    users_with_username = len(User.objects.filter(username=username))
-    if users_with_username:
+    if User.objects.filter(username__iexact=username).exists():
         logger.debug(f"username {username} is already in use")
         is_available = "false"
     else:
@@ -290,8 +268,7 @@ def email_available(request):
     if request.headers.get("x-requested-with") != "XMLHttpRequest":
         return HttpResponseRedirect("/404")
     email = request.POST.get("email").lower()
-    users_with_email = len(User.objects.filter(email=email))
-    if users_with_email:
+    if User.objects.filter(email__iexact=email).exists():
         logger.debug(f"email address {email} is already in use")
         is_available = "false"
     else:
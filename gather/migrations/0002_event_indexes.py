@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gather", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["location", "status", "visibility", "start"],
+                name="event_location_status_start",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("status", "live"), ("visibility", "public")),
+                fields=["location", "start"],
+                name="event_public_location_start",
+            ),
+        ),
+    ]
@@ -5,6 +5,7 @@ import uuid
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Q
 from django.db.models.signals import post_save
 from django.utils import timezone
 
@@ -67,10 +68,17 @@ class EventManager(models.Manager):
 
         if location:
             upcoming = upcoming.filter(location=location)
+        upcoming = upcoming.select_related(
+            "admin", "creator", "location"
+        ).prefetch_related("admin__users", "organizers", "attendees")
 
+        # each location's residents, looked up once rather than per event
+        residents = {}
         viewable_upcoming = []
         for event in upcoming:
-            if event.is_viewable(current_user):
+            if event.location_id not in residents:
+                residents[event.location_id] = event.location.residents()
+            if event.is_viewable(current_user, residents[event.location_id]):
                 viewable_upcoming.append(event)
                 if upto and len(viewable_upcoming) == upto:
                     break
@@ -184,12 +192,24 @@ class Event(models.Model):
 
     class Meta:
         app_label = "gather"
-
-    def is_viewable(self, current_user):
+        indexes = [
+            models.Index(
+                fields=["location", "status", "visibility", "start"],
+                name="event_location_status_start",
+            ),
+            # the public calendars only show live, public events
+            models.Index(
+                fields=["location", "start"],
+                condition=Q(status="live", visibility="public"),
+                name="event_public_location_start",
+            ),
+        ]
+
+    def is_viewable(self, current_user, residents=None):
         """an event is viewable if it's both live and public, OR if it's a
         community event and the user is a member of the community, OR the
         current_user is a community event admin, registered attendee or
-        organizer."""
+        organizer. pass the location's residents if you already have them."""
 
         # check some priveleges first...
         if (self.admin and current_user) and (current_user in self.admin.users.all()):
@@ -197,7 +217,9 @@ class Event(models.Model):
         else:
             is_event_admin = False
 
-        if current_user and current_user in self.location.residents():
+        if residents is None and current_user:
+            residents = self.location.residents()
+        if current_user and current_user in residents:
             is_community_member = True
         else:
             is_community_member = False
@@ -1,8 +1,8 @@
-from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django_ical.views import ICalFeed
 
 from core.models import Location
+from core.shortcuts import get_location_or_404
 from gather.models import Event
 
 
@@ -12,7 +12,7 @@ class PublicEventsFeed(ICalFeed):
     file_name = "events.ics"
 
     def get_object(self, request, location_slug):
-        return get_object_or_404(Location, slug=location_slug)
+        return get_location_or_404(location_slug, request)
 
     def items(self, obj):
         Location.objects.get(slug="redvic")
@@ -11,12 +11,14 @@ from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import render
 from django.urls import reverse
 from django.utils import timezone
 
+from core.decorators import query_budget
 from core.forms import UserProfileForm
 from core.models import Location
+from core.shortcuts import get_location_or_404
 from gather.emails import (
     event_approved_notification,
     event_published_notification,
@@ -30,7 +32,7 @@ logger = logging.getLogger(__name__)
 
 
 def create_event(request, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     current_user = request.user
     logger.debug(f"create_event: location:{location}, user:{current_user}")
 
@@ -108,7 +110,7 @@ def create_event(request, location_slug=None):
 
 @login_required
 def edit_event(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     current_user = request.user
     other_users = User.objects.exclude(id=current_user.id)
     user_list = [u.username for u in other_users]
@@ -174,7 +176,7 @@ def view_event(request, event_id, event_slug, location_slug=None):
         logger.debug("event not found")
         return HttpResponseRedirect("/404")
 
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     # if the slug has changed, redirect the viewer to the correct url (one
     # where the url matches the current slug)
     if event.slug != event_slug:
@@ -297,11 +299,7 @@ def upcoming_events_all_locations(request):
     events across all locations."""
     current_user = request.user if request.user.is_authenticated else None
     datetime.datetime.today()
-    all_upcoming = Event.objects.upcoming(current_user=request.user)
-    culled_upcoming = []
-    for event in all_upcoming:
-        if event.is_viewable(current_user):
-            culled_upcoming.append(event)
+    culled_upcoming = Event.objects.upcoming(current_user=request.user)
 
     # show 10 events per page
     paged_upcoming = Paginator(culled_upcoming, 10)
@@ -326,17 +324,16 @@ def upcoming_events_all_locations(request):
     )
 
 
+@query_budget(25)
 def upcoming_events(request, location_slug=None):
     """upcoming events limited to a specific location (either the one
     specified or the default single location)."""
     current_user = request.user if request.user.is_authenticated else None
     datetime.datetime.today()
-    location = get_object_or_404(Location, slug=location_slug)
-    all_upcoming = Event.objects.upcoming(current_user=request.user, location=location)
-    culled_upcoming = []
-    for event in all_upcoming:
-        if event.is_viewable(current_user):
-            culled_upcoming.append(event)
+    location = get_location_or_404(location_slug, request)
+    culled_upcoming = Event.objects.upcoming(
+        current_user=request.user, location=location
+    )
 
     # show 10 events per page
     paged_upcoming = Paginator(culled_upcoming, 10)
@@ -393,7 +390,7 @@ def user_events(request, username):
 
 @login_required
 def needs_review(request, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     # if user is not an event admin at this location, redirect
     location_admin_group = EventAdminGroup.objects.get(location=location)
     if not request.user.is_authenticated or (
@@ -425,7 +422,7 @@ def needs_review(request, location_slug=None):
 
 
 def past_events(request, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     current_user = request.user if request.user.is_authenticated else None
     today = datetime.datetime.today()
     # most recent first
@@ -501,7 +498,7 @@ def email_preferences(request, username, location_slug=None):
 
 
 def event_approve(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     location_event_admin = EventAdminGroup.objects.get(location=location)
     if request.user not in location_event_admin.users.all():
         return HttpResponseRedirect("/404")
@@ -531,7 +528,7 @@ def event_approve(request, event_id, event_slug, location_slug=None):
 
 @login_required
 def event_publish(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     location_event_admin = EventAdminGroup.objects.get(location=location)
 
     event = Event.objects.get(id=event_id)
@@ -558,7 +555,7 @@ def event_publish(request, event_id, event_slug, location_slug=None):
 
 
 def event_cancel(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     location_event_admin = EventAdminGroup.objects.get(location=location)
     if request.user not in location_event_admin.users.all():
         return HttpResponseRedirect("/404")
@@ -586,7 +583,7 @@ def event_send_mail(request, event_id, event_slug, location_slug=None):
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
-    get_object_or_404(Location, slug=location_slug)
+    get_location_or_404(location_slug, request)
     subject = request.POST.get("subject")
     recipients = [
         request.POST.get("recipient"),
@@ -624,7 +621,7 @@ def event_send_mail(request, event_id, event_slug, location_slug=None):
 
 @login_required
 def rsvp_event(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
@@ -656,7 +653,7 @@ def rsvp_event(request, event_id, event_slug, location_slug=None):
 
 @login_required
 def rsvp_cancel(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
@@ -690,7 +687,7 @@ def rsvp_cancel(request, event_id, event_slug, location_slug=None):
 
 
 def rsvp_new_user(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
@@ -749,7 +746,7 @@ def rsvp_new_user(request, event_id, event_slug, location_slug=None):
 
 
 def endorse(request, event_id, event_slug, location_slug=None):
-    location = get_object_or_404(Location, slug=location_slug)
+    location = get_location_or_404(location_slug, request)
     if request.method != "POST":
         return HttpResponseRedirect("/404")
 
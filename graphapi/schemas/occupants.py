@@ -22,10 +22,9 @@ class OccupantNode(DjangoObjectType):
 
     def resolve_occupants_during(self, info):
         query = (
-            Use.objects.filter(location=self.location, status="confirmed")
+            Use.objects.overlapping(self.arrive, self.depart, inclusive=True)
+            .filter(location=self.location, status="confirmed")
             .exclude(user=self.user)
-            .filter(arrive__lte=self.depart)
-            .filter(depart__gte=self.arrive)
             .order_by("user__last_name", "user__first_name")
             .distinct("user__last_name", "user__first_name")
         )
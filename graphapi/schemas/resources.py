@@ -50,9 +50,9 @@ class ResourceNode(DjangoObjectType):
         start_date = arrive.date()
         end_date = depart.date() - timedelta(days=1)
 
-        logger.debug(f"{self.name} drftable between? ")
-        logger.debug(self.drftable_between(start_date, end_date))
-        return self.drftable_between(start_date, end_date)
+        drftable = self.drftable_between(start_date, end_date)
+        logger.debug(f"{self.name} drftable between? {drftable}")
+        return drftable
 
     def resolve_availabilities(self, info, arrive, depart):
         start_date = arrive.date()
@@ -1,12 +1,35 @@
 from django.urls import re_path
 from django.views.decorators.csrf import csrf_exempt
 from graphene_django.views import GraphQLView
+from graphql import OperationType, get_operation_ast, parse
 
+from core.db import replica_allowed, replica_reads
+from core.decorators import query_budget
 from graphapi.schema import schema
 
 
+def _is_query(query, operation_name):
+    try:
+        operation = get_operation_ast(parse(query), operation_name)
+    except Exception:
+        # let graphene report the syntax error
+        return False
+    return operation is not None and operation.operation == OperationType.QUERY
+
+
+@query_budget(15)
 class AuthGraphQLView(GraphQLView):
-    pass
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, *args, **kwargs
+    ):
+        execute = super().execute_graphql_request
+        # queries can read from the replica, mutations never do
+        if query and _is_query(query, operation_name) and replica_allowed(request):
+            with replica_reads():
+                return execute(
+                    request, data, query, variables, operation_name, *args, **kwargs
+                )
+        return execute(request, data, query, variables, operation_name, *args, **kwargs)
 
 
 urlpatterns = [
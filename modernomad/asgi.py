@@ -0,0 +1,27 @@
+"""
+ASGI config for modernomad project.
+
+Serves the same application as wsgi.py from an ASGI server, for example:
+
+    uvicorn modernomad.asgi:application
+
+Under ASGI, async views (the mailing list endpoints in core/emails/messages.py
+and the card views in core/views/billing.py) wait on Mailgun and Stripe
+without holding a thread, so one process can have many of those calls in
+flight. Sync views run in a thread pool as usual. Under WSGI the same views
+work, but each holds its thread until the call returns.
+
+Every middleware in the chain has to be async capable for that, or Django runs
+it, and everything after it, in a thread. WhiteNoise's is not, so set
+WHITENOISE_MIDDLEWARE=0 when serving from here and let the proxy in front
+serve /static/.
+
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "modernomad.settings")
+
+application = get_asgi_application()
@@ -0,0 +1,98 @@
+"""Gunicorn settings, tuned through the environment.
+
+    gunicorn -c python:modernomad.gunicorn_conf modernomad.wsgi
+
+GUNICORN_WORKER_MODE picks how requests are served:
+
+- "gthread" (the default): a few processes, each with GUNICORN_THREADS
+  threads. A request waiting on Stripe or Mailgun holds one thread rather
+  than a whole process.
+- "sync": one request per process at a time, gunicorn's own default.
+
+The application is loaded before forking (--preload) so workers share the
+imported code copy-on-write, and workers are replaced after roughly
+GUNICORN_MAX_REQUESTS requests, staggered by GUNICORN_MAX_REQUESTS_JITTER, so
+slow memory growth can't build up. With persistent database connections each
+thread keeps its own, so budget workers x threads connections. The default
+number of workers follows the CPUs the container may use, not the host's; set
+WEB_CONCURRENCY to what the instance's memory and database allow.
+"""
+
+import math
+import os
+
+# cgroup v2, then v1, CPU quota files
+CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CFS_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CFS_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().split()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """the CPUs this process may run on, capped by the container's CPU quota,
+    which os.cpu_count() doesn't know about."""
+    cpus = (
+        len(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else os.cpu_count()
+    )
+    quota = period = None
+    cpu_max = _read(CPU_MAX)
+    if cpu_max and cpu_max[0] != "max":
+        quota, period = int(cpu_max[0]), int(cpu_max[1])
+    else:
+        cfs_quota, cfs_period = _read(CFS_QUOTA), _read(CFS_PERIOD)
+        if cfs_quota and cfs_period and int(cfs_quota[0]) > 0:
+            quota, period = int(cfs_quota[0]), int(cfs_period[0])
+    if quota and period:
+        cpus = min(cpus, max(1, math.ceil(quota / period)))
+    return cpus or 1
+
+
+WORKER_MODES = ("gthread", "sync")
+
+worker_mode = os.getenv("GUNICORN_WORKER_MODE", "gthread")
+if worker_mode not in WORKER_MODES:
+    raise RuntimeError(
+        f"GUNICORN_WORKER_MODE must be one of {', '.join(WORKER_MODES)}, "
+        f"not {worker_mode!r}"
+    )
+
+cpus = available_cpus()
+worker_class = worker_mode
+if worker_mode == "gthread":
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus + 1))
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+else:
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus * 2 + 1))
+    threads = 1
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# a worker silent for this long is killed and replaced. long enough for a slow
+# Stripe charge, short enough that a stuck worker doesn't linger.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    # a database connection opened while preloading would be inherited by
+    # every worker, and a socket shared between processes gets corrupted
+    from django.db import connections
+
+    connections.close_all()
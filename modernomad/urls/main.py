@@ -1,4 +1,3 @@
-import django.views
 from django.conf import settings
 from django.contrib import admin
 from django.urls import include, re_path
@@ -50,7 +49,7 @@ media_url = settings.MEDIA_URL.lstrip("/").rstrip("/")
 urlpatterns += [
     re_path(
         r"^%s/(?P<path>.*)$" % media_url,  # noqa: UP031
-        django.views.static.serve,
-        {"document_root": settings.MEDIA_ROOT, "show_indexes": True},
+        modernomad_views.media,
+        {"show_indexes": True},
     ),
 ]
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 
 from core.models import Location, Resource
 from gather.models import Event
 
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
 
 def index(request):
     recent_events = Event.objects.order_by("-start")[:10]
@@ -41,3 +46,18 @@ def robots(request):
         content += f"Disallow: /locations/{loc.slug}/booking/create/\n"
         content += f"Disallow: /locations/{loc.slug}/events/create/\n"
     return HttpResponse(content, content_type="text/plain")
+
+
+def media(request, path, show_indexes=False):
+    response = serve(
+        request, path, document_root=settings.MEDIA_ROOT, show_indexes=show_indexes
+    )
+    # generated renditions are named after a hash of their source and spec, so
+    # a given url never changes content and can be cached indefinitely.
+    if response.status_code == 200 and path.startswith(
+        settings.IMAGEKIT_CACHEFILE_DIR + "/"
+    ):
+        patch_cache_control(
+            response, public=True, max_age=MEDIA_CACHE_MAX_AGE, immutable=True
+        )
+    return response
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Compare gunicorn worker modes under load.
+
+Starts gunicorn with modernomad/gunicorn_conf.py once per worker mode, on
+whatever database the environment points at (DATABASE_URL, or a local
+settings module), sends requests from a pool of client threads for a while
+and prints the throughput and latencies of each run:
+
+    script/loadtest.py --modes gthread sync --concurrency 32 --duration 30
+
+Any GUNICORN_* or WEB_CONCURRENCY variables set in the environment apply to
+every run, so the same script can compare thread counts or worker numbers.
+Point it at pages that exist in your local data with --path.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = ["/", "/about/", "/events/"]
+
+
+def wait_until_up(url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"gunicorn exited with {server.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.5)
+    sys.exit(f"gunicorn didn't answer {url} within {timeout}s")
+
+
+def client(base_url, paths, stop_at, latencies, errors):
+    i = 0
+    while time.monotonic() < stop_at:
+        url = base_url + paths[i % len(paths)]
+        i += 1
+        started = time.monotonic()
+        try:
+            urllib.request.urlopen(url, timeout=60).read()
+        except (OSError, urllib.error.HTTPError):
+            errors.append(url)
+            continue
+        latencies.append(time.monotonic() - started)
+
+
+def run(mode, args):
+    env = dict(os.environ, GUNICORN_WORKER_MODE=mode, GUNICORN_ACCESS_LOG="")
+    env["GUNICORN_BIND"] = f"127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "python:modernomad.gunicorn_conf",
+            "modernomad.wsgi",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url + args.paths[0], server)
+        # one pass to fill caches and open database connections
+        client(base_url, args.paths, time.monotonic() + args.warmup, [], [])
+
+        latencies, errors = [], []
+        stop_at = time.monotonic() + args.duration
+        threads = [
+            threading.Thread(
+                target=client, args=(base_url, args.paths, stop_at, latencies, errors)
+            )
+            for _ in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / args.duration,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["gthread", "sync"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--path",
+        dest="paths",
+        action="append",
+        help=f"path to request; may be repeated (default: {' '.join(DEFAULT_PATHS)})",
+    )
+    args = parser.parse_args()
+    args.paths = args.paths or DEFAULT_PATHS
+
+    results = [run(mode, args) for mode in args.modes]
+    print(
+        f"{'mode':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:<10}{r['requests']:>10}{r['errors']:>8}"
+            f"{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p95']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()